@@ -1,11 +1,20 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import BaseModel, ValidationError
 import logging
+import os
+import orjson
+import time
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Literal, Optional, Tuple, Type
 
-from .services.generation_service import GenerationService
+from .services.generation_service import GenerationResult, GenerationService, MessageContext
 from .services.model_loader import ModelLoader
-from .schemas.ai_schemas import GenerateRequest, GenerateResponse
+from .services.response_cache import make_cache_key, is_cacheable
+from .schemas.ai_schemas import GenerateRequest, GenerateResponse, Message
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -15,24 +24,90 @@ logger = logging.getLogger(__name__)
 model_loader = ModelLoader()
 generation_service = GenerationService(model_loader)
 
+# Shared response cache settings (opt-in via REDIS_URL)
+REDIS_URL = os.getenv("REDIS_URL")
+REDIS_CACHE_TTL = int(os.getenv("REDIS_CACHE_TTL", "3600"))
+
+# Seconds the available model listing is reused before being rebuilt
+MODELS_CACHE_TTL = float(os.getenv("MODELS_CACHE_TTL", "30"))
+
+# Inference thread pool size and optional startup warmup of the default model
+INFER_THREADS = int(os.getenv("INFER_THREADS", "2"))
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "false").lower() == "true"
+
+# Load-time weight quantization accepted by the load and switch endpoints
+Quantization = Literal["fp16", "int8", "int4", "awq"]
+# "prefetch" warms the page cache with the weight shards before loading; "direct" reads them with O_DIRECT;
+# "mmap" keeps weights in evictable file-backed pages
+LoadFormat = Literal["auto", "prefetch", "direct", "mmap"]
+
+
+def select_default_model() -> None:
+    """Use the first available model until one is explicitly loaded or switched to"""
+    if model_loader.current_model is None and model_loader.available_models:
+        model_loader.current_model = model_loader.available_models[0]
+
+
+async def start_generation() -> ThreadPoolExecutor:
+    """Start this process's inference threads, micro-batcher and default model"""
+    # Dedicated threads for blocking model inference
+    inference_pool = ThreadPoolExecutor(max_workers=INFER_THREADS, thread_name_prefix="inference")
+    model_loader.inference_pool = inference_pool
+    
+    await generation_service.batcher.start()
+    
+    select_default_model()
+    
+    if WARMUP_ON_STARTUP and model_loader.available_models:
+        default_model = model_loader.available_models[0]
+        if await model_loader.load_model(default_model):
+            await model_loader.warmup(default_model)
+    return inference_pool
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Manage AI service lifecycle"""
     logger.info("Starting AI Service...")
     
+    app.state.inference_pool = await start_generation()
+    
+    # Connect shared response cache if configured
+    if REDIS_URL:
+        try:
+            from redis import asyncio as aioredis
+            redis_client = aioredis.from_url(REDIS_URL)
+            await redis_client.ping()
+            app.state.redis = redis_client
+            logger.info("Redis response cache enabled")
+        except Exception as e:
+            logger.warning("Redis response cache unavailable, using in-process cache only: %s", e)
+            app.state.redis = None
+    
     yield
     
     # Cleanup on shutdown
     logger.info("Shutting down AI Service...")
+    if app.state.redis is not None:
+        await app.state.redis.close()
+        app.state.redis = None
+    
+    await generation_service.batcher.stop()
+    model_loader.inference_pool = None
+    app.state.inference_pool.shutdown(wait=False)
 
 
 app = FastAPI(
     title="AI Inference Service",
     version="1.0.0",
     description="Dedicated service for AI model inference and management",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
+app.state.redis = None
+app.state.models_cache = None
+# Set by the Ray Serve ingress (app/serve.py) to delegate generation to replicas
+app.state.generation_handle = None
 
 # Configure CORS for internal service communication
 app.add_middleware(
@@ -44,68 +119,227 @@ app.add_middleware(
 )
 
 
+def _get_models() -> Tuple[List[Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+    """Get the available models and an id index, rebuilt on TTL expiry or load/unload"""
+    loaded = tuple(model_loader.get_loaded_models())
+    now = time.monotonic()
+    cache = app.state.models_cache
+    if cache is None or cache[0] != loaded or now - cache[1] >= MODELS_CACHE_TTL:
+        models = model_loader.get_available_models()
+        cache = (loaded, now, models, {m["id"]: m for m in models})
+        app.state.models_cache = cache
+    return cache[2], cache[3]
+
+
+async def _redis_get(key: str) -> Optional[str]:
+    """Look up a response in the shared cache, ignoring connection errors"""
+    if app.state.redis is None:
+        return None
+    try:
+        cached = await app.state.redis.get(key)
+        return cached.decode("utf-8") if cached is not None else None
+    except Exception as e:
+        logger.warning("Redis cache lookup failed: %s", e)
+        return None
+
+
+async def _redis_set(key: str, value: str) -> None:
+    """Store a response in the shared cache, ignoring connection errors"""
+    if app.state.redis is None:
+        return
+    try:
+        await app.state.redis.set(key, value, ex=REDIS_CACHE_TTL)
+    except Exception as e:
+        logger.warning("Redis cache store failed: %s", e)
+
+
+def _require_local_generation() -> None:
+    """Reject model and cache management on a Ray Serve ingress, whose models and caches are not the replicas'"""
+    if app.state.generation_handle is not None:
+        raise HTTPException(
+            status_code=501,
+            detail="Not available under Ray Serve; each replica loads requested models on demand and keeps its own cache"
+        )
+
+
+def _resolve_model(requested: Optional[str]) -> str:
+    """Pick the requested model or fall back to the current one"""
+    if requested:
+        return requested
+    if model_loader.current_model is None:
+        # Lifespan may not have run (e.g. under an embedding server), so select lazily too
+        select_default_model()
+    target_model = model_loader.current_model
+    if target_model is None:
+        raise HTTPException(status_code=503, detail="No model available")
+    return target_model
+
+
+async def parse_generate_request(request: Request) -> GenerateRequest:
+    """Decode and validate a generation request body in one pass inside pydantic-core"""
+    try:
+        return GenerateRequest.model_validate_json(await request.body())
+    except ValidationError as e:
+        # Same 422 error shape as FastAPI's own body validation
+        raise RequestValidationError(
+            [{**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)]
+        )
+
+
+def _inline_refs(schema: Any, defs: Dict[str, Any]) -> Any:
+    """Replace local $defs references in a JSON schema with the definitions themselves"""
+    if isinstance(schema, dict):
+        if "$ref" in schema:
+            return _inline_refs(defs[schema["$ref"].rsplit("/", 1)[-1]], defs)
+        return {key: _inline_refs(value, defs) for key, value in schema.items() if key != "$defs"}
+    if isinstance(schema, list):
+        return [_inline_refs(item, defs) for item in schema]
+    return schema
+
+
+def _json_body_openapi(model: Type[BaseModel]) -> Dict[str, Any]:
+    """Document the JSON body of an endpoint that parses it with a dependency instead of a body parameter"""
+    schema = model.model_json_schema()
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": _inline_refs(schema, schema.get("$defs", {}))}}
+        }
+    }
+
+
+GENERATE_REQUEST_OPENAPI = _json_body_openapi(GenerateRequest)
+
+
+def _sse_event(payload: Dict[str, Any], event: Optional[str] = None) -> bytes:
+    """Encode a payload as a Server-Sent Events message"""
+    prefix = f"event: {event}\n".encode() if event else b""
+    return prefix + b"data: " + orjson.dumps(payload) + b"\n\n"
+
+
+async def generate_text(
+    model_id: str,
+    messages: List[Message],
+    parameters: Dict[str, Any],
+    context: Optional[MessageContext] = None,
+    session_id: Optional[str] = None
+) -> GenerationResult:
+    """Generate a response, flagging canned fallbacks"""
+    return await generation_service.generate(
+        model_id=model_id,
+        messages=messages,
+        parameters=parameters,
+        context=context,
+        session_id=session_id
+    )
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "service": "AI Inference Service"}
 
 
-@app.post("/generate", response_model=GenerateResponse)
-async def generate_response(request: GenerateRequest):
+@app.post("/generate", response_model=GenerateResponse, openapi_extra=GENERATE_REQUEST_OPENAPI)
+async def generate_response(request: GenerateRequest = Depends(parse_generate_request)):
     """Generate AI response"""
     try:
-        logger.debug(f"Generation request received - Messages: {len(request.messages)}, Parameters: {request.parameters}")
-        
-        # Use the first available model if no current model set
-        if not hasattr(model_loader, 'current_model') or model_loader.current_model is None:
-            available = model_loader.get_available_models()
-            if available:
-                model_loader.current_model = available[0]['id']
+        logger.debug("Generation request received - Messages: %d, Parameters: %s", len(request.messages), request.parameters)
         
-        target_model = request.model or model_loader.get_current_model()
-        logger.debug(f"Using model: {target_model}")
+        target_model = _resolve_model(request.model)
+        logger.debug("Using model: %s", target_model)
         
         # Log chat settings from parameters and system messages
         chat_settings = request.parameters or {}
         
-        # Count system messages in the messages array
-        system_messages = [msg for msg in request.messages if msg.role == 'system']
-        system_prompt_length = sum(len(msg.content) for msg in system_messages)
+        # Gather system prompt and conversation facts in a single pass
+        context = MessageContext.from_messages(request.messages)
         
-        if any(key in chat_settings for key in ['temperature', 'max_tokens']) or system_messages:
+        # Only build the settings summary when it will actually be logged
+        if logger.isEnabledFor(logging.DEBUG) and (
+            any(key in chat_settings for key in ['temperature', 'max_tokens']) or context.has_system_prompt
+        ):
             settings_summary = {
                 'temperature': chat_settings.get('temperature', 'default'),
                 'max_tokens': chat_settings.get('max_tokens', 'default'),
-                'system_prompt_length': system_prompt_length
+                'system_prompt_length': context.system_prompt_length
             }
-            logger.debug(f"Chat settings applied - Model: {target_model}: {settings_summary}")
+            logger.debug("Chat settings applied - Model: %s: %s", target_model, settings_summary)
         
-        # Generate response using the generation service
-        response_text = await generation_service.generate_response(
-            model_id=target_model,
-            messages=request.messages,
-            parameters=chat_settings
-        )
+        # Check the shared cache before running generation
+        cache_key = None
+        response_text = None
+        if app.state.redis is not None and is_cacheable(chat_settings):
+            cache_key = f"generate:{make_cache_key(target_model, request.messages, chat_settings)}"
+            response_text = await _redis_get(cache_key)
+        
+        if response_text is None:
+            if app.state.generation_handle is not None:
+                # Running under Ray Serve - generation happens on the replica pool; requests are
+                # not pinned to a replica, so session key/values are not reused there
+                result = await app.state.generation_handle.remote(
+                    target_model, request.messages, chat_settings
+                )
+            else:
+                result = await generate_text(
+                    target_model, request.messages, chat_settings, context, session_id=request.session_id
+                )
+            response_text = result.text
+            # Fallback responses (model not loaded or generation failed) must not be shared
+            if cache_key is not None and not result.fallback:
+                await _redis_set(cache_key, response_text)
         
-        return GenerateResponse(
+        response = GenerateResponse(
             response=response_text,
             model=target_model,
             usage={
-                "prompt_tokens": len(str(request.messages)),
+                "prompt_tokens": context.prompt_chars,
                 "completion_tokens": len(response_text),
-                "total_tokens": len(str(request.messages)) + len(response_text)
+                "total_tokens": context.prompt_chars + len(response_text)
             }
         )
+        # Serialized by pydantic-core directly, skipping FastAPI's response_model re-validation
+        return Response(content=response.model_dump_json(), media_type="application/json")
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error generating response: {e}")
+        logger.error("Error generating response: %s", e)
         raise HTTPException(status_code=500, detail=f"Generation failed: {str(e)}")
 
 
-@app.post("/chat", response_model=GenerateResponse)
-async def chat_completion(request: GenerateRequest):
+@app.post("/generate/stream", openapi_extra=GENERATE_REQUEST_OPENAPI)
+async def generate_stream(request: GenerateRequest = Depends(parse_generate_request)):
+    """Stream an AI response as Server-Sent Events"""
+    target_model = _resolve_model(request.model)
+    context = MessageContext.from_messages(request.messages)
+    
+    async def sse_iter() -> AsyncIterator[bytes]:
+        try:
+            if app.state.generation_handle is not None:
+                # Running under Ray Serve - the replica streams its chunks back through the handle
+                chunks = app.state.generation_handle.options(stream=True, method_name="stream").remote(
+                    target_model, request.messages, request.parameters or {}
+                )
+            else:
+                chunks = generation_service.stream_response(
+                    model_id=target_model,
+                    messages=request.messages,
+                    parameters=request.parameters or {},
+                    context=context
+                )
+            async for chunk in chunks:
+                yield _sse_event({"token": chunk})
+            yield _sse_event({"model": target_model}, event="done")
+        except Exception as e:
+            logger.error("Error streaming response: %s", e)
+            yield _sse_event({"detail": f"Generation failed: {str(e)}"}, event="error")
+    
+    return StreamingResponse(sse_iter(), media_type="text/event-stream")
+
+
+@app.post("/chat", response_model=GenerateResponse, openapi_extra=GENERATE_REQUEST_OPENAPI)
+async def chat_completion(request: GenerateRequest = Depends(parse_generate_request)):
     """Chat completion endpoint (alias for generate)"""
     return await generate_response(request)
 
@@ -116,10 +350,10 @@ async def chat_completion(request: GenerateRequest):
 async def list_models():
     """List all available AI models"""
     try:
-        models = model_loader.get_available_models()
+        models, _ = _get_models()
         return {"models": models}
     except Exception as e:
-        logger.error(f"Failed to list models: {e}")
+        logger.error("Failed to list models: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to list models: {str(e)}")
 
 
@@ -127,50 +361,62 @@ async def list_models():
 async def get_model_status(model_id: str):
     """Get status of a specific model"""
     try:
-        available_models = model_loader.get_available_models()
-        model = next((m for m in available_models if m["id"] == model_id), None)
+        _, models_by_id = _get_models()
+        model = models_by_id.get(model_id)
         if not model:
             raise HTTPException(status_code=404, detail=f"Model {model_id} not found")
         
         return {
             "model_id": model_id,
             "status": "loaded" if model["is_loaded"] else "available",
+            "quantization": model["quantization"],
             "memory_usage": model["memory_usage"]
         }
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Failed to get model status: {e}")
+        logger.error("Failed to get model status: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to get model status: {str(e)}")
 
 
-@app.post("/models/{model_id:path}/load")
-async def load_model_endpoint(model_id: str):
-    """Load a specific model"""
+@app.post("/models/{model_id:path}/load", dependencies=[Depends(_require_local_generation)])
+async def load_model_endpoint(
+    model_id: str,
+    quantization: Optional[Quantization] = Query(None),
+    load_format: LoadFormat = Query("auto"),
+    memory_budget_mb: Optional[int] = Query(None, gt=0)
+):
+    """Load a specific model, optionally quantized"""
     try:
-        available_models = model_loader.get_available_models()
-        model = next((m for m in available_models if m["id"] == model_id), None)
+        _, models_by_id = _get_models()
+        model = models_by_id.get(model_id)
         if not model:
             raise HTTPException(status_code=404, detail=f"Model {model_id} not found")
         
         # Actually load the model using model_loader
-        success = await model_loader.load_model(model_id)
+        success = await model_loader.load_model(
+            model_id,
+            quantization=quantization,
+            load_format=load_format,
+            memory_budget_mb=memory_budget_mb
+        )
         if not success:
             raise HTTPException(status_code=500, detail=f"Failed to load model {model_id}")
         
         return {
             "status": "loaded",
             "model_id": model_id,
+            "quantization": model_loader.get_quantization(model_id),
             "message": f"Model {model_id} loaded successfully"
         }
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Failed to load model {model_id}: {e}")
+        logger.error("Failed to load model %s: %s", model_id, e)
         raise HTTPException(status_code=500, detail=f"Failed to load model: {str(e)}")
 
 
-@app.delete("/models/{model_id:path}/unload")
+@app.delete("/models/{model_id:path}/unload", dependencies=[Depends(_require_local_generation)])
 async def unload_model_endpoint(model_id: str):
     """Unload a specific model"""
     try:
@@ -190,22 +436,22 @@ async def unload_model_endpoint(model_id: str):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Failed to unload model {model_id}: {e}")
+        logger.error("Failed to unload model %s: %s", model_id, e)
         raise HTTPException(status_code=500, detail=f"Failed to unload model: {str(e)}")
 
 
-@app.post("/models/{model_id:path}/switch")
-async def switch_model(model_id: str):
+@app.post("/models/{model_id:path}/switch", dependencies=[Depends(_require_local_generation)])
+async def switch_model(model_id: str, quantization: Optional[Quantization] = Query(None)):
     """Switch to a specific model"""
     try:
-        available_models = model_loader.get_available_models()
-        model = next((m for m in available_models if m["id"] == model_id), None)
+        _, models_by_id = _get_models()
+        model = models_by_id.get(model_id)
         if not model:
             raise HTTPException(status_code=404, detail=f"Model {model_id} not found")
         
         # Load the model if not already loaded
         if not model_loader.is_model_loaded(model_id):
-            success = await model_loader.load_model(model_id)
+            success = await model_loader.load_model(model_id, quantization=quantization)
             if not success:
                 raise HTTPException(status_code=500, detail=f"Failed to load model {model_id}")
         
@@ -214,7 +460,7 @@ async def switch_model(model_id: str):
         if not success:
             raise HTTPException(status_code=500, detail=f"Failed to set current model to {model_id}")
         
-        logger.info(f"Switched to model: {model_id}")
+        logger.info("Switched to model: %s", model_id)
         
         return {
             "status": "success",
@@ -224,10 +470,25 @@ async def switch_model(model_id: str):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Failed to switch to model {model_id}: {e}")
+        logger.error("Failed to switch to model %s: %s", model_id, e)
         raise HTTPException(status_code=500, detail=f"Failed to switch model: {str(e)}")
 
 
+@app.get("/cache/stats", dependencies=[Depends(_require_local_generation)])
+async def get_cache_stats():
+    """Get response cache statistics"""
+    return generation_service.response_cache.stats()
+
+
+@app.post("/cache/clear", dependencies=[Depends(_require_local_generation)])
+async def clear_cache():
+    """Clear the response cache"""
+    generation_service.response_cache.clear()
+    if generation_service.persistent_cache is not None:
+        generation_service.persistent_cache.clear()
+    return {"status": "cleared"}
+
+
 @app.get("/models/current")
 async def get_current_model():
     """Get the currently active model"""
@@ -235,10 +496,20 @@ async def get_current_model():
         current = model_loader.get_current_model()
         return {"current_model": current}
     except Exception as e:
-        logger.error(f"Failed to get current model: {e}")
+        logger.error("Failed to get current model: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to get current model: {str(e)}")
 
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
+    # uvloop/httptools for lower dispatch overhead; long keep-alive for chat clients reusing connections
+    uvicorn.run(
+        "app.main:app",
+        host="0.0.0.0",
+        port=8001,
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.getenv("WORKERS", "1")),
+        timeout_keep_alive=75,
+        backlog=2048
+    )
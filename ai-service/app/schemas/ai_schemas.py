@@ -1,25 +1,35 @@
-from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Optional
+from pydantic import BaseModel, ConfigDict, Field
+from typing import List, Dict, Any, Literal, Optional
 
 
 class Message(BaseModel):
     """Represents a single message in a conversation"""
-    role: str = Field(..., description="Role of the message sender (user, assistant, system)")
+    model_config = ConfigDict(frozen=True, extra="forbid")
+    
+    role: Literal["user", "assistant", "system"] = Field(..., description="Role of the message sender (user, assistant, system)")
     content: str = Field(..., description="Content of the message")
 
 
 class GenerateRequest(BaseModel):
     """Request for AI text generation"""
+    model_config = ConfigDict(frozen=True, extra="forbid")
+    
     model: Optional[str] = Field(default=None, description="Model ID to use for generation")
     messages: List[Message] = Field(..., description="List of messages in the conversation")
     parameters: Optional[Dict[str, Any]] = Field(
         default=None,
         description="Generation parameters (temperature, max_tokens, etc.)"
     )
+    session_id: Optional[str] = Field(
+        default=None,
+        description="Conversation ID whose cached key/values are reused across turns"
+    )
 
 
 class GenerateResponse(BaseModel):
     """Response from AI text generation"""
+    model_config = ConfigDict(frozen=True, extra="forbid")
+    
     response: str = Field(..., description="Generated response text")
     model: str = Field(..., description="Model ID used for generation")
     usage: Dict[str, int] = Field(..., description="Token usage statistics")
@@ -0,0 +1,75 @@
+"""
+Ray Serve entrypoint for running generation on a pool of model replicas.
+
+Run with `serve run app.serve:deployment` after installing `ray[serve]`.
+The FastAPI app is served by a single ingress; /generate delegates
+generation to the GenerationDeployment replicas. Each replica starts its
+own micro-batcher and default model and loads requested models on demand,
+so the model load, unload and switch routes and the cache routes are
+disabled on the ingress. /generate/stream is streamed from a replica.
+"""
+
+import os
+from typing import Any, AsyncIterator, Dict, List
+
+from ray import serve
+from ray.serve.handle import DeploymentHandle
+
+from .main import app, select_default_model
+from .schemas.ai_schemas import Message
+from .services.generation_service import GenerationResult
+
+REPLICAS = int(os.getenv("REPLICAS", "2"))
+REPLICA_GPUS = float(os.getenv("REPLICA_GPUS", "0"))
+MAX_REPLICAS = int(os.getenv("MAX_REPLICAS", "8"))
+
+
+@serve.deployment(
+    autoscaling_config={
+        "min_replicas": 1,
+        "initial_replicas": REPLICAS,
+        "max_replicas": MAX_REPLICAS,
+        "target_ongoing_requests": 2,
+    },
+    ray_actor_options={"num_gpus": REPLICA_GPUS},
+)
+class GenerationDeployment:
+    """Model replica owning its own ModelLoader and GenerationService"""
+
+    async def __init__(self):
+        # Each replica process imports its own copy of the service globals and, since
+        # replicas never run the app lifespan, starts generation itself
+        from . import main
+
+        self.main = main
+        self.inference_pool = await main.start_generation()
+
+    async def __call__(
+        self,
+        model_id: str,
+        messages: List[Message],
+        parameters: Dict[str, Any]
+    ) -> GenerationResult:
+        return await self.main.generate_text(model_id, messages, parameters)
+
+    async def stream(
+        self,
+        model_id: str,
+        messages: List[Message],
+        parameters: Dict[str, Any]
+    ) -> AsyncIterator[str]:
+        async for chunk in self.main.generation_service.stream_response(model_id, messages, parameters):
+            yield chunk
+
+
+@serve.deployment
+@serve.ingress(app)
+class APIIngress:
+    """Serves the existing FastAPI routes, routing generation to the replica pool"""
+
+    def __init__(self, generation: DeploymentHandle):
+        select_default_model()
+        app.state.generation_handle = generation
+
+
+deployment = APIIngress.bind(GenerationDeployment.bind())
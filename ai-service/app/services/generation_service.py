@@ -1,39 +1,179 @@
+import asyncio
 import logging
-from typing import List, Dict, Any
+import re
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import List, Dict, Any, AsyncIterator, FrozenSet, Callable, NamedTuple, Optional
 from ..schemas.ai_schemas import Message
 from .model_loader import ModelLoader
+from .micro_batcher import MicroBatcher
+from .response_cache import (
+    ResponseCache, PersistentResponseCache, RESPONSE_CACHE_DIR, make_cache_key, is_cacheable
+)
 
 logger = logging.getLogger(__name__)
 
+# Keyword -> category table used by the canned response generators
+KEYWORD_CATEGORIES = {
+    "hello": "greeting",
+    "hi": "greeting",
+    "help": "help",
+    "what can you do": "help",
+    "capabilities": "capabilities",
+    "code": "code",
+    "programming": "code",
+    "python": "code",
+    "javascript": "code",
+    "thank": "thanks",
+    "thanks": "thanks",
+    "explain": "explain",
+    "how": "explain",
+    "why": "explain",
+    "what is": "explain",
+}
+
+# Zero-width lookahead so overlapping keywords are all reported in a single scan
+_KEYWORD_PATTERN = re.compile(
+    "(?=(" + "|".join(re.escape(k) for k in sorted(KEYWORD_CATEGORIES, key=len, reverse=True)) + "))"
+)
+
+
+# Friendly display names for known models
+MODEL_DISPLAY_NAMES = MappingProxyType({
+    "facebook/blenderbot-400M-distill": "BlenderBot",
+    "microsoft/DialoGPT-small": "DialoGPT",
+})
+
+# Model-appropriate greetings
+MODEL_GREETINGS = MappingProxyType({
+    "gpt-3.5-turbo": "Hello! I'm ChatGPT, powered by GPT-3.5. How can I assist you today?",
+    "gpt-4": "Hello! I'm ChatGPT, powered by GPT-4. I'm here to help with any questions or tasks you have.",
+    "claude-instant": "Hello! I'm Claude, an AI assistant created by Anthropic. How can I help you today?",
+    "llama-2-7b": "Hello! I'm LLaMA 2, a conversational AI model. What would you like to discuss?"
+})
+
+
+class GenerationResult(NamedTuple):
+    """Generated text and whether it is a canned fallback rather than model output"""
+    text: str
+    fallback: bool = False
+
+
+def classify_message(message_lower: str) -> FrozenSet[str]:
+    """Get the keyword categories present in a lowercased message"""
+    return frozenset(KEYWORD_CATEGORIES[match.group(1)] for match in _KEYWORD_PATTERN.finditer(message_lower))
+
+
+@dataclass(slots=True)
+class MessageContext:
+    """Conversation facts gathered in a single pass over the messages"""
+    system_count: int = 0
+    system_prompt_length: int = 0
+    conversation_length: int = 0
+    prompt_chars: int = 0
+    last_user_message: Optional[str] = None
+    
+    @property
+    def has_system_prompt(self) -> bool:
+        return self.system_count > 0
+    
+    @property
+    def message_lower(self) -> str:
+        return (self.last_user_message or "").lower()
+    
+    @classmethod
+    def from_messages(cls, messages: List[Message]) -> "MessageContext":
+        """Build the context with one loop over the conversation"""
+        context = cls()
+        for msg in messages:
+            role = msg.role
+            # Role, content and separator overhead approximates the prompt size
+            context.prompt_chars += len(msg.content) + len(role) + 4
+            if role == "system":
+                context.system_count += 1
+                context.system_prompt_length += len(msg.content)
+            elif role == "user":
+                context.conversation_length += 1
+                context.last_user_message = msg.content
+            elif role == "assistant":
+                context.conversation_length += 1
+        return context
+
 
 class GenerationService:
     """Handles AI text generation using loaded models"""
     
-    def __init__(self, model_loader: ModelLoader):
+    def __init__(
+        self,
+        model_loader: ModelLoader,
+        response_cache: ResponseCache = None,
+        persistent_cache: Optional[PersistentResponseCache] = None
+    ):
         self.model_loader = model_loader
+        self.response_cache = response_cache if response_cache is not None else ResponseCache()
+        # Optional on-disk tier behind the in-process cache, kept across restarts
+        if persistent_cache is None and RESPONSE_CACHE_DIR:
+            persistent_cache = PersistentResponseCache(RESPONSE_CACHE_DIR)
+        self.persistent_cache = persistent_cache
+        self.batcher = MicroBatcher(model_loader)
+        
+        # Model-specific response generators, resolved once
+        self._model_dispatch: Dict[str, Callable[..., str]] = {
+            "gpt-4": self._generate_gpt4_response,
+            "gpt-3.5-turbo": self._generate_gpt35_response,
+            "claude-instant": self._generate_claude_response,
+            "llama-2-7b": self._generate_llama_response,
+        }
     
     async def generate_response(
         self, 
         model_id: str, 
         messages: List[Message], 
-        parameters: Dict[str, Any] = None
+        parameters: Dict[str, Any] = None,
+        context: Optional[MessageContext] = None,
+        session_id: Optional[str] = None
     ) -> str:
         """Generate response using the specified model"""
+        result = await self.generate(model_id, messages, parameters, context, session_id)
+        return result.text
+    
+    async def generate(
+        self,
+        model_id: str,
+        messages: List[Message],
+        parameters: Dict[str, Any] = None,
+        context: Optional[MessageContext] = None,
+        session_id: Optional[str] = None
+    ) -> GenerationResult:
+        """Generate a response, flagging fallbacks so callers never cache them"""
         
-        logger.debug(f"Starting generation - Model: {model_id}")
-        logger.debug(f"Message count: {len(messages)}")
-        logger.debug(f"Input parameters: {parameters}")
+        logger.debug("Starting generation - Model: %s", model_id)
+        logger.debug("Message count: %d", len(messages))
+        logger.debug("Input parameters: %s", parameters)
+        
+        # Serve deterministic repeats straight from the response cache
+        cache_key = None
+        if is_cacheable(parameters):
+            cache_key = make_cache_key(model_id, messages, parameters)
+            cached = self.response_cache.get(cache_key)
+            if cached is None and self.persistent_cache is not None:
+                cached = await asyncio.to_thread(self.persistent_cache.get, cache_key)
+                if cached is not None:
+                    self.response_cache.set(cache_key, cached)
+            if cached is not None:
+                logger.debug("Response cache hit - Model: %s", model_id)
+                return GenerationResult(cached)
         
         try:
             # Check if model is loaded
             if not self.model_loader.is_model_loaded(model_id):
                 # Try to load the model first
-                logger.info(f"Model {model_id} not loaded, attempting to load...")
+                logger.info("Model %s not loaded, attempting to load...", model_id)
                 success = await self.model_loader.load_model(model_id)
                 if not success:
                     # Fallback to a mock response if model loading fails
-                    logger.warning(f"Failed to load model {model_id}, falling back to mock response")
-                    return self._generate_fallback_response(model_id, messages)
+                    logger.warning("Failed to load model %s, falling back to mock response", model_id)
+                    return self._fallback_result(model_id, messages, context)
             
             # Convert Message objects to dictionaries for model_loader
             message_dicts = [
@@ -41,118 +181,140 @@ class GenerationService:
                 for msg in messages
             ]
             
-            # Use the real model to generate response
-            response = await self.model_loader.generate_response(
-                model_name=model_id,
-                messages=message_dicts,
-                parameters=parameters
-            )
+            if session_id is not None and self.model_loader.use_session(model_id, session_id, message_dicts):
+                # Decoder-only session requests continue their own cached key/values, so they are
+                # not batched; everything else, BlenderBot included, goes through the batcher
+                response = await self.model_loader.generate_response(
+                    model_name=model_id,
+                    messages=message_dicts,
+                    parameters=parameters,
+                    session_id=session_id
+                )
+            else:
+                # Use the real model to generate response, batched with concurrent requests
+                response = await self.batcher.submit(
+                    model_name=model_id,
+                    messages=message_dicts,
+                    parameters=parameters
+                )
+            
+            logger.debug("Generation completed - Model: %s, Response length: %d chars", model_id, len(response))
             
-            logger.debug(f"Generation completed - Model: {model_id}, Response length: {len(response)} chars")
-            return response
+            if cache_key is not None:
+                self.response_cache.set(cache_key, response)
+                if self.persistent_cache is not None:
+                    await asyncio.to_thread(self.persistent_cache.set, cache_key, response)
+            return GenerationResult(response)
             
         except Exception as e:
-            logger.error(f"Generation failed for model {model_id}: {e}")
+            logger.error("Generation failed for model %s: %s", model_id, e)
             # Return fallback response instead of raising exception
-            return self._generate_fallback_response(model_id, messages)
+            return self._fallback_result(model_id, messages, context)
     
-    def _generate_fallback_response(self, model_id: str, messages: List[Message]) -> str:
+    async def stream_response(
+        self,
+        model_id: str,
+        messages: List[Message],
+        parameters: Dict[str, Any] = None,
+        context: Optional[MessageContext] = None
+    ) -> AsyncIterator[str]:
+        """Stream a response from the specified model as text chunks"""
+        if not self.model_loader.is_model_loaded(model_id):
+            logger.info("Model %s not loaded, attempting to load...", model_id)
+            if not await self.model_loader.load_model(model_id):
+                logger.warning("Failed to load model %s, falling back to mock response", model_id)
+                yield self._generate_fallback_response(model_id, context or MessageContext.from_messages(messages))
+                return
+        
+        message_dicts = [
+            {"role": msg.role, "content": msg.content}
+            for msg in messages
+        ]
+        async for chunk in self.model_loader.stream_response(model_id, message_dicts, parameters):
+            yield chunk
+    
+    def _fallback_result(self, model_id: str, messages: List[Message], context: Optional[MessageContext]) -> GenerationResult:
+        """Wrap the fallback response so it is kept out of every response cache"""
+        text = self._generate_fallback_response(model_id, context or MessageContext.from_messages(messages))
+        return GenerationResult(text, fallback=True)
+    
+    def _generate_fallback_response(self, model_id: str, context: MessageContext) -> str:
         """Generate fallback response when model fails"""
-        user_messages = [msg for msg in messages if msg.role == "user"]
-        if not user_messages:
+        latest_message = context.last_user_message
+        if latest_message is None:
             return f"Hello! I'm {self._get_model_display_name(model_id)}. How can I help you today?"
         
-        latest_message = user_messages[-1].content
         return f"I understand you're asking about '{latest_message}'. I'm {self._get_model_display_name(model_id)}, and I'm here to help, though I'm currently running in a limited mode."
     
     def _get_model_display_name(self, model_id: str) -> str:
         """Get friendly display name for model"""
-        name_map = {
-            "facebook/blenderbot-400M-distill": "BlenderBot",
-            "microsoft/DialoGPT-small": "DialoGPT",
-        }
-        return name_map.get(model_id, model_id.split("/")[-1])
+        display_name = MODEL_DISPLAY_NAMES.get(model_id)
+        if display_name is None:
+            display_name = model_id.split("/")[-1]
+        return display_name
     
     def _get_greeting_response(self, model_id: str) -> str:
         """Generate model-appropriate greeting"""
-        greetings = {
-            "gpt-3.5-turbo": "Hello! I'm ChatGPT, powered by GPT-3.5. How can I assist you today?",
-            "gpt-4": "Hello! I'm ChatGPT, powered by GPT-4. I'm here to help with any questions or tasks you have.",
-            "claude-instant": "Hello! I'm Claude, an AI assistant created by Anthropic. How can I help you today?",
-            "llama-2-7b": "Hello! I'm LLaMA 2, a conversational AI model. What would you like to discuss?"
-        }
-        return greetings.get(model_id, "Hello! How can I help you today?")
+        return MODEL_GREETINGS.get(model_id, "Hello! How can I help you today?")
     
-    def _generate_contextual_response(self, model_id: str, user_message: str, messages: List[Message], parameters: Dict[str, Any] = None) -> str:
+    def _generate_contextual_response(self, model_id: str, user_message: str, context: MessageContext, parameters: Dict[str, Any] = None) -> str:
         """Generate contextual response based on model and message content"""
         # Analyze message content for context
-        message_lower = user_message.lower()
-        
-        # Get conversation context
-        conversation_length = len([msg for msg in messages if msg.role in ["user", "assistant"]])
-        has_system_prompt = any(msg.role == "system" for msg in messages)
+        categories = classify_message(user_message.lower())
         
         # Model-specific response patterns
-        if model_id == "gpt-4":
-            return self._generate_gpt4_response(user_message, message_lower, conversation_length, has_system_prompt)
-        elif model_id == "gpt-3.5-turbo":
-            return self._generate_gpt35_response(user_message, message_lower, conversation_length, has_system_prompt)
-        elif model_id == "claude-instant":
-            return self._generate_claude_response(user_message, message_lower, conversation_length, has_system_prompt)
-        elif model_id == "llama-2-7b":
-            return self._generate_llama_response(user_message, message_lower, conversation_length, has_system_prompt)
-        else:
-            return self._generate_default_response(user_message, message_lower, conversation_length, has_system_prompt)
+        generate = self._model_dispatch.get(model_id, self._generate_default_response)
+        return generate(user_message, categories, context.conversation_length, context.has_system_prompt)
     
-    def _generate_gpt4_response(self, user_message: str, message_lower: str, conversation_length: int, has_system_prompt: bool) -> str:
+    def _generate_gpt4_response(self, user_message: str, categories: FrozenSet[str], conversation_length: int, has_system_prompt: bool) -> str:
         """Generate GPT-4 style response"""
-        if "hello" in message_lower or "hi" in message_lower:
+        if "greeting" in categories:
             return "Hello! I'm GPT-4, ready to help with complex reasoning, analysis, and creative tasks. What would you like to explore today?"
-        elif any(word in message_lower for word in ["help", "what can you do", "capabilities"]):
+        elif "help" in categories or "capabilities" in categories:
             return "I'm GPT-4, and I can help with a wide range of tasks including complex analysis, creative writing, coding, math problem solving, research assistance, and nuanced conversations. I'm designed to provide detailed, accurate, and thoughtful responses. What specific area interests you?"
-        elif any(word in message_lower for word in ["code", "programming", "python", "javascript"]):
+        elif "code" in categories:
             return "I'd be happy to help with programming! I can assist with code writing, debugging, explaining concepts, reviewing code, and solving algorithmic problems across many programming languages. What coding challenge are you working on?"
-        elif any(word in message_lower for word in ["explain", "how", "why", "what is"]):
+        elif "explain" in categories:
             return f"I'd be glad to explain that for you. Let me break down '{user_message}' in a clear and comprehensive way. Could you specify which aspect you'd like me to focus on, or would you like a general overview?"
         else:
             return f"That's an interesting point about '{user_message}'. As GPT-4, I can provide a detailed analysis of this topic. Let me consider the various aspects and implications involved..."
     
-    def _generate_gpt35_response(self, user_message: str, message_lower: str, conversation_length: int, has_system_prompt: bool) -> str:
+    def _generate_gpt35_response(self, user_message: str, categories: FrozenSet[str], conversation_length: int, has_system_prompt: bool) -> str:
         """Generate GPT-3.5 Turbo style response"""
-        if "hello" in message_lower or "hi" in message_lower:
+        if "greeting" in categories:
             return "Hi there! I'm ChatGPT powered by GPT-3.5 Turbo. I'm here to help with your questions and tasks. How can I assist you?"
-        elif any(word in message_lower for word in ["help", "what can you do"]):
+        elif "help" in categories:
             return "I'm GPT-3.5 Turbo and I can help with many things: answering questions, writing, coding, analysis, math, creative tasks, and more. What would you like help with?"
-        elif any(word in message_lower for word in ["thank", "thanks"]):
+        elif "thanks" in categories:
             return "You're welcome! I'm happy to help. Is there anything else you'd like to know or discuss?"
         else:
             return f"Regarding '{user_message}', I can help you with that. Let me provide you with a helpful response based on what you've asked."
     
-    def _generate_claude_response(self, user_message: str, message_lower: str, conversation_length: int, has_system_prompt: bool) -> str:
+    def _generate_claude_response(self, user_message: str, categories: FrozenSet[str], conversation_length: int, has_system_prompt: bool) -> str:
         """Generate Claude style response"""
-        if "hello" in message_lower or "hi" in message_lower:
+        if "greeting" in categories:
             return "Hello! I'm Claude, an AI assistant made by Anthropic. I'm here to help with a wide variety of tasks. What can I assist you with today?"
-        elif any(word in message_lower for word in ["help", "what can you do"]):
+        elif "help" in categories:
             return "I'm Claude, and I aim to be helpful, harmless, and honest. I can assist with analysis, writing, math, coding, creative projects, answering questions, and having thoughtful conversations. How can I help you today?"
-        elif any(word in message_lower for word in ["thank", "thanks"]):
+        elif "thanks" in categories:
             return "You're very welcome! I'm glad I could be helpful. Please feel free to ask if you have any other questions."
         else:
             return f"I'd be happy to help you with '{user_message}'. Let me think about this carefully and provide you with a thoughtful response."
     
-    def _generate_llama_response(self, user_message: str, message_lower: str, conversation_length: int, has_system_prompt: bool) -> str:
+    def _generate_llama_response(self, user_message: str, categories: FrozenSet[str], conversation_length: int, has_system_prompt: bool) -> str:
         """Generate LLaMA style response"""
-        if "hello" in message_lower or "hi" in message_lower:
+        if "greeting" in categories:
             return "Hello! I'm LLaMA 2, a large language model trained by Meta. I'm designed to be helpful and provide informative responses. What would you like to talk about?"
-        elif any(word in message_lower for word in ["help", "what can you do"]):
+        elif "help" in categories:
             return "I'm LLaMA 2, and I can help with various tasks like answering questions, explaining concepts, helping with writing, and engaging in conversations. I aim to be helpful while being factual and balanced. What interests you?"
         else:
             return f"Regarding your message about '{user_message}', I'll do my best to provide you with a helpful and informative response."
     
-    def _generate_default_response(self, user_message: str, message_lower: str, conversation_length: int, has_system_prompt: bool) -> str:
+    def _generate_default_response(self, user_message: str, categories: FrozenSet[str], conversation_length: int, has_system_prompt: bool) -> str:
         """Generate default response for unknown models"""
-        if "hello" in message_lower or "hi" in message_lower:
+        if "greeting" in categories:
             return "Hello! I'm an AI assistant. How can I help you today?"
-        elif any(word in message_lower for word in ["help", "what can you do"]):
+        elif "help" in categories:
             return "I'm an AI assistant that can help with questions, provide information, assist with writing, and engage in conversations. What would you like help with?"
         else:
             return f"I understand you're asking about '{user_message}'. I'll do my best to provide a helpful response."
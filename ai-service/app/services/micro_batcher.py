@@ -0,0 +1,171 @@
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .model_loader import ModelLoader
+
+logger = logging.getLogger(__name__)
+
+# Largest number of requests merged into one forward pass
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "8"))
+# How long the first request in a batch waits for others to arrive
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "10"))
+# Batches allowed to run at once; later arrivals keep filling the next batch meanwhile
+BATCH_MAX_INFLIGHT = int(os.getenv("BATCH_MAX_INFLIGHT", os.getenv("INFER_THREADS", "2")))
+
+
+class _PendingRequest:
+    """A queued generation request and the future awaiting its result"""
+    __slots__ = ("model_name", "messages", "parameters", "future")
+
+    def __init__(self, model_name: str, messages: List[Dict[str, str]], parameters: Optional[Dict[str, Any]], future: asyncio.Future):
+        self.model_name = model_name
+        self.messages = messages
+        self.parameters = parameters
+        self.future = future
+
+
+class MicroBatcher:
+    """Collects concurrent generation requests into batched model calls"""
+
+    def __init__(
+        self,
+        model_loader: ModelLoader,
+        max_batch_size: int = BATCH_MAX_SIZE,
+        max_wait_ms: float = BATCH_MAX_WAIT_MS,
+        max_inflight: int = BATCH_MAX_INFLIGHT
+    ):
+        self.model_loader = model_loader
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_inflight = max(1, max_inflight)
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._inflight: Set[asyncio.Task] = set()
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    async def start(self) -> None:
+        """Start the background batching task"""
+        if self._worker is not None or self.max_batch_size <= 1:
+            return
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.max_inflight)
+        self._worker = asyncio.create_task(self._run())
+        logger.info(f"Micro-batching enabled - max batch size: {self.max_batch_size}, max wait: {self.max_wait * 1000:.0f} ms")
+
+    async def stop(self) -> None:
+        """Stop batching and fail any requests still waiting in the queue"""
+        if self._worker is None:
+            return
+
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+        while not self._queue.empty():
+            pending = self._queue.get_nowait()
+            if not pending.future.done():
+                pending.future.set_exception(RuntimeError("Micro-batcher stopped"))
+        self._queue = None
+
+    async def submit(
+        self,
+        model_name: str,
+        messages: List[Dict[str, str]],
+        parameters: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """Queue a request and wait for its response"""
+        if self._worker is None:
+            # Batching disabled or not started - generate directly
+            return await self.model_loader.generate_response(
+                model_name=model_name,
+                messages=messages,
+                parameters=parameters
+            )
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(_PendingRequest(model_name, messages, parameters, future))
+        return await future
+
+    async def _run(self) -> None:
+        """Collect arrivals within the wait window and dispatch them as batches"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                # Wait for a free inference slot; requests arriving meanwhile join this batch
+                await self._slots.acquire()
+            except asyncio.CancelledError:
+                self._fail(batch, RuntimeError("Micro-batcher stopped"))
+                raise
+            while len(batch) < self.max_batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            # One generate() call can only use a single model and generation config
+            groups: Dict[Tuple[Any, ...], List[_PendingRequest]] = {}
+            for pending in batch:
+                try:
+                    key = (pending.model_name, self.model_loader.get_generation_settings(pending.parameters))
+                except Exception as e:
+                    if not pending.future.done():
+                        pending.future.set_exception(e)
+                    continue
+                groups.setdefault(key, []).append(pending)
+
+            if not groups:
+                self._slots.release()
+                continue
+            pending_groups = list(groups.values())
+            for index, group in enumerate(pending_groups):
+                if index > 0:
+                    # The first group runs in the slot acquired above
+                    try:
+                        await self._slots.acquire()
+                    except asyncio.CancelledError:
+                        for waiting in pending_groups[index:]:
+                            self._fail(waiting, RuntimeError("Micro-batcher stopped"))
+                        raise
+                task = asyncio.create_task(self._generate_group(group))
+                self._inflight.add(task)
+                task.add_done_callback(self._inflight.discard)
+
+    def _fail(self, requests: List[_PendingRequest], error: Exception) -> None:
+        """Fail every request that is still waiting"""
+        for pending in requests:
+            if not pending.future.done():
+                pending.future.set_exception(error)
+
+    async def _generate_group(self, group: List[_PendingRequest]) -> None:
+        """Run one batched generation and fan results back to the waiting requests"""
+        first = group[0]
+        try:
+            responses = await self.model_loader.generate_response_batch(
+                first.model_name,
+                [pending.messages for pending in group],
+                first.parameters
+            )
+        except Exception as e:
+            self._fail(group, e)
+            return
+        finally:
+            self._slots.release()
+
+        if len(group) > 1:
+            logger.debug(f"Batched generation completed - Model: {first.model_name}, Batch size: {len(group)}")
+        for pending, response in zip(group, responses):
+            if not pending.future.done():
+                pending.future.set_result(response)
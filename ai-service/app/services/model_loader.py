@@ -1,58 +1,272 @@
 import os
-import torch
+import asyncio
+import copy
+import hashlib
+import importlib.util
+import itertools
+import threading
 import logging
-from typing import Dict, Any, Optional, List
-from transformers import (
-    AutoTokenizer, AutoModelForCausalLM,
-    BlenderbotTokenizer, BlenderbotForConditionalGeneration,
-    pipeline
-)
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Any, AsyncIterator, Optional, List, Tuple
 import gc
 
+# torch and transformers are imported where they are used, so importing the service stays cheap
+if TYPE_CHECKING:
+    import torch
+
+from .prefix_cache import PrefixKVCache, SessionKVCache, block_keys
+from .weight_prefetch import (
+    find_snapshot, find_weight_files, prefetch_safetensors, load_safetensors_direct, map_safetensors, resident_bytes
+)
+
 logger = logging.getLogger(__name__)
 
+# Weight formats accepted by load_model; None keeps the full precision weights.
+# "awq" loads a checkpoint already quantized with AutoAWQ
+QUANTIZATION_MODES = ("fp16", "int8", "int4", "awq")
+# Quantization used when a load request does not ask for one; "none" keeps full precision
+DEFAULT_QUANTIZATION = os.getenv("QUANTIZATION", "none")
+# "prefetch" reads cached weight shards into the page cache in parallel before loading;
+# "direct" reads cached safetensors shards with O_DIRECT, bypassing the page cache;
+# "mmap" keeps weights in file-backed pages the kernel can evict and fault back in
+LOAD_FORMATS = ("auto", "prefetch", "direct", "mmap")
+# What "auto" resolves to when no memory budget forces mmap; prefetch speeds up cold starts
+AUTO_LOAD_FORMAT = os.getenv("LOAD_FORMAT", "prefetch")
+
+# Weight dtype for unquantized models; "auto" picks bf16 (or fp16) on GPU and float32 on CPU
+MODEL_DTYPE = os.getenv("MODEL_DTYPE", "auto")
+
+
+def select_device_and_dtype(dtype_name: str = MODEL_DTYPE) -> Tuple["torch.device", "torch.dtype"]:
+    """Pick the inference device and the weight dtype for unquantized models"""
+    import torch
+    
+    if torch.cuda.is_available():
+        device = torch.device("cuda")
+        auto_dtype = torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+    else:
+        device = torch.device("cpu")
+        # Many CPUs lack native bf16 kernels, so bf16 stays opt-in through MODEL_DTYPE
+        auto_dtype = torch.float32
+    
+    if dtype_name == "auto":
+        return device, auto_dtype
+    return device, getattr(torch, dtype_name)
+
+
+def build_quantization_kwargs(quantization: Optional[str], dtype: "torch.dtype") -> Dict[str, Any]:
+    """Build from_pretrained arguments for the requested quantization"""
+    import torch
+    
+    if quantization is None:
+        return {"torch_dtype": dtype}
+    if quantization not in QUANTIZATION_MODES:
+        raise ValueError(f"Unsupported quantization: {quantization}")
+    if quantization == "fp16":
+        return {"torch_dtype": torch.float16}
+    
+    if not torch.cuda.is_available():
+        if quantization in ("int4", "awq"):
+            raise ValueError(f"{quantization} quantization requires a CUDA device")
+        # int8 on CPU is applied after loading with dynamic quantization
+        return {"torch_dtype": torch.float32}
+    
+    if quantization == "awq":
+        # Arguments for AutoAWQForCausalLM.from_quantized
+        return {"fuse_layers": True, "device_map": "balanced"}
+    
+    from transformers import BitsAndBytesConfig
+    if quantization == "int8":
+        config = BitsAndBytesConfig(load_in_8bit=True)
+    else:
+        config = BitsAndBytesConfig(
+            load_in_4bit=True,
+            bnb_4bit_quant_type="nf4",
+            bnb_4bit_compute_dtype=torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+        )
+    return {"quantization_config": config, "device_map": "auto"}
+
+
+def attention_candidates() -> List[Dict[str, Any]]:
+    """List from_pretrained attention backend arguments, fastest first"""
+    import torch
+    import transformers
+    from packaging import version
+
+    flash = (
+        torch.cuda.is_available()
+        and torch.cuda.get_device_capability(0)[0] >= 8
+        and importlib.util.find_spec("flash_attn") is not None
+    )
+    if version.parse(transformers.__version__) >= version.parse("4.36"):
+        candidates = [{"attn_implementation": "sdpa"}]
+        if flash:
+            candidates.insert(0, {"attn_implementation": "flash_attention_2"})
+        return candidates
+    # Older releases only expose the FlashAttention-2 switch
+    return [{"use_flash_attention_2": True}] if flash else []
+
+
+def from_pretrained_with_attention(model_class, model_name: str, **kwargs):
+    """Load a model with the fastest attention backend its class supports"""
+    for attention in attention_candidates():
+        try:
+            return model_class.from_pretrained(model_name, **attention, **kwargs)
+        except (ValueError, ImportError) as e:
+            # Raised when the model class or install does not support the backend
+            logger.info(f"{attention} unavailable for {model_name}: {e}")
+    return model_class.from_pretrained(model_name, **kwargs)
+
+
+# Compile each loaded model's forward pass with torch.compile; needs a C/C++ toolchain on CPU
+TORCH_COMPILE = os.getenv("TORCH_COMPILE", "0") == "1"
+TORCH_COMPILE_MODE = os.getenv("TORCH_COMPILE_MODE", "reduce-overhead")
+# Release cached CUDA memory back to the driver when a model is unloaded
+AGGRESSIVE_FREE = os.getenv("AGGRESSIVE_FREE", "0") == "1"
+
+# Display names of the known models
+FRIENDLY_NAMES = {
+    "facebook/blenderbot-400M-distill": "BlenderBot 400M",
+    "microsoft/DialoGPT-small": "DialoGPT Small",
+    "facebook/blenderbot-1B-distill": "BlenderBot 1B",
+    "microsoft/DialoGPT-medium": "DialoGPT Medium",
+    "microsoft/DialoGPT-large": "DialoGPT Large"
+}
+
+# Memory estimates reported for models that are not loaded
+MODEL_SIZE_ESTIMATES = {
+    "facebook/blenderbot-400M-distill": "~1.6 GB",
+    "microsoft/DialoGPT-small": "~500 MB",
+    "facebook/blenderbot-1B-distill": "~4 GB",
+    "microsoft/DialoGPT-medium": "~1.5 GB",
+    "microsoft/DialoGPT-large": "~6 GB"
+}
+
+# Files that define a tokenizer; models whose copies match share one tokenizer object
+TOKENIZER_FILES = (
+    "tokenizer.json", "vocab.json", "merges.txt", "tokenizer_config.json",
+    "special_tokens_map.json", "added_tokens.json"
+)
+
+# Longest DialoGPT prompt in tokens; shorter when the model's context could not also fit the response
+MAX_PROMPT_TOKENS = 512
+# Most recent messages a DialoGPT prompt conditions on, for batched and session requests alike
+CONTEXT_MESSAGES = 5
+# Largest batch staged through the reusable CUDA input buffers; bigger ones allocate fresh tensors
+STAGING_MAX_BATCH = int(os.getenv("BATCH_MAX_SIZE", "8"))
+
+
+# Marks the end of a streamed generation on the output queue
+_STREAM_END = object()
+
+
+@lru_cache(maxsize=None)
+def _async_text_streamer_class():
+    """Build the streamer class on first use, once transformers is needed anyway"""
+    from transformers import TextStreamer
+    
+    class _AsyncTextStreamer(TextStreamer):
+        """Forwards decoded text from the generation thread to an asyncio queue"""
+        
+        def __init__(self, tokenizer, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue):
+            super().__init__(tokenizer, skip_prompt=True, skip_special_tokens=True)
+            self.loop = loop
+            self.queue = queue
+        
+        def on_finalized_text(self, text: str, stream_end: bool = False):
+            if text:
+                self.loop.call_soon_threadsafe(self.queue.put_nowait, text)
+    
+    return _AsyncTextStreamer
+
+
+class _CancelledCriteria:
+    """Stopping criterion that ends generation once the streaming consumer has gone away"""
+    
+    def __init__(self, cancelled: threading.Event):
+        self.cancelled = cancelled
+    
+    def __call__(self, input_ids, scores, **kwargs) -> bool:
+        return self.cancelled.is_set()
+
+
 class ModelLoader:
     """Manages loading and unloading of Hugging Face models"""
     
-    def __init__(self):
+    def __init__(self, quantization: str = DEFAULT_QUANTIZATION):
         self.loaded_models: Dict[str, Dict[str, Any]] = {}
         self.current_model: Optional[str] = None
+        # Executor for blocking inference; None uses the event loop's default executor
+        self.inference_pool: Optional[ThreadPoolExecutor] = None
         self.cache_dir = os.getenv('TRANSFORMERS_CACHE', '/app/.cache')
+        # Resolved on first use, which imports torch
+        self._device_and_dtype: Optional[Tuple["torch.device", "torch.dtype"]] = None
+        # Per-conversation DialoGPT key/values keyed by session id, bounded in bytes
+        self.sessions = SessionKVCache()
+        # Tokenizers shared by models with identical tokenizer files
+        self._tokenizer_cache: Dict[str, Any] = {}
+        # Pinned host and device input buffers, one set per inference thread
+        self._staging = threading.local()
+        self.quantization = None if quantization == "none" else quantization
+        if self.quantization is not None and self.quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"Unsupported quantization: {quantization}")
         
         # Define available models from environment or defaults
         default_models = os.getenv("DEFAULT_MODELS", "facebook/blenderbot-400M-distill,microsoft/DialoGPT-small")
         self.available_models = [model.strip() for model in default_models.split(",") if model.strip()]
+        # Name-derived details, computed once instead of on every listing
+        self._model_meta = {
+            name: {
+                "name": self._get_friendly_name(name),
+                "type": self._get_model_type(name),
+                "size_estimate": MODEL_SIZE_ESTIMATES.get(name, "~1 GB")
+            }
+            for name in self.available_models
+        }
         
-        logger.info(f"ModelLoader initialized with cache dir: {self.cache_dir}")
+        logger.info(
+            f"ModelLoader initialized with cache dir: {self.cache_dir}, "
+            f"quantization: {self.quantization or 'none'}"
+        )
         logger.info(f"Available models: {self.available_models}")
     
+    @property
+    def device(self) -> "torch.device":
+        """Device models are loaded onto"""
+        if self._device_and_dtype is None:
+            self._device_and_dtype = select_device_and_dtype()
+            logger.info(f"Inference device: {self._device_and_dtype[0]}, dtype: {self._device_and_dtype[1]}")
+        return self._device_and_dtype[0]
+    
+    @property
+    def dtype(self) -> "torch.dtype":
+        """Weight dtype of unquantized models"""
+        self.device
+        return self._device_and_dtype[1]
+    
     def get_available_models(self) -> List[Dict[str, Any]]:
         """Get list of available models with their status"""
         models = []
         
         # Add the configured models
-        for model_name in self.available_models:
-            model_info = {
+        for model_name, meta in self._model_meta.items():
+            is_loaded = model_name in self.loaded_models
+            models.append({
                 "id": model_name,
-                "name": self._get_friendly_name(model_name),
-                "type": self._get_model_type(model_name),
-                "is_loaded": model_name in self.loaded_models,
-                "memory_usage": self._get_memory_usage(model_name)
-            }
-            models.append(model_info)
+                "name": meta["name"],
+                "type": meta["type"],
+                "is_loaded": is_loaded,
+                "quantization": self.get_quantization(model_name),
+                "memory_usage": self._get_memory_usage(model_name) if is_loaded else meta["size_estimate"]
+            })
         
         return models
     
     def _get_friendly_name(self, model_name: str) -> str:
         """Convert model name to friendly display name"""
-        name_map = {
-            "facebook/blenderbot-400M-distill": "BlenderBot 400M",
-            "microsoft/DialoGPT-small": "DialoGPT Small",
-            "facebook/blenderbot-1B-distill": "BlenderBot 1B",
-            "microsoft/DialoGPT-medium": "DialoGPT Medium",
-            "microsoft/DialoGPT-large": "DialoGPT Large"
-        }
-        return name_map.get(model_name, model_name.split("/")[-1].replace("-", " ").title())
+        return FRIENDLY_NAMES.get(model_name, model_name.split("/")[-1].replace("-", " ").title())
     
     def _get_model_type(self, model_name: str) -> str:
         """Determine model type based on name"""
@@ -68,71 +282,230 @@ class ModelLoader:
         if model_name in self.loaded_models:
             # Try to get actual memory usage
             try:
-                model_obj = self.loaded_models[model_name]["model"]
-                params = sum(p.numel() for p in model_obj.parameters())
-                # Rough estimation: 4 bytes per parameter for float32
-                memory_mb = (params * 4) / (1024 * 1024)
-                if memory_mb > 1024:
-                    return f"{memory_mb / 1024:.1f} GB"
-                else:
-                    return f"{memory_mb:.0f} MB"
+                model_data = self.loaded_models[model_name]
+                memory_bytes = model_data["memory_bytes"]
+                mapped_files = model_data.get("mapped_files")
+                if mapped_files:
+                    # Paged weights: report how much of the mapping is currently resident
+                    resident = resident_bytes(mapped_files)
+                    if resident is not None:
+                        return f"{self._format_bytes(resident)} resident of {self._format_bytes(memory_bytes)} (paged)"
+                return self._format_bytes(memory_bytes)
             except:
                 pass
         
         # Default estimates based on known model sizes
-        size_estimates = {
-            "facebook/blenderbot-400M-distill": "~1.6 GB",
-            "microsoft/DialoGPT-small": "~500 MB",
-            "facebook/blenderbot-1B-distill": "~4 GB",
-            "microsoft/DialoGPT-medium": "~1.5 GB",
-            "microsoft/DialoGPT-large": "~6 GB"
-        }
-        return size_estimates.get(model_name, "~1 GB")
+        return MODEL_SIZE_ESTIMATES.get(model_name, "~1 GB")
+    
+    def _format_bytes(self, size: int) -> str:
+        """Format a byte count as MB or GB"""
+        memory_mb = size / (1024 * 1024)
+        if memory_mb > 1024:
+            return f"{memory_mb / 1024:.1f} GB"
+        return f"{memory_mb:.0f} MB"
     
-    async def load_model(self, model_name: str) -> bool:
-        """Load a specific model"""
+    def get_quantization(self, model_name: str) -> Optional[str]:
+        """Get the quantization a loaded model was loaded with"""
+        if model_name not in self.loaded_models:
+            return None
+        return self.loaded_models[model_name].get("quantization")
+    
+    def _get_quantization_kwargs(self, quantization: Optional[str]) -> Dict[str, Any]:
+        """Build from_pretrained arguments for the requested quantization"""
+        return build_quantization_kwargs(quantization, self.dtype)
+    
+    async def _prefetch_weights(self, model_name: str) -> None:
+        """Warm the page cache with the model's weight shards off the event loop"""
+        try:
+            loop = asyncio.get_running_loop()
+            paths = await loop.run_in_executor(None, find_weight_files, model_name, self.cache_dir)
+            prefetched = await loop.run_in_executor(None, prefetch_safetensors, paths)
+            if prefetched:
+                logger.info(f"Prefetched {prefetched / (1024 * 1024):.0f} MB of weights for {model_name}")
+        except Exception as e:
+            logger.warning(f"Weight prefetch failed for {model_name}: {e}")
+    
+    def _load_state_dict_direct(self, model_name: str) -> Optional[Dict[str, Any]]:
+        """Read cached safetensors shards with O_DIRECT into a single state dict"""
+        paths = find_weight_files(model_name, self.cache_dir)
+        if not paths or any(path.suffix != ".safetensors" for path in paths):
+            logger.info(f"No cached safetensors weights for {model_name}, using default loading")
+            return None
+        
+        state_dict = {}
+        for path in paths:
+            state_dict.update(load_safetensors_direct(path))
+        return state_dict
+    
+    def _load_direct_model(self, model_name: str) -> Optional[Any]:
+        """Build a model whose weights view the buffers read with O_DIRECT"""
+        state_dict = self._load_state_dict_direct(model_name)
+        if state_dict is None:
+            return None
+        return self._build_from_state_dict(model_name, state_dict)
+    
+    def _load_mapped_model(self, model_name: str) -> Optional[Tuple[Any, List[Path]]]:
+        """Build a model whose weights alias copy-on-write mappings of the cached safetensors shards"""
+        paths = find_weight_files(model_name, self.cache_dir)
+        if not paths or any(path.suffix != ".safetensors" for path in paths):
+            logger.info(f"No cached safetensors weights for {model_name}, loading weights into memory")
+            return None
+        
+        state_dict = {}
+        for path in paths:
+            state_dict.update(map_safetensors(path))
+        model = self._build_from_state_dict(model_name, state_dict)
+        return (model, paths) if model is not None else None
+    
+    def _build_from_state_dict(self, model_name: str, state_dict: Dict[str, Any]) -> Optional[Any]:
+        """Build a model on the meta device and adopt the given tensors as its weights"""
+        from accelerate import init_empty_weights
+        from transformers import AutoConfig, AutoModelForCausalLM, BlenderbotForConditionalGeneration
+        
+        if "blenderbot" in model_name.lower():
+            config = AutoConfig.from_pretrained(model_name, cache_dir=self.cache_dir)
+            with init_empty_weights():
+                model = BlenderbotForConditionalGeneration(config)
+        else:
+            config = AutoConfig.from_pretrained(model_name, cache_dir=self.cache_dir, pad_token_id=50256)
+            with init_empty_weights():
+                model = AutoModelForCausalLM.from_config(config)
+        
+        # assign=True keeps the given tensors instead of copying them into fresh memory
+        model.load_state_dict(state_dict, assign=True, strict=False)
+        model.tie_weights()
+        
+        if any(tensor.is_meta for tensor in itertools.chain(model.parameters(), model.buffers())):
+            logger.info(f"Checkpoint layout of {model_name} does not match the model, using default loading")
+            return None
+        
+        model.eval()
+        return model
+    
+    async def load_model(
+        self,
+        model_name: str,
+        quantization: Optional[str] = None,
+        load_format: str = "auto",
+        memory_budget_mb: Optional[int] = None
+    ) -> bool:
+        """Load a specific model, optionally quantized to fp16, int8, int4 or awq"""
+        import torch
+        from transformers import AutoModelForCausalLM, BlenderbotForConditionalGeneration
+        
+        quantization = quantization or self.quantization
         if model_name in self.loaded_models:
-            logger.info(f"Model {model_name} is already loaded")
+            loaded_quantization = self.get_quantization(model_name)
+            if loaded_quantization != quantization:
+                logger.warning(
+                    f"Model {model_name} is already loaded with quantization {loaded_quantization}; "
+                    f"unload it first to load with {quantization}"
+                )
+            else:
+                logger.info(f"Model {model_name} is already loaded")
             return True
         
         try:
-            logger.info(f"Loading model: {model_name}")
+            logger.info(f"Loading model: {model_name} (quantization: {quantization or 'none'})")
+            load_kwargs = self._get_quantization_kwargs(quantization)
+            if self.device.type == "cuda" and "device_map" not in load_kwargs:
+                # Place each tensor on the GPU as it is read instead of moving the whole model afterwards
+                load_kwargs["device_map"] = {"": torch.cuda.current_device()}
+            
+            if load_format not in LOAD_FORMATS:
+                raise ValueError(f"Unsupported load format: {load_format}")
+            if quantization == "awq" and "blenderbot" in model_name.lower():
+                raise ValueError("awq quantization is only supported for causal language models")
+            
+            loop = asyncio.get_running_loop()
+            if memory_budget_mb is not None and load_format == "auto" and quantization is None:
+                # Page the weights from disk when they would not fit in the memory budget
+                paths = await loop.run_in_executor(None, find_weight_files, model_name, self.cache_dir)
+                weight_bytes = sum(path.stat().st_size for path in paths)
+                if weight_bytes > memory_budget_mb * 1024 * 1024:
+                    logger.info(
+                        f"Weights of {model_name} ({self._format_bytes(weight_bytes)}) exceed the "
+                        f"{memory_budget_mb} MB budget, paging them from disk"
+                    )
+                    load_format = "mmap"
+            if load_format == "auto" and AUTO_LOAD_FORMAT in LOAD_FORMATS:
+                load_format = AUTO_LOAD_FORMAT
+            
+            model = None
+            mapped_files = None
+            if load_format == "mmap" and quantization is None:
+                mapped = await loop.run_in_executor(None, self._load_mapped_model, model_name)
+                if mapped is not None:
+                    model, mapped_files = mapped
+            elif load_format == "prefetch":
+                await self._prefetch_weights(model_name)
+            elif load_format == "direct" and quantization != "awq" and "quantization_config" not in load_kwargs:
+                # from_pretrained with low_cpu_mem_usage ignores a passed state_dict and rereads
+                # the checkpoint, so the model is built around the direct buffers instead
+                model = await loop.run_in_executor(None, self._load_direct_model, model_name)
+                if model is not None:
+                    model = model.to(dtype=load_kwargs["torch_dtype"])
+            # Models built from a state dict still need moving to the inference device
+            prebuilt = model is not None
             
             # Load model and tokenizer based on type
             if "blenderbot" in model_name.lower():
-                model = BlenderbotForConditionalGeneration.from_pretrained(
-                    model_name,
-                    cache_dir=self.cache_dir,
-                    torch_dtype=torch.float32,
-                    low_cpu_mem_usage=True
-                )
-                tokenizer = BlenderbotTokenizer.from_pretrained(
-                    model_name,
-                    cache_dir=self.cache_dir
-                )
+                if model is None:
+                    model = from_pretrained_with_attention(
+                        BlenderbotForConditionalGeneration,
+                        model_name,
+                        cache_dir=self.cache_dir,
+                        low_cpu_mem_usage=True,
+                        **load_kwargs
+                    )
+                tokenizer = self._get_tokenizer(model_name, self._load_blenderbot_tokenizer)
                 
             else:  # DialoGPT and other causal LMs
-                model = AutoModelForCausalLM.from_pretrained(
-                    model_name,
-                    cache_dir=self.cache_dir,
-                    torch_dtype=torch.float32,
-                    low_cpu_mem_usage=True,
-                    pad_token_id=50256  # Common GPT-2 pad token
-                )
-                tokenizer = AutoTokenizer.from_pretrained(
-                    model_name,
-                    cache_dir=self.cache_dir
-                )
-                
-                # Set pad token if not present
-                if tokenizer.pad_token is None:
-                    tokenizer.pad_token = tokenizer.eos_token
+                if quantization == "awq":
+                    from awq import AutoAWQForCausalLM
+                    # The AWQ wrapper holds the fused transformers model used for generation
+                    model = AutoAWQForCausalLM.from_quantized(model_name, **load_kwargs).model
+                elif model is None:
+                    model = from_pretrained_with_attention(
+                        AutoModelForCausalLM,
+                        model_name,
+                        cache_dir=self.cache_dir,
+                        low_cpu_mem_usage=True,
+                        pad_token_id=50256,  # Common GPT-2 pad token
+                        **load_kwargs
+                    )
+                tokenizer = self._get_tokenizer(model_name, self._load_causal_tokenizer)
+            
+            if quantization == "int8" and "quantization_config" not in load_kwargs:
+                # No bitsandbytes on CPU - quantize Linear layers to int8 dynamically
+                model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            elif "device_map" not in load_kwargs or prebuilt:
+                # Mapped weights keep their on-disk dtype so they stay backed by the page cache
+                model = model.to(self.device)
+            model.eval()
+            if TORCH_COMPILE:
+                self._compile_model(model)
+            
+            # Built once per model; requests only override the length and sampling fields
+            generation_config = copy.deepcopy(model.generation_config)
+            generation_config.update(
+                pad_token_id=tokenizer.pad_token_id,
+                eos_token_id=tokenizer.eos_token_id,
+                num_return_sequences=1
+            )
             
             # Store loaded model
             self.loaded_models[model_name] = {
                 "model": model,
                 "tokenizer": tokenizer,
-                "type": self._get_model_type(model_name)
+                "type": self._get_model_type(model_name),
+                "quantization": quantization,
+                "generation_config": generation_config,
+                # Parameters and buffers at their stored size, so quantized weights report their savings
+                "memory_bytes": model.get_memory_footprint(),
+                "mapped_files": mapped_files,
+                # Key/value reuse across requests sharing earlier turns (decoder-only models)
+                "prefix_cache": PrefixKVCache() if self._get_model_type(model_name) != "conversational" else None
             }
             
             # Set as current model if it's the first one loaded
@@ -146,6 +519,77 @@ class ModelLoader:
             logger.error(f"Failed to load model {model_name}: {e}")
             return False
     
+    def _tokenizer_fingerprint(self, model_name: str, kind: str) -> Optional[str]:
+        """Hash a model's cached tokenizer files, or None if they are not available locally"""
+        snapshot = find_snapshot(model_name, self.cache_dir)
+        if snapshot is None:
+            return None
+        
+        hasher = hashlib.blake2b(kind.encode(), digest_size=16)
+        found = False
+        for filename in TOKENIZER_FILES:
+            path = snapshot / filename
+            if path.is_file():
+                found = True
+                hasher.update(filename.encode())
+                hasher.update(path.read_bytes())
+        return hasher.hexdigest() if found else None
+    
+    def _get_tokenizer(self, model_name: str, load_tokenizer):
+        """Reuse an already loaded tokenizer with identical files, loading it otherwise"""
+        kind = load_tokenizer.__name__
+        fingerprint = self._tokenizer_fingerprint(model_name, kind)
+        if fingerprint in self._tokenizer_cache:
+            logger.info(f"Sharing an already loaded tokenizer with {model_name}")
+            return self._tokenizer_cache[fingerprint]
+        
+        tokenizer = load_tokenizer(model_name)
+        # The files are cached now if from_pretrained just downloaded them
+        fingerprint = fingerprint or self._tokenizer_fingerprint(model_name, kind)
+        if fingerprint is not None:
+            self._tokenizer_cache[fingerprint] = tokenizer
+        return tokenizer
+    
+    def _load_causal_tokenizer(self, model_name: str):
+        """Load a left-padding tokenizer for a decoder-only model"""
+        from transformers import AutoTokenizer
+        
+        tokenizer = AutoTokenizer.from_pretrained(
+            model_name,
+            cache_dir=self.cache_dir,
+            use_fast=True
+        )
+        
+        # Set pad token if not present
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        # Decoder-only models must be left padded for batched generation
+        tokenizer.padding_side = "left"
+        # Long prompts drop their oldest tokens, keeping the turn being answered
+        tokenizer.truncation_side = "left"
+        return tokenizer
+    
+    def _load_blenderbot_tokenizer(self, model_name: str):
+        """Load the Rust-backed BlenderBot tokenizer, falling back to the Python one"""
+        from transformers import BlenderbotTokenizer, BlenderbotTokenizerFast
+        
+        try:
+            return BlenderbotTokenizerFast.from_pretrained(model_name, cache_dir=self.cache_dir)
+        except Exception as e:
+            logger.debug(f"Fast tokenizer unavailable for {model_name}: {e}")
+            return BlenderbotTokenizer.from_pretrained(model_name, cache_dir=self.cache_dir)
+    
+    def _compile_model(self, model: Any) -> None:
+        """Compile the model's forward pass in place so generate() runs the compiled graph"""
+        import torch
+        
+        try:
+            # generate() calls the module itself, so the compiled forward replaces the
+            # original on the instance; the stored model stays a regular PreTrainedModel
+            model.forward = torch.compile(model.forward, mode=TORCH_COMPILE_MODE, dynamic=True, fullgraph=False)
+        except Exception as e:
+            logger.warning(f"torch.compile unavailable, running {type(model).__name__} eagerly: {e}")
+    
     async def unload_model(self, model_name: str) -> bool:
         """Unload a specific model"""
         if model_name not in self.loaded_models:
@@ -153,13 +597,19 @@ class ModelLoader:
             return False
         
         try:
-            # Remove model from memory
+            device = getattr(self.loaded_models[model_name]["model"], "device", self.device)
+            # Dropping the entry releases the last reference, so CPython frees the weights right away
             del self.loaded_models[model_name]
+            self.sessions.drop_model(model_name)
+            if TORCH_COMPILE:
+                # A compiled forward references its model, a cycle only the collector can free
+                gc.collect()
             
-            # Force garbage collection
-            gc.collect()
-            if torch.cuda.is_available():
-                torch.cuda.empty_cache()
+            if AGGRESSIVE_FREE and device.type == "cuda":
+                import torch
+                # Return the cached blocks to the driver, only on the device the model used
+                with torch.cuda.device(device):
+                    torch.cuda.empty_cache()
             
             # Update current model if necessary
             if self.current_model == model_name:
@@ -183,6 +633,22 @@ class ModelLoader:
         """Check if a model is currently loaded"""
         return model_name in self.loaded_models
     
+    def supports_sessions(self, model_name: str) -> bool:
+        """Whether a loaded model can keep a session's key/values between requests (decoder-only models)"""
+        model_data = self.loaded_models.get(model_name)
+        return model_data is not None and model_data["type"] != "conversational"
+    
+    def use_session(self, model_name: str, session_id: str, messages: List[Dict[str, str]]) -> bool:
+        """Whether a request should continue its session rather than be batched"""
+        if not self.supports_sessions(model_name):
+            return False
+        if self._window_drops_turns(messages):
+            # The context window has moved past the oldest turns, so the session's cached
+            # key/values can never be extended again; the prefix cache takes over from here
+            self.sessions.take(session_id)
+            return False
+        return True
+    
     def get_current_model(self) -> Optional[str]:
         """Get the currently active model"""
         return self.current_model
@@ -206,16 +672,80 @@ class ModelLoader:
             "name": model_name,
             "type": self.loaded_models[model_name]["type"],
             "is_current": model_name == self.current_model,
+            "quantization": self.get_quantization(model_name),
             "memory_usage": self._get_memory_usage(model_name)
         }
     
+    async def warmup(self, model_name: str) -> bool:
+        """Run a minimal generation to prime kernels and allocator caches"""
+        try:
+            await self.generate_response(
+                model_name,
+                [{"role": "user", "content": "Hello"}],
+                {"max_tokens": 1}
+            )
+            logger.info(f"✓ Model {model_name} warmed up")
+            return True
+        except Exception as e:
+            logger.warning(f"Warmup failed for {model_name}: {e}")
+            return False
+    
+    def get_generation_settings(self, parameters: Optional[Dict[str, Any]] = None) -> Tuple[int, float, bool]:
+        """Resolve request parameters into (max_length, temperature, do_sample)"""
+        params = parameters or {}
+        max_length = min(params.get("max_tokens", 150), 500)  # Cap at 500 tokens
+        temperature = max(0.1, min(params.get("temperature", 0.8), 1.0))
+        do_sample = temperature > 0.1
+        return max_length, temperature, do_sample
+    
+    def get_generation_config(self, model_name: str, parameters: Optional[Dict[str, Any]] = None):
+        """Copy the model's precomputed GenerationConfig with this request's settings applied"""
+        model_data = self.loaded_models[model_name]
+        max_length, temperature, do_sample = self.get_generation_settings(parameters)
+        if model_data["type"] == "conversational":
+            # Seq2seq max_length only counts the decoder's tokens
+            length = {"max_length": max_length}
+        else:
+            length = {"max_new_tokens": max_length}
+        generation_config = copy.copy(model_data["generation_config"])
+        generation_config.update(temperature=temperature, do_sample=do_sample, **length)
+        return generation_config
+    
     async def generate_response(
         self, 
         model_name: str, 
         messages: List[Dict[str, str]], 
-        parameters: Optional[Dict[str, Any]] = None
+        parameters: Optional[Dict[str, Any]] = None,
+        session_id: Optional[str] = None
     ) -> str:
-        """Generate response using specified model"""
+        """Generate response using specified model, reusing the session's key/values when given"""
+        if session_id is None or not self.supports_sessions(model_name):
+            responses = await self.generate_response_batch(model_name, [messages], parameters)
+            return responses[0]
+        
+        model_data = self.loaded_models[model_name]
+        generation_config = self.get_generation_config(model_name, parameters)
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self.inference_pool,
+                partial(
+                    self._generate_session_response,
+                    model_name, model_data["model"], model_data["tokenizer"], messages, session_id,
+                    generation_config
+                )
+            )
+        except Exception as e:
+            logger.error(f"Generation failed for {model_name}: {e}")
+            raise
+    
+    async def generate_response_batch(
+        self,
+        model_name: str,
+        conversations: List[List[Dict[str, str]]],
+        parameters: Optional[Dict[str, Any]] = None
+    ) -> List[str]:
+        """Generate one response per conversation in a single batched forward pass"""
         if model_name not in self.loaded_models:
             raise ValueError(f"Model {model_name} is not loaded")
         
@@ -225,93 +755,341 @@ class ModelLoader:
         model_type = model_data["type"]
         
         # Extract generation parameters
-        params = parameters or {}
-        max_length = min(params.get("max_tokens", 150), 500)  # Cap at 500 tokens
-        temperature = max(0.1, min(params.get("temperature", 0.8), 1.0))
-        do_sample = temperature > 0.1
+        generation_config = self.get_generation_config(model_name, parameters)
+        
+        if model_type == "conversational":
+            generate = self._generate_blenderbot_responses
+        else:
+            generate = partial(self._generate_dialogpt_responses, prefix_cache=model_data.get("prefix_cache"))
         
         try:
-            if model_type == "conversational":
-                return await self._generate_blenderbot_response(
-                    model, tokenizer, messages, max_length, temperature, do_sample
-                )
-            else:
-                return await self._generate_dialogpt_response(
-                    model, tokenizer, messages, max_length, temperature, do_sample
-                )
+            # Run the blocking forward pass off the event loop
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self.inference_pool,
+                partial(generate, model, tokenizer, conversations, generation_config)
+            )
                 
         except Exception as e:
             logger.error(f"Generation failed for {model_name}: {e}")
             raise
     
-    async def _generate_blenderbot_response(
-        self, model, tokenizer, messages, max_length, temperature, do_sample
-    ) -> str:
-        """Generate response using BlenderBot"""
-        # Get the last user message for BlenderBot
-        user_messages = [msg["content"] for msg in messages if msg["role"] == "user"]
-        if not user_messages:
-            return "Hello! How can I help you today?"
+    def _stage_inputs(self, inputs, device: "torch.device", max_length: int) -> Dict[str, "torch.Tensor"]:
+        """Copy tokenized inputs to the device through this thread's reusable pinned buffers"""
+        import torch
         
-        input_text = user_messages[-1]
+        batch_size, length = inputs["input_ids"].shape
+        if device.type != "cuda" or batch_size > STAGING_MAX_BATCH or length > max_length:
+            return inputs.to(device)
+        
+        buffers = getattr(self._staging, "buffers", None)
+        if buffers is None:
+            buffers = self._staging.buffers = {}
+        staged = {}
+        for name, tensor in inputs.items():
+            key = (name, device, max_length)
+            if key not in buffers:
+                # Flat buffers keep every (batch, length) view contiguous
+                size = STAGING_MAX_BATCH * max_length
+                buffers[key] = (
+                    torch.empty(size, dtype=tensor.dtype, pin_memory=True),
+                    torch.empty(size, dtype=tensor.dtype, device=device)
+                )
+            host, device_buffer = buffers[key]
+            count = tensor.numel()
+            host[:count].copy_(tensor.view(-1))
+            # The next copy into the pinned buffer comes after generate() has synchronized
+            device_buffer[:count].copy_(host[:count], non_blocking=True)
+            staged[name] = device_buffer[:count].view(batch_size, length)
+        return staged
+    
+    def _build_blenderbot_inputs(self, conversations: List[List[Dict[str, str]]]) -> Tuple[List[int], List[str]]:
+        """Get the last user message of each conversation for BlenderBot"""
+        indices = []
+        input_texts = []
+        for index, messages in enumerate(conversations):
+            # Scan from the end; the last user message is usually the last message
+            user_message = next((msg["content"] for msg in reversed(messages) if msg["role"] == "user"), None)
+            if user_message is not None:
+                indices.append(index)
+                input_texts.append(user_message)
+        return indices, input_texts
+    
+    def _get_dialogpt_turns(self, messages: List[Dict[str, str]]) -> List[str]:
+        """Get the user and assistant turns DialoGPT conditions on"""
+        return [msg["content"] for msg in messages[-CONTEXT_MESSAGES:] if msg["role"] in ("user", "assistant")]
+    
+    def _window_drops_turns(self, messages: List[Dict[str, str]], upcoming: int = 0) -> bool:
+        """Whether the context window leaves out earlier turns, once `upcoming` more messages arrive"""
+        dropped = messages[:max(0, len(messages) + upcoming - CONTEXT_MESSAGES)]
+        return any(msg["role"] in ("user", "assistant") for msg in dropped)
+    
+    def _prompt_token_budget(self, model, generation_config) -> int:
+        """Longest DialoGPT prompt that leaves room for the response in the model's context"""
+        context = getattr(model.config, "n_positions", None) or getattr(model.config, "max_position_embeddings", None)
+        if context is None:
+            return MAX_PROMPT_TOKENS
+        return max(1, min(MAX_PROMPT_TOKENS, context - generation_config.max_new_tokens))
+    
+    def _build_prefix_cached_inputs(
+        self, model, tokenizer, messages: List[Dict[str, str]], prefix_cache: PrefixKVCache, max_prompt_tokens: int
+    ) -> Optional[Dict[str, Any]]:
+        """Build DialoGPT generate() inputs that reuse cached key/values for the earlier turns"""
+        import torch
+        
+        turns = self._get_dialogpt_turns(messages)
+        if len(turns) < 2:
+            # No earlier turns to reuse
+            return None
+        eos = tokenizer.eos_token
+        # One batched call tokenizes every turn
+        blocks = tokenizer([turn + eos for turn in turns])["input_ids"]
+        input_ids = [token for block in blocks for token in block]
+        if len(input_ids) > max_prompt_tokens:
+            # The prompt needs truncating
+            return None
+        
+        keys = block_keys(blocks[:-1])
+        past_key_values, cached_blocks = prefix_cache.longest_prefix(keys)
+        if cached_blocks < len(keys):
+            # Prefill the earlier turns that are not cached yet and keep them for the next turn
+            start = sum(len(block) for block in blocks[:cached_blocks])
+            end = sum(len(block) for block in blocks[:-1])
+            with torch.inference_mode():
+                past_key_values = model(
+                    torch.tensor([input_ids[start:end]], device=model.device),
+                    past_key_values=past_key_values,
+                    use_cache=True
+                ).past_key_values
+            prefix_cache.put(keys[-1], past_key_values)
+        
+        # generate() only feeds the tokens past the cached prefix through the model
+        return {
+            "input_ids": torch.tensor([input_ids], device=model.device),
+            "attention_mask": torch.ones(1, len(input_ids), dtype=torch.long, device=model.device),
+            "past_key_values": past_key_values
+        }
+    
+    def _build_dialogpt_inputs(self, tokenizer, conversations: List[List[Dict[str, str]]]) -> Tuple[List[int], List[str]]:
+        """Build the eos-joined conversation context of each conversation for DialoGPT"""
+        indices = []
+        input_texts = []
+        eos = tokenizer.eos_token
+        for index, messages in enumerate(conversations):
+            conversation = self._get_dialogpt_turns(messages)
+            if conversation:
+                # Join conversation with special tokens
+                indices.append(index)
+                input_texts.append(eos.join(conversation) + eos)
+        return indices, input_texts
+    
+    async def stream_response(
+        self,
+        model_name: str,
+        messages: List[Dict[str, str]],
+        parameters: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[str]:
+        """Generate a response for one conversation, yielding text as it is decoded"""
+        import torch
+        from transformers import StoppingCriteriaList
+        
+        if model_name not in self.loaded_models:
+            raise ValueError(f"Model {model_name} is not loaded")
+        
+        model_data = self.loaded_models[model_name]
+        model = model_data["model"]
+        tokenizer = model_data["tokenizer"]
+        generation_config = self.get_generation_config(model_name, parameters)
+        
+        prefix_cache = None
+        if model_data["type"] == "conversational":
+            _, input_texts = self._build_blenderbot_inputs([messages])
+            input_max_length = staging_length = 128
+        else:
+            _, input_texts = self._build_dialogpt_inputs(tokenizer, [messages])
+            input_max_length = self._prompt_token_budget(model, generation_config)
+            staging_length = MAX_PROMPT_TOKENS
+            prefix_cache = model_data.get("prefix_cache")
+        if not input_texts:
+            yield "Hello! How can I help you today?"
+            return
+        
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        cancelled = threading.Event()
+        streamer = _async_text_streamer_class()(tokenizer, loop, queue)
+        
+        def generate() -> None:
+            try:
+                inputs = None
+                if prefix_cache is not None:
+                    # Reusing the earlier turns' key/values shortens the wait for the first token
+                    inputs = self._build_prefix_cached_inputs(
+                        model, tokenizer, messages, prefix_cache, input_max_length
+                    )
+                if inputs is None:
+                    # Tokenize on the inference thread too, keeping the event loop free
+                    inputs = tokenizer(input_texts, return_tensors="pt", truncation=True, max_length=input_max_length)
+                    inputs = self._stage_inputs(inputs, model.device, staging_length)
+                with torch.inference_mode():
+                    model.generate(
+                        **inputs,
+                        generation_config=generation_config,
+                        streamer=streamer,
+                        stopping_criteria=StoppingCriteriaList([_CancelledCriteria(cancelled)])
+                    )
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, _STREAM_END)
+        
+        generation = loop.run_in_executor(self.inference_pool, generate)
+        try:
+            while True:
+                item = await queue.get()
+                if item is _STREAM_END:
+                    break
+                if isinstance(item, Exception):
+                    logger.error(f"Streaming generation failed for {model_name}: {item}")
+                    raise item
+                yield item
+        finally:
+            # Stop generating if the consumer went away early
+            cancelled.set()
+            await generation
+    
+    def _generate_blenderbot_responses(self, model, tokenizer, conversations, generation_config) -> List[str]:
+        """Generate responses using BlenderBot"""
+        import torch
+        
+        responses = ["Hello! How can I help you today?"] * len(conversations)
+        
+        indices, input_texts = self._build_blenderbot_inputs(conversations)
+        if not input_texts:
+            return responses
         
         # Tokenize input
-        inputs = tokenizer(input_text, return_tensors="pt", truncation=True, max_length=128)
+        inputs = tokenizer(input_texts, return_tensors="pt", padding=True, truncation=True, max_length=128)
+        inputs = self._stage_inputs(inputs, model.device, 128)
         
         # Generate response
-        with torch.no_grad():
-            output = model.generate(
-                **inputs,
-                max_length=max_length,
-                temperature=temperature,
-                do_sample=do_sample,
-                pad_token_id=tokenizer.pad_token_id,
-                eos_token_id=tokenizer.eos_token_id,
-                num_return_sequences=1
+        with torch.inference_mode():
+            output = model.generate(**inputs, generation_config=generation_config)
+        
+        for row, index in enumerate(indices):
+            # Seq2seq output only holds decoder tokens, so the input is never echoed back
+            response = tokenizer.decode(output[row], skip_special_tokens=True).strip()
+            responses[index] = response or "I'm here to help! Could you please rephrase your question?"
+        
+        return responses
+    
+    def _generate_dialogpt_responses(
+        self, model, tokenizer, conversations, generation_config, prefix_cache=None
+    ) -> List[str]:
+        """Generate responses using DialoGPT"""
+        import torch
+        
+        responses = ["Hello! I'm ready to chat with you."] * len(conversations)
+        
+        indices, input_texts = self._build_dialogpt_inputs(tokenizer, conversations)
+        if not input_texts:
+            return responses
+        
+        # Bounds the prefill cost per turn however long the conversation grows
+        max_prompt_tokens = self._prompt_token_budget(model, generation_config)
+        inputs = None
+        if prefix_cache is not None and len(input_texts) == 1:
+            # Single conversations can reuse the key/values of turns seen in earlier requests
+            inputs = self._build_prefix_cached_inputs(
+                model, tokenizer, conversations[indices[0]], prefix_cache, max_prompt_tokens
             )
+        if inputs is None:
+            # Tokenize (left padded, so every row's new tokens start at the same offset)
+            inputs = tokenizer(input_texts, return_tensors="pt", padding=True, truncation=True, max_length=max_prompt_tokens)
+            inputs = self._stage_inputs(inputs, model.device, MAX_PROMPT_TOKENS)
+        prompt_length = inputs["input_ids"].shape[1]
         
-        # Decode response
-        response = tokenizer.decode(output[0], skip_special_tokens=True)
+        # Generate
+        with torch.inference_mode():
+            output = model.generate(**inputs, generation_config=generation_config)
         
-        # Clean up response (remove input echo for BlenderBot)
-        if input_text in response:
-            response = response.replace(input_text, "").strip()
+        for row, index in enumerate(indices):
+            # Decode only the new tokens (response)
+            new_tokens = output[row][prompt_length:]
+            response = tokenizer.decode(new_tokens, skip_special_tokens=True).strip()
+            responses[index] = response or "I'm here to chat! What would you like to talk about?"
         
-        return response or "I'm here to help! Could you please rephrase your question?"
+        return responses
     
-    async def _generate_dialogpt_response(
-        self, model, tokenizer, messages, max_length, temperature, do_sample
+    def _continue_session(
+        self, tokenizer, messages: List[Dict[str, str]], turns: List[str], session: Dict[str, Any],
+        max_prompt_tokens: int
+    ) -> Optional[List[int]]:
+        """Extend a session's tokens with the new user turn, or None if the context window moved on"""
+        # Continue only when the cached turns are exactly the window's earlier turns, so the
+        # prompt is the one the batched path would build from the same messages
+        if messages[-1]["role"] != "user" or turns[:-1] != session["turns"]:
+            return None
+        
+        input_ids = list(session["input_ids"])
+        if not input_ids or input_ids[-1] != tokenizer.eos_token_id:
+            # The previous response hit max_length before emitting eos
+            input_ids.append(tokenizer.eos_token_id)
+        input_ids += tokenizer(turns[-1] + tokenizer.eos_token)["input_ids"]
+        if len(input_ids) > max_prompt_tokens:
+            # Start over from the recent turns rather than truncating the cached history
+            return None
+        return input_ids
+    
+    def _generate_session_response(
+        self, model_name, model, tokenizer, messages, session_id, generation_config
     ) -> str:
-        """Generate response using DialoGPT"""
-        # Build conversation context for DialoGPT
-        conversation = []
-        for msg in messages[-5:]:  # Use last 5 messages for context
-            if msg["role"] in ["user", "assistant"]:
-                conversation.append(msg["content"])
-        
-        if not conversation:
-            return "Hello! I'm ready to chat with you."
+        """Generate a DialoGPT response, prefilling only the tokens the session has not seen"""
+        import torch
+        
+        session = self.sessions.take(session_id)
         
-        # Join conversation with special tokens
-        input_text = tokenizer.eos_token.join(conversation) + tokenizer.eos_token
+        turns = self._get_dialogpt_turns(messages)
+        if not turns:
+            return "Hello! I'm ready to chat with you."
         
-        # Tokenize
-        inputs = tokenizer(input_text, return_tensors="pt", truncation=True, max_length=512)
+        max_prompt_tokens = self._prompt_token_budget(model, generation_config)
+        input_ids = None
+        past_key_values = None
+        if session is not None and session["model"] == model_name:
+            input_ids = self._continue_session(tokenizer, messages, turns, session, max_prompt_tokens)
+            if input_ids is not None:
+                past_key_values = session["past_key_values"]
+        if input_ids is None:
+            # New session, or the conversation no longer extends the cached one
+            eos = tokenizer.eos_token
+            input_ids = tokenizer(eos.join(turns) + eos, truncation=True, max_length=max_prompt_tokens)["input_ids"]
         
-        # Generate
-        with torch.no_grad():
+        cached_length = past_key_values[0][0].shape[2] if past_key_values is not None else 0
+        with torch.inference_mode():
+            if cached_length < len(input_ids) - 1:
+                # generate() does not return its key/values, so prefill the prompt up to its last
+                # token here and keep those; the previous response is prefilled on the next turn
+                past_key_values = model(
+                    torch.tensor([input_ids[cached_length:-1]], device=model.device),
+                    past_key_values=past_key_values,
+                    use_cache=True
+                ).past_key_values
             output = model.generate(
-                **inputs,
-                max_length=inputs["input_ids"].shape[1] + max_length,
-                temperature=temperature,
-                do_sample=do_sample,
-                pad_token_id=tokenizer.pad_token_id,
-                eos_token_id=tokenizer.eos_token_id,
-                num_return_sequences=1
+                input_ids=torch.tensor([input_ids], device=model.device),
+                attention_mask=torch.ones(1, len(input_ids), dtype=torch.long, device=model.device),
+                past_key_values=past_key_values,
+                generation_config=generation_config
             )
         
-        # Decode only the new tokens (response)
-        new_tokens = output[0][inputs["input_ids"].shape[1]:]
+        new_tokens = output[0][len(input_ids):]
         response = tokenizer.decode(new_tokens, skip_special_tokens=True).strip()
-        
+        if not self._window_drops_turns(messages, upcoming=2):
+            # Only keep sessions the next exchange (this reply and a new user message) can extend
+            self.sessions.put(session_id, {
+                "model": model_name,
+                "input_ids": input_ids + new_tokens.tolist(),
+                "past_key_values": past_key_values,
+                "turns": turns + [response]
+            })
         return response or "I'm here to chat! What would you like to talk about?"
@@ -0,0 +1,121 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Memory budget for cached prefix key/value tensors, per model
+PREFIX_CACHE_MB = int(os.getenv("PREFIX_CACHE_MB", "256"))
+# Memory budget for key/values kept between a conversation's turns, across all models
+SESSION_CACHE_MB = int(os.getenv("SESSION_CACHE_MB", "256"))
+
+
+def block_keys(blocks: Sequence[Sequence[int]]) -> List[bytes]:
+    """Chain-hash token blocks so each key identifies the whole prefix ending at that block"""
+    keys = []
+    digest = b""
+    for block in blocks:
+        hasher = hashlib.blake2b(digest, digest_size=16)
+        hasher.update(b",".join(str(token).encode() for token in block))
+        digest = hasher.digest()
+        keys.append(digest)
+    return keys
+
+
+def _past_nbytes(past_key_values: Any) -> int:
+    """Size of a legacy tuple-of-tuples KV cache in bytes"""
+    return sum(
+        tensor.numel() * tensor.element_size()
+        for layer in past_key_values
+        for tensor in layer
+    )
+
+
+class PrefixKVCache:
+    """Byte-bounded LRU of past_key_values for shared conversation prefixes"""
+
+    def __init__(self, max_bytes: int = PREFIX_CACHE_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[bytes, Tuple[Any, int]]" = OrderedDict()
+        self._size = 0
+        # Inference runs on several threads
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def longest_prefix(self, keys: Sequence[bytes]) -> Tuple[Optional[Any], int]:
+        """Find the longest cached prefix, returning its past_key_values and block count"""
+        # Entries are shared without copying: generation never modifies cached
+        # tensors in place, and eviction only drops this cache's reference
+        with self._lock:
+            for count in range(len(keys), 0, -1):
+                entry = self._entries.get(keys[count - 1])
+                if entry is not None:
+                    self._entries.move_to_end(keys[count - 1])
+                    self.hits += 1
+                    return entry[0], count
+            self.misses += 1
+            return None, 0
+
+    def _nbytes(self, value: Any) -> int:
+        """Size of a cached value in bytes"""
+        return _past_nbytes(value)
+
+    def put(self, key: bytes, past_key_values: Any) -> None:
+        """Store past_key_values for a prefix, evicting least recently used entries over budget"""
+        nbytes = self._nbytes(past_key_values)
+        if nbytes > self.max_bytes:
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= previous[1]
+            self._entries[key] = (past_key_values, nbytes)
+            self._size += nbytes
+            while self._size > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._size -= evicted
+
+    def stats(self) -> Dict[str, int]:
+        """Get entry count, size and hit/miss counters"""
+        return {
+            "entries": len(self._entries),
+            "bytes": self._size,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SessionKVCache(PrefixKVCache):
+    """Byte-bounded LRU of per-conversation state, each holding its past_key_values"""
+
+    def __init__(self, max_bytes: int = SESSION_CACHE_MB * 1024 * 1024):
+        super().__init__(max_bytes)
+
+    def _nbytes(self, value: Any) -> int:
+        return _past_nbytes(value["past_key_values"])
+
+    def take(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Remove and return a session, so concurrent requests for it never share its key/values"""
+        with self._lock:
+            entry = self._entries.pop(session_id, None)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._size -= entry[1]
+            self.hits += 1
+            return entry[0]
+
+    def drop_model(self, model_name: str) -> None:
+        """Drop every session of a model"""
+        with self._lock:
+            for session_id in [key for key, (session, _) in self._entries.items() if session["model"] == model_name]:
+                _, nbytes = self._entries.pop(session_id)
+                self._size -= nbytes
@@ -0,0 +1,139 @@
+import hashlib
+import json
+import logging
+import os
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of cached responses kept in memory
+DEFAULT_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+
+# Optional on-disk cache directory that survives restarts, and its size limit
+RESPONSE_CACHE_DIR = os.getenv("RESPONSE_CACHE_DIR")
+MAX_CACHE_BYTES = int(os.getenv("MAX_CACHE_BYTES", str(100 * 1024 * 1024)))
+
+# Number of stores between on-disk size sweeps
+PERSISTENT_SWEEP_INTERVAL = 256
+
+
+def make_cache_key(
+    model_id: str,
+    messages: Iterable[Any],
+    parameters: Optional[Dict[str, Any]] = None
+) -> str:
+    """Build a stable cache key from the model, conversation and parameters"""
+    payload = json.dumps(
+        [
+            model_id,
+            [[msg.role, msg.content] for msg in messages],
+            sorted((parameters or {}).items())
+        ],
+        default=str,
+        ensure_ascii=False
+    )
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def is_cacheable(parameters: Optional[Dict[str, Any]] = None) -> bool:
+    """Only greedy (temperature <= 0.1) generations are deterministic enough to cache"""
+    temperature = (parameters or {}).get("temperature")
+    if temperature is None:
+        return False
+    try:
+        return float(temperature) <= 0.1
+    except (TypeError, ValueError):
+        return False
+
+
+class ResponseCache:
+    """Bounded in-process LRU cache for generated responses"""
+
+    def __init__(self, max_size: int = DEFAULT_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for key, marking it as recently used"""
+        response = self._entries.get(key)
+        if response is None:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return response
+
+    def set(self, key: str, response: str) -> None:
+        """Store a response, evicting the least recently used entry when full"""
+        if self.max_size <= 0:
+            return
+
+        self._entries[key] = response
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop all cached responses and reset statistics"""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+        logger.info("Response cache cleared")
+
+    def stats(self) -> Dict[str, int]:
+        """Get cache size and hit/miss counters"""
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _stored_response(key: str, response: Optional[str] = None) -> Optional[str]:
+    """Identity function whose joblib cache entries hold persisted responses"""
+    return response
+
+
+class PersistentResponseCache:
+    """On-disk response cache backed by joblib.Memory, keyed by request hash"""
+
+    def __init__(self, location: str, max_bytes: int = MAX_CACHE_BYTES):
+        from joblib import Memory
+
+        self.memory = Memory(location=location, verbose=0)
+        self.max_bytes = max_bytes
+        self._stores = 0
+        # Only the key is hashed; the response argument carries the value to persist
+        self._entry = self.memory.cache(_stored_response, ignore=["response"])
+        self.reduce_size()
+        logger.info(f"Persistent response cache enabled at {location}")
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the persisted response for key, if any"""
+        if not self._entry.check_call_in_cache(key):
+            return None
+        return self._entry(key)
+
+    def set(self, key: str, response: str) -> None:
+        """Persist a response, periodically sweeping the cache back under its size limit"""
+        # A cached call stores the response the first time a key is seen
+        self._entry(key, response)
+        self._stores += 1
+        if self._stores % PERSISTENT_SWEEP_INTERVAL == 0:
+            self.reduce_size()
+
+    def reduce_size(self) -> None:
+        """Evict the least recently accessed entries beyond max_bytes"""
+        self.memory.reduce_size(bytes_limit=self.max_bytes)
+
+    def clear(self) -> None:
+        """Drop all persisted responses"""
+        self.memory.clear(warn=False)
@@ -0,0 +1,192 @@
+import errno
+import json
+import logging
+import mmap
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+if TYPE_CHECKING:
+    import torch
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on concurrent shard reads
+MAX_PREFETCH_THREADS = 8
+
+# O_DIRECT requires block-aligned offsets and lengths; reads are issued in 16 MB chunks
+DIRECT_IO_ALIGNMENT = 4096
+DIRECT_IO_CHUNK_SIZE = 16 * 1024 * 1024
+
+# Safetensors dtype codes and the matching torch dtype names
+_SAFETENSORS_DTYPES = {
+    "F64": "float64",
+    "F32": "float32",
+    "F16": "float16",
+    "BF16": "bfloat16",
+    "I64": "int64",
+    "I32": "int32",
+    "I16": "int16",
+    "I8": "int8",
+    "U8": "uint8",
+    "BOOL": "bool",
+}
+
+
+def find_snapshot(model_name: str, cache_dir: Optional[str] = None) -> Optional[Path]:
+    """Locate a model's local directory or cached hub snapshot without downloading"""
+    if Path(model_name).is_dir():
+        return Path(model_name)
+
+    from huggingface_hub import snapshot_download
+
+    try:
+        return Path(snapshot_download(model_name, cache_dir=cache_dir, local_files_only=True))
+    except Exception as e:
+        # Not cached yet - from_pretrained will download it
+        logger.debug(f"No local snapshot for {model_name}: {e}")
+        return None
+
+
+def find_weight_files(model_name: str, cache_dir: Optional[str] = None) -> List[Path]:
+    """Locate the locally cached weight shards for a model, preferring safetensors"""
+    snapshot = find_snapshot(model_name, cache_dir)
+    if snapshot is None:
+        return []
+
+    paths = sorted(snapshot.glob("*.safetensors"))
+    return paths or sorted(snapshot.glob("*.bin"))
+
+
+def _prefetch_file(path: Path) -> int:
+    """Fault a file into the page cache with a populated read-only mapping"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        size = os.fstat(fd).st_size
+        if size == 0:
+            return 0
+        flags = mmap.MAP_PRIVATE | getattr(mmap, "MAP_POPULATE", 0)
+        with mmap.mmap(fd, 0, flags=flags, prot=mmap.PROT_READ) as mapped:
+            if not hasattr(mmap, "MAP_POPULATE") and hasattr(mmap, "MADV_WILLNEED"):
+                mapped.madvise(mmap.MADV_WILLNEED)
+        return size
+    finally:
+        os.close(fd)
+
+
+def prefetch_safetensors(paths: List[Path]) -> int:
+    """Read weight shards into the page cache in parallel, returning the bytes prefetched"""
+    if not paths:
+        return 0
+
+    with ThreadPoolExecutor(max_workers=min(len(paths), MAX_PREFETCH_THREADS)) as pool:
+        return sum(pool.map(_prefetch_file, paths))
+
+
+def _open_direct(path: Path) -> int:
+    """Open a file for O_DIRECT reads, falling back to buffered IO where unsupported"""
+    direct_flag = getattr(os, "O_DIRECT", 0)
+    if direct_flag:
+        try:
+            return os.open(path, os.O_RDONLY | direct_flag)
+        except OSError as e:
+            if e.errno != errno.EINVAL:
+                raise
+            logger.debug(f"O_DIRECT not supported for {path}, using buffered reads")
+    return os.open(path, os.O_RDONLY)
+
+
+def read_direct(path: Path) -> mmap.mmap:
+    """Read a whole file into a page-aligned buffer with parallel chunked O_DIRECT reads"""
+    fd = _open_direct(path)
+    try:
+        size = os.fstat(fd).st_size
+        aligned_size = max(-(-size // DIRECT_IO_ALIGNMENT) * DIRECT_IO_ALIGNMENT, DIRECT_IO_ALIGNMENT)
+        # Anonymous mappings are page aligned, which satisfies O_DIRECT buffer alignment
+        buffer = mmap.mmap(-1, aligned_size)
+        view = memoryview(buffer)
+
+        def read_chunk(offset: int) -> int:
+            chunk = view[offset:offset + DIRECT_IO_CHUNK_SIZE]
+            read = 0
+            while read < len(chunk):
+                count = os.preadv(fd, [chunk[read:]], offset + read)
+                if count == 0:
+                    break
+                read += count
+            return read
+
+        offsets = range(0, size, DIRECT_IO_CHUNK_SIZE)
+        with ThreadPoolExecutor(max_workers=max(1, min(len(offsets), MAX_PREFETCH_THREADS))) as pool:
+            total = sum(pool.map(read_chunk, offsets))
+        view.release()
+
+        if total < size:
+            raise IOError(f"Short read from {path}: {total} of {size} bytes")
+        return buffer
+    finally:
+        os.close(fd)
+
+
+def load_safetensors_direct(path: Path) -> Dict[str, "torch.Tensor"]:
+    """Load a safetensors file as tensors viewing a buffer filled by read_direct"""
+    return _tensors_from_buffer(read_direct(path))
+
+
+def map_safetensors(path: Path) -> Dict[str, "torch.Tensor"]:
+    """Map a safetensors file copy-on-write so its tensors stay backed by evictable page cache"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        # Writable private mapping avoids read-only buffer warnings; pages are never written
+        buffer = mmap.mmap(fd, 0, flags=mmap.MAP_PRIVATE, prot=mmap.PROT_READ | mmap.PROT_WRITE)
+    finally:
+        os.close(fd)
+    return _tensors_from_buffer(buffer)
+
+
+def resident_bytes(paths: List[Path]) -> Optional[int]:
+    """Sum the resident size of this process's mappings of the given files (Linux only)"""
+    targets = {str(Path(path).resolve()) for path in paths}
+    try:
+        smaps = open("/proc/self/smaps")
+    except OSError:
+        return None
+
+    total = 0
+    in_target = False
+    with smaps:
+        for line in smaps:
+            fields = line.split(None, 5)
+            if not fields:
+                continue
+            if "-" in fields[0] and not fields[0].endswith(":"):
+                # Mapping header: address range, perms, offset, device, inode[, path]
+                in_target = len(fields) == 6 and fields[5].strip() in targets
+            elif in_target and fields[0] == "Rss:":
+                total += int(fields[1]) * 1024
+    return total
+
+
+def _tensors_from_buffer(buffer: mmap.mmap) -> Dict[str, "torch.Tensor"]:
+    """Build tensors viewing the data section of a safetensors file held in buffer"""
+    import torch
+
+    header_length = struct.unpack("<Q", buffer[:8])[0]
+    header = json.loads(buffer[8:8 + header_length])
+    data_start = 8 + header_length
+
+    tensors = {}
+    for name, info in header.items():
+        if name == "__metadata__":
+            continue
+        dtype = getattr(torch, _SAFETENSORS_DTYPES[info["dtype"]])
+        start, end = info["data_offsets"]
+        shape = info["shape"]
+        if end == start:
+            tensors[name] = torch.empty(shape, dtype=dtype)
+            continue
+        count = (end - start) // torch.empty((), dtype=dtype).element_size()
+        tensors[name] = torch.frombuffer(buffer, dtype=dtype, count=count, offset=data_start + start).reshape(shape)
+    return tensors
@@ -2,62 +2,126 @@
 """
 Pre-load models during Docker build to avoid runtime download issues
 """
+import argparse
 import os
 import sys
+from accelerate import init_empty_weights
+from accelerate.utils import set_module_tensor_to_device
+from huggingface_hub import snapshot_download
+from safetensors import safe_open
 from transformers import (
-    AutoTokenizer, AutoModelForCausalLM,
+    AutoConfig, AutoTokenizer, AutoModelForCausalLM,
     BlenderbotTokenizer, BlenderbotForConditionalGeneration,
     GPT2LMHeadModel, GPT2Tokenizer
 )
 
+from app.services.model_loader import (
+    QUANTIZATION_MODES, build_quantization_kwargs, from_pretrained_with_attention, select_device_and_dtype
+)
+from app.services.weight_prefetch import find_weight_files, prefetch_safetensors
+
 # Set cache directories
 os.environ['TRANSFORMERS_CACHE'] = '/app/.cache'
 os.environ['HF_HOME'] = '/app/.cache'
 os.environ['HF_HUB_CACHE'] = '/app/.cache/hub'
 
-def preload_model(model_name, model_type="auto"):
+def load_layered(model_name, build_model, load_kwargs):
+    """Build a model tensor by tensor from its safetensors shards, holding one source tensor at a time"""
+    dtype = load_kwargs.get("torch_dtype")
+    if dtype is None or "quantization_config" in load_kwargs:
+        return None
+    
+    snapshot_download(model_name, cache_dir='/app/.cache', allow_patterns=["*.json", "*.safetensors"])
+    paths = find_weight_files(model_name, '/app/.cache')
+    if not paths or any(path.suffix != ".safetensors" for path in paths):
+        return None
+    
+    config = AutoConfig.from_pretrained(model_name, cache_dir='/app/.cache')
+    with init_empty_weights():
+        model = build_model(config)
+    expected = set(model.state_dict())
+    prefix = model.base_model_prefix
+    
+    for path in paths:
+        with safe_open(str(path), framework="pt") as shard:
+            for name in shard.keys():
+                # Some checkpoints store the base model's weights without its prefix
+                target = name if name in expected else f"{prefix}.{name}"
+                if target not in expected:
+                    continue
+                # Each source tensor is cast into place and dropped before the next is read
+                set_module_tensor_to_device(model, target, "cpu", value=shard.get_tensor(name), dtype=dtype)
+    model.tie_weights()
+    
+    if any(tensor.is_meta for tensor in model.parameters()):
+        print(f"Checkpoint layout of {model_name} does not match the model, using from_pretrained")
+        return None
+    return model.eval()
+
+def preload_model(model_name, model_type="auto", quantization=None):
     """Preload a single model with error handling"""
     try:
-        print(f"Pre-loading {model_name}...")
+        print(f"Pre-loading {model_name} (quantization: {quantization or 'none'})...")
+        # Load with the same dtype and quantization the service will use at runtime
+        _, dtype = select_device_and_dtype()
+        load_kwargs = build_quantization_kwargs(quantization, dtype)
+        
+        # Warm the page cache with any already cached shards so from_pretrained reads from memory
+        prefetched = prefetch_safetensors(find_weight_files(model_name, '/app/.cache'))
+        if prefetched:
+            print(f"Prefetched {prefetched / (1024 * 1024):.0f} MB of cached weights")
+        
+        if quantization == "awq":
+            from awq import AutoAWQForCausalLM
+            print(f"Loading AWQ checkpoint: {model_name}")
+            model = AutoAWQForCausalLM.from_quantized(model_name, **load_kwargs)
+            tokenizer = AutoTokenizer.from_pretrained(model_name, cache_dir='/app/.cache')
         
         # Handle specific models based on name patterns
-        if "blenderbot" in model_name.lower():
+        elif "blenderbot" in model_name.lower():
             print(f"Loading BlenderBot model: {model_name}")
-            model = BlenderbotForConditionalGeneration.from_pretrained(
-                model_name, 
-                cache_dir='/app/.cache',
-                torch_dtype="float32",
-                low_cpu_mem_usage=True
-            )
+            model = load_layered(model_name, BlenderbotForConditionalGeneration, load_kwargs)
+            if model is None:
+                model = from_pretrained_with_attention(
+                    BlenderbotForConditionalGeneration,
+                    model_name, 
+                    cache_dir='/app/.cache',
+                    low_cpu_mem_usage=True,
+                    **load_kwargs
+                )
             tokenizer = BlenderbotTokenizer.from_pretrained(model_name, cache_dir='/app/.cache')
             
         elif "dialogpt" in model_name.lower() or "gpt2" in model_name.lower():
             print(f"Loading GPT-2/DialoGPT model: {model_name}")
-            model = AutoModelForCausalLM.from_pretrained(
-                model_name, 
-                cache_dir='/app/.cache',
-                torch_dtype="float32",
-                low_cpu_mem_usage=True
-            )
+            model = load_layered(model_name, AutoModelForCausalLM.from_config, load_kwargs)
+            if model is None:
+                model = from_pretrained_with_attention(
+                    AutoModelForCausalLM,
+                    model_name, 
+                    cache_dir='/app/.cache',
+                    low_cpu_mem_usage=True,
+                    **load_kwargs
+                )
             tokenizer = AutoTokenizer.from_pretrained(model_name, cache_dir='/app/.cache')
             
         else:
             print(f"Loading generic model: {model_name}")
             # Try AutoModel first, fallback to AutoModelForCausalLM
             try:
-                model = AutoModelForCausalLM.from_pretrained(
+                model = from_pretrained_with_attention(
+                    AutoModelForCausalLM,
                     model_name, 
                     cache_dir='/app/.cache',
-                    torch_dtype="float32",
-                    low_cpu_mem_usage=True
+                    low_cpu_mem_usage=True,
+                    **load_kwargs
                 )
             except:
                 from transformers import AutoModel
                 model = AutoModel.from_pretrained(
                     model_name, 
                     cache_dir='/app/.cache',
-                    torch_dtype="float32",
-                    low_cpu_mem_usage=True
+                    low_cpu_mem_usage=True,
+                    **load_kwargs
                 )
             tokenizer = AutoTokenizer.from_pretrained(model_name, cache_dir='/app/.cache')
         
@@ -75,7 +139,7 @@ def preload_model(model_name, model_type="auto"):
         traceback.print_exc()
         return False
 
-def preload_models():
+def preload_models(quantization=None):
     print("Starting model pre-loading...")
     
     # Get models from environment variable
@@ -85,10 +149,18 @@ def preload_models():
     for model_name in default_models:
         model_name = model_name.strip()
         if model_name:
-            if preload_model(model_name):
+            if preload_model(model_name, quantization=quantization):
                 loaded_count += 1
     
     print(f"Model pre-loading completed: {loaded_count}/{len(default_models)} models loaded")
 
 if __name__ == "__main__":
-    preload_models()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--quantization",
+        choices=("none",) + QUANTIZATION_MODES,
+        default=os.getenv("QUANTIZATION", "none"),
+        help="Load models with the quantization the service will use"
+    )
+    args = parser.parse_args()
+    preload_models(None if args.quantization == "none" else args.quantization)
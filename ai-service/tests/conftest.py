@@ -6,10 +6,11 @@ while maintaining strict isolation between test cases.
 """
 
 import pytest
+import pytest_asyncio
 import asyncio
 from unittest.mock import AsyncMock, MagicMock, patch
-from httpx import AsyncClient
-from typing import Dict, Any, List
+from httpx import ASGITransport, AsyncClient
+from typing import Dict, Any, List, Tuple
 
 # Import after setting up the test environment
 from app.main import app
@@ -19,8 +20,13 @@ from app.schemas.ai_schemas import Message
 
 @pytest.fixture(scope="session")
 def event_loop():
-    """Create an instance of the default event loop for the test session."""
-    loop = asyncio.get_event_loop_policy().new_event_loop()
+    """Create the event loop for the test session, using uvloop like the service does."""
+    try:
+        import uvloop
+        loop = uvloop.new_event_loop()
+    except ImportError:
+        # uvloop is unavailable on some platforms (e.g. Windows)
+        loop = asyncio.get_event_loop_policy().new_event_loop()
     yield loop
     loop.close()
 
@@ -54,10 +60,12 @@ def mock_generation_service():
     return service
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_messages() -> List[Message]:
     """
     Provide sample messages for testing conversation flows.
+    
+    Built once per session; tests only read them.
     """
     return [
         Message(role="system", content="You are a helpful assistant."),
@@ -80,16 +88,59 @@ def sample_generation_parameters() -> Dict[str, Any]:
     }
 
 
-@pytest.fixture
+@pytest_asyncio.fixture(scope="session")
 async def async_client():
     """
     Create an async HTTP client for testing FastAPI endpoints.
     
-    This fixture provides a test client that can be used to make
-    HTTP requests to the FastAPI application.
+    One client and ASGI transport are shared by the whole session; the app
+    resolves its services per request, so tests can still patch them. The
+    app's lifespan runs once around the session, as it would in production.
+    """
+    async with app.router.lifespan_context(app):
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            yield client
+
+
+@pytest.fixture(scope="session")
+def asgi_call():
     """
-    async with AsyncClient(app=app, base_url="http://test") as client:
-        yield client
+    Call the FastAPI application directly over ASGI, without an HTTP client.
+    
+    For tests that only check the status code and body; returns an async
+    function taking (method, path, body) and returning (status, body).
+    """
+    async def call(method: str, path: str, body: bytes = b"") -> Tuple[int, bytes]:
+        messages = []
+        
+        async def receive():
+            return {"type": "http.request", "body": body, "more_body": False}
+        
+        async def send(message):
+            messages.append(message)
+        
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "root_path": "",
+            "query_string": b"",
+            "headers": [(b"host", b"test")],
+            "client": ("testclient", 50000),
+            "server": ("test", 80)
+        }
+        await app(scope, receive, send)
+        start = next(message for message in messages if message["type"] == "http.response.start")
+        response_body = b"".join(
+            message.get("body", b"") for message in messages if message["type"] == "http.response.body"
+        )
+        return start["status"], response_body
+    
+    return call
 
 
 @pytest.fixture
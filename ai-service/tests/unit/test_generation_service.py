@@ -5,13 +5,106 @@ This module tests the GenerationService class to ensure proper response
 generation, parameter handling, and error conditions.
 """
 
+import logging
+
 import pytest
-from unittest.mock import AsyncMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 from typing import List, Dict, Any
 
-from app.services.generation_service import GenerationService
+from app.services.generation_service import GenerationService, MessageContext, classify_message
+from app.services.model_loader import ModelLoader
 from app.schemas.ai_schemas import Message
 
+_LONG_CONTENT = "This is a very long message. " * 50
+
+# Message lists are validated once at import and only read by the tests
+_HELLO_MESSAGES = [Message(role="user", content="Hello")]
+_TEST_MESSAGES = [Message(role="user", content="Test")]
+_NO_USER_MESSAGES = [
+    Message(role="system", content="You are a helpful assistant."),
+    Message(role="assistant", content="I'm ready to help.")
+]
+
+# (messages, substrings the response must quote, parameters)
+GENERATE_CASES = [
+    pytest.param(
+        [
+            Message(role="system", content="You are a helpful assistant."),
+            Message(role="user", content="Hello, how are you?"),
+            Message(role="assistant", content="I'm doing well, thank you!"),
+            Message(role="user", content="What can you help me with?")
+        ],
+        ["What can you help me with?"],
+        {"temperature": 0.7},
+        id="user_messages"
+    ),
+    pytest.param(
+        [Message(role="user", content="Tell me a joke")],
+        ["Tell me a joke", "mock AI response"],
+        None,
+        id="single_user_message"
+    ),
+    pytest.param([Message(role="user", content=_LONG_CONTENT)], [_LONG_CONTENT], None, id="long_message"),
+    pytest.param(
+        [Message(role="user", content="Hello! 🤖 Can you help with JSON: {'key': 'value'}?")],
+        ["🤖", "JSON", "{'key': 'value'}"],
+        None,
+        id="special_characters"
+    ),
+    pytest.param(
+        [
+            Message(role="user", content="What's 2+2?"),
+            Message(role="assistant", content="2+2 equals 4."),
+            Message(role="user", content="What about 3+3?"),
+            Message(role="assistant", content="3+3 equals 6."),
+            Message(role="user", content="Thank you!")
+        ],
+        ["Thank you!"],
+        None,
+        id="conversation_history"
+    ),
+    pytest.param(
+        [
+            Message(role="system", content="You are a helpful math tutor."),
+            Message(role="user", content="Explain algebra")
+        ],
+        ["Explain algebra"],
+        None,
+        id="system_message"
+    ),
+    pytest.param([Message(role="user", content="")], ["mock AI response"], None, id="empty_content"),
+    pytest.param([Message(role="user", content="   ")], ["   "], None, id="whitespace_only_content"),
+    pytest.param(
+        [Message(role="user", content="こんにちは! مرحبا! Hello! 🌍")],
+        ["こんにちは!", "مرحبا!", "🌍"],
+        None,
+        id="unicode_content"
+    ),
+]
+
+
+async def _mock_generate(model_name, messages, parameters=None, session_id=None):
+    """Stand-in for model inference that quotes the latest user message."""
+    user_messages = [m["content"] for m in messages if m["role"] == "user"]
+    if not user_messages:
+        return "Hello! How can I help you today?"
+    return f"This is a mock AI response to: {user_messages[-1]}"
+
+
+def _mock_model_loader():
+    """Create a ModelLoader mock whose models are loaded and generate instantly."""
+    loader = MagicMock(spec=ModelLoader)
+    loader.is_model_loaded.return_value = True
+    loader.load_model = AsyncMock(return_value=True)
+    loader.generate_response = AsyncMock(side_effect=_mock_generate)
+    return loader
+
+
+def _assert_nonempty_str(response):
+    """Assert that a generated response is a non-empty string."""
+    assert isinstance(response, str)
+    assert len(response) > 0
+
 
 class TestGenerationService:
     """Test GenerationService functionality."""
@@ -19,11 +112,11 @@ class TestGenerationService:
     @pytest.fixture
     def generation_service(self):
         """Create GenerationService instance for testing."""
-        return GenerationService()
+        return GenerationService(_mock_model_loader())
     
-    @pytest.fixture
+    @pytest.fixture(scope="class")
     def sample_messages(self) -> List[Message]:
-        """Provide sample messages for testing."""
+        """Provide sample messages for testing (read-only, shared by the class)."""
         return [
             Message(role="system", content="You are a helpful assistant."),
             Message(role="user", content="Hello, how are you?"),
@@ -32,29 +125,25 @@ class TestGenerationService:
         ]
     
     @pytest.mark.asyncio
-    async def test_generate_response_with_user_messages(self, generation_service, sample_messages):
-        """Test response generation with user messages."""
+    @pytest.mark.parametrize("messages,expected,parameters", GENERATE_CASES)
+    async def test_generate_response_quotes_user_message(self, generation_service, messages, expected, parameters):
+        """Test that the response is a string quoting the latest user message."""
         response = await generation_service.generate_response(
             model_id="test-model",
-            messages=sample_messages,
-            parameters={"temperature": 0.7}
+            messages=messages,
+            parameters=parameters
         )
         
         assert isinstance(response, str)
-        assert len(response) > 0
-        assert "What can you help me with?" in response
+        for text in expected:
+            assert text in response
     
     @pytest.mark.asyncio
     async def test_generate_response_no_user_messages(self, generation_service):
         """Test response generation with no user messages."""
-        messages = [
-            Message(role="system", content="You are a helpful assistant."),
-            Message(role="assistant", content="I'm ready to help.")
-        ]
-        
         response = await generation_service.generate_response(
             model_id="test-model",
-            messages=messages
+            messages=_NO_USER_MESSAGES
         )
         
         assert response == "Hello! How can I help you today?"
@@ -70,22 +159,20 @@ class TestGenerationService:
         assert response == "Hello! How can I help you today?"
     
     @pytest.mark.asyncio
-    async def test_generate_response_with_parameters(self, generation_service, sample_messages):
+    @pytest.mark.parametrize("parameters", [
+        {"temperature": 0.8, "max_tokens": 150, "top_p": 0.9},
+        {"temperature": 0.1, "max_tokens": 1},
+        {"max_tokens": 500},
+    ])
+    async def test_generate_response_with_parameters(self, generation_service, sample_messages, parameters):
         """Test response generation with various parameters."""
-        parameters = {
-            "temperature": 0.8,
-            "max_tokens": 150,
-            "top_p": 0.9
-        }
-        
         response = await generation_service.generate_response(
             model_id="test-model",
             messages=sample_messages,
             parameters=parameters
         )
         
-        assert isinstance(response, str)
-        assert len(response) > 0
+        _assert_nonempty_str(response)
     
     @pytest.mark.asyncio
     async def test_generate_response_without_parameters(self, generation_service, sample_messages):
@@ -95,144 +182,63 @@ class TestGenerationService:
             messages=sample_messages
         )
         
-        assert isinstance(response, str)
-        assert len(response) > 0
+        _assert_nonempty_str(response)
     
     @pytest.mark.asyncio
-    async def test_generate_response_different_models(self, generation_service, sample_messages):
+    @pytest.mark.parametrize("model_id", ["model-1", "model-2", "gpt-3.5-turbo", "claude-instant"])
+    async def test_generate_response_different_models(self, generation_service, sample_messages, model_id):
         """Test response generation with different model IDs."""
-        models = ["model-1", "model-2", "gpt-3.5-turbo", "claude-instant"]
-        
-        for model_id in models:
-            response = await generation_service.generate_response(
-                model_id=model_id,
-                messages=sample_messages
-            )
-            
-            assert isinstance(response, str)
-            assert len(response) > 0
-    
-    @pytest.mark.asyncio
-    async def test_generate_response_with_single_user_message(self, generation_service):
-        """Test response generation with single user message."""
-        messages = [Message(role="user", content="Tell me a joke")]
-        
-        response = await generation_service.generate_response(
-            model_id="test-model",
-            messages=messages
-        )
-        
-        assert "Tell me a joke" in response
-        assert "mock AI response" in response
-    
-    @pytest.mark.asyncio
-    async def test_generate_response_with_long_message(self, generation_service):
-        """Test response generation with long user message."""
-        long_content = "This is a very long message. " * 50
-        messages = [Message(role="user", content=long_content)]
-        
-        response = await generation_service.generate_response(
-            model_id="test-model",
-            messages=messages
-        )
-        
-        assert isinstance(response, str)
-        assert len(response) > 0
-        assert long_content in response
-    
-    @pytest.mark.asyncio
-    async def test_generate_response_with_special_characters(self, generation_service):
-        """Test response generation with special characters in messages."""
-        messages = [
-            Message(role="user", content="Hello! 🤖 Can you help with JSON: {'key': 'value'}?")
-        ]
-        
         response = await generation_service.generate_response(
-            model_id="test-model",
-            messages=messages
-        )
-        
-        assert "🤖" in response
-        assert "JSON" in response
-        assert "{'key': 'value'}" in response
-    
-    @pytest.mark.asyncio
-    async def test_generate_response_conversation_history(self, generation_service):
-        """Test response generation with conversation history."""
-        messages = [
-            Message(role="user", content="What's 2+2?"),
-            Message(role="assistant", content="2+2 equals 4."),
-            Message(role="user", content="What about 3+3?"),
-            Message(role="assistant", content="3+3 equals 6."),
-            Message(role="user", content="Thank you!")
-        ]
-        
-        response = await generation_service.generate_response(
-            model_id="test-model",
-            messages=messages
+            model_id=model_id,
+            messages=sample_messages
         )
         
-        assert "Thank you!" in response
-        assert isinstance(response, str)
+        _assert_nonempty_str(response)
     
     @pytest.mark.asyncio
-    async def test_generate_response_error_handling(self, generation_service):
+    async def test_generate_response_error_handling(self, generation_service, caplog):
         """Test error handling in response generation."""
-        messages = [Message(role="user", content="Hello")]
+        messages = _HELLO_MESSAGES
+        caplog.set_level(logging.ERROR, logger="app.services.generation_service")
         
         # Test with invalid parameters that might cause errors
-        with patch('app.services.generation_service.logger') as mock_logger:
-            try:
-                response = await generation_service.generate_response(
-                    model_id="test-model",
-                    messages=messages,
-                    parameters={"invalid_param": "invalid_value"}
-                )
-                # Should still return a response even with invalid params
-                assert isinstance(response, str)
-            except Exception as e:
-                # If an exception is raised, ensure it's logged
-                mock_logger.error.assert_called()
-                raise e
+        try:
+            response = await generation_service.generate_response(
+                model_id="test-model",
+                messages=messages,
+                parameters={"invalid_param": "invalid_value"}
+            )
+            # Should still return a response even with invalid params
+            assert isinstance(response, str)
+        except Exception:
+            # If an exception is raised, ensure it's logged
+            assert any(record.levelno == logging.ERROR for record in caplog.records)
+            raise
     
-    @pytest.mark.asyncio  
-    async def test_generate_response_with_system_message(self, generation_service):
-        """Test response generation with system message."""
-        messages = [
-            Message(role="system", content="You are a helpful math tutor."),
-            Message(role="user", content="Explain algebra")
-        ]
-        
-        response = await generation_service.generate_response(
+    @pytest.mark.asyncio
+    async def test_generate_response_logging(self, generation_service, sample_messages, caplog):
+        """Test that response generation produces appropriate logs."""
+        caplog.set_level(logging.DEBUG, logger="app.services.generation_service")
+        await generation_service.generate_response(
             model_id="test-model",
-            messages=messages
+            messages=sample_messages,
+            parameters={"temperature": 0.7}
         )
         
-        assert "Explain algebra" in response
-        assert isinstance(response, str)
-    
-    @pytest.mark.asyncio
-    async def test_generate_response_logging(self, generation_service, sample_messages):
-        """Test that response generation produces appropriate logs."""
-        with patch('app.services.generation_service.logger') as mock_logger:
-            await generation_service.generate_response(
-                model_id="test-model",
-                messages=sample_messages,
-                parameters={"temperature": 0.7}
-            )
-            
-            # Check that debug logs were called
-            assert mock_logger.debug.call_count >= 2
-            
-            # Check log content
-            debug_calls = [call.args[0] for call in mock_logger.debug.call_args_list]
-            assert any("Starting generation" in call for call in debug_calls)
-            assert any("Generation completed" in call for call in debug_calls)
+        # Check that debug logs were emitted
+        debug_messages = [record.message for record in caplog.records if record.levelno == logging.DEBUG]
+        assert len(debug_messages) >= 2
+        
+        # Check log content
+        assert any("Starting generation" in message for message in debug_messages)
+        assert any("Generation completed" in message for message in debug_messages)
     
     def test_init(self):
         """Test GenerationService initialization."""
-        service = GenerationService()
+        loader = _mock_model_loader()
+        service = GenerationService(loader)
         assert isinstance(service, GenerationService)
+        assert service.model_loader is loader
     
     @pytest.mark.asyncio
     async def test_generate_response_return_type(self, generation_service, sample_messages):
@@ -242,8 +248,25 @@ class TestGenerationService:
             messages=sample_messages
         )
         
-        assert isinstance(response, str)
-        assert len(response) > 0
+        _assert_nonempty_str(response)
+
+
+class TestSessionRouting:
+    """Test which requests continue a model-side session instead of being batched."""
+    
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("supports_sessions", [True, False])
+    async def test_only_session_capable_models_skip_batcher(self, supports_sessions):
+        """Test that session IDs bypass the batcher only when the loader keeps the session."""
+        loader = _mock_model_loader()
+        loader.use_session.return_value = supports_sessions
+        service = GenerationService(loader)
+        service.batcher.submit = AsyncMock(return_value="batched")
+        
+        await service.generate_response(model_id="test-model", messages=_HELLO_MESSAGES, session_id="chat-1")
+        
+        assert service.batcher.submit.called is not supports_sessions
+        assert loader.generate_response.called is supports_sessions
 
 
 class TestGenerationServiceEdgeCases:
@@ -252,12 +275,12 @@ class TestGenerationServiceEdgeCases:
     @pytest.fixture
     def generation_service(self):
         """Create GenerationService instance for testing."""
-        return GenerationService()
+        return GenerationService(_mock_model_loader())
     
     @pytest.mark.asyncio
     async def test_generate_response_with_none_parameters(self, generation_service):
         """Test response generation with None parameters."""
-        messages = [Message(role="user", content="Hello")]
+        messages = _HELLO_MESSAGES
         
         response = await generation_service.generate_response(
             model_id="test-model",
@@ -268,55 +291,79 @@ class TestGenerationServiceEdgeCases:
         assert isinstance(response, str)
     
     @pytest.mark.asyncio
-    async def test_generate_response_with_empty_content(self, generation_service):
-        """Test response generation with empty message content."""
-        messages = [Message(role="user", content="")]
+    async def test_generate_response_very_long_model_id(self, generation_service):
+        """Test response generation with very long model ID."""
+        messages = _TEST_MESSAGES
+        long_model_id = "a" * 1000  # Very long model ID
         
         response = await generation_service.generate_response(
-            model_id="test-model",
+            model_id=long_model_id,
             messages=messages
         )
         
-        # Should include the empty content in the response
         assert isinstance(response, str)
-        assert "mock AI response" in response
+
+
+class TestMessageClassification:
+    """Test keyword classification used by canned responses."""
     
-    @pytest.mark.asyncio
-    async def test_generate_response_whitespace_only_content(self, generation_service):
-        """Test response generation with whitespace-only content."""
-        messages = [Message(role="user", content="   ")]
+    @pytest.mark.parametrize("message,expected", [
+        ("", set()),
+        ("hello there", {"greeting"}),
+        ("thanks!", {"thanks"}),
+        ("what can you do", {"help"}),
+        ("how do i write python code", {"explain", "code"}),
+        ("this", {"greeting"}),
+    ])
+    def test_classify_message(self, message, expected):
+        """Test that every matching category is reported."""
+        assert classify_message(message) == expected
+    
+    def test_contextual_response_uses_categories(self):
+        """Test that model-specific responses follow keyword priority."""
+        service = GenerationService(MagicMock())
         
-        response = await generation_service.generate_response(
-            model_id="test-model",
-            messages=messages
-        )
+        context = MessageContext()
         
-        assert isinstance(response, str)
-        assert "   " in response
-    
-    @pytest.mark.asyncio
-    async def test_generate_response_unicode_content(self, generation_service):
-        """Test response generation with unicode content."""
-        messages = [Message(role="user", content="こんにちは! مرحبا! Hello! 🌍")]
+        response = service._generate_contextual_response("gpt-4", "Explain Python code", context)
+        assert "help with programming" in response
         
-        response = await generation_service.generate_response(
-            model_id="test-model",
-            messages=messages
-        )
+        response = service._generate_contextual_response("claude-instant", "Thanks a lot", context)
+        assert "You're very welcome" in response
+
+
+class TestMessageContext:
+    """Test single-pass conversation context."""
+    
+    def test_from_messages(self, sample_messages):
+        """Test that counts and last user message are collected."""
+        context = MessageContext.from_messages(sample_messages)
         
-        assert "こんにちは!" in response
-        assert "مرحبا!" in response
-        assert "🌍" in response
+        assert context.system_count == 1
+        assert context.system_prompt_length == len("You are a helpful assistant.")
+        assert context.conversation_length == 3
+        assert context.prompt_chars == sum(len(m.content) + len(m.role) + 4 for m in sample_messages)
+        assert context.has_system_prompt is True
+        assert context.last_user_message == "What's the weather like?"
+        assert context.message_lower == "what's the weather like?"
     
-    @pytest.mark.asyncio
-    async def test_generate_response_very_long_model_id(self, generation_service):
-        """Test response generation with very long model ID."""
-        messages = [Message(role="user", content="Test")]
-        long_model_id = "a" * 1000  # Very long model ID
+    def test_from_empty_messages(self):
+        """Test context for an empty conversation."""
+        context = MessageContext.from_messages([])
         
-        response = await generation_service.generate_response(
-            model_id=long_model_id,
-            messages=messages
-        )
+        assert context.prompt_chars == 0
+        assert context.has_system_prompt is False
+        assert context.last_user_message is None
+        assert context.message_lower == ""
+    
+    def test_fallback_uses_last_user_message(self):
+        """Test that fallback responses quote the latest user message."""
+        service = GenerationService(MagicMock())
+        context = MessageContext.from_messages([
+            Message(role="user", content="First"),
+            Message(role="user", content="Second")
+        ])
         
-        assert isinstance(response, str)
+        response = service._generate_fallback_response("microsoft/DialoGPT-small", context)
+        assert "'Second'" in response
+        assert "DialoGPT" in response
@@ -5,37 +5,49 @@ This module tests the main FastAPI application endpoints to ensure proper
 request handling, response formats, and error conditions.
 """
 
+import asyncio
+
+import orjson
 import pytest
-from httpx import AsyncClient
 from unittest.mock import AsyncMock, patch, MagicMock
 from typing import Dict, Any
 
 from app.main import app
+from app.services.generation_service import GenerationResult
 from app.schemas.ai_schemas import Message
 
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Built once at import; strings are immutable and the request is only read
+_LARGE_CONTENT = "x" * 100000  # 100KB message
+_LARGE_REQUEST = {
+    "model": "test-model",
+    "messages": [
+        {"role": "user", "content": _LARGE_CONTENT}
+    ]
+}
+
 
 class TestHealthEndpoint:
     """Test health check endpoint."""
     
     @pytest.mark.asyncio
-    async def test_health_check_success(self):
+    async def test_health_check_success(self, asgi_call):
         """Test successful health check."""
-        async with AsyncClient(app=app, base_url="http://test") as client:
-            response = await client.get("/health")
+        status, body = await asgi_call("GET", "/health")
         
-        assert response.status_code == 200
-        data = response.json()
+        assert status == 200
+        data = orjson.loads(body)
         assert data["status"] == "healthy"
         assert data["service"] == "AI Inference Service"
     
     @pytest.mark.asyncio
-    async def test_health_check_response_format(self):
+    async def test_health_check_response_format(self, asgi_call):
         """Test health check response format."""
-        async with AsyncClient(app=app, base_url="http://test") as client:
-            response = await client.get("/health")
+        status, body = await asgi_call("GET", "/health")
         
-        assert response.status_code == 200
-        data = response.json()
+        assert status == 200
+        data = orjson.loads(body)
         assert isinstance(data, dict)
         assert "status" in data
         assert "service" in data
@@ -45,32 +57,32 @@ class TestHealthEndpoint:
 class TestGenerateEndpoint:
     """Test text generation endpoint."""
     
-    @pytest.fixture
+    @pytest.fixture(scope="class")
     def sample_request_data(self):
-        """Provide sample request data for testing."""
-        return {
+        """Provide sample request data for testing, serialized once as a JSON body and headers."""
+        return orjson.dumps({
             "model": "test-model",
             "messages": [
                 {"role": "user", "content": "Hello, how are you?"}
             ],
             "parameters": {"temperature": 0.7, "max_tokens": 100}
-        }
+        }), JSON_HEADERS
     
-    @pytest.fixture
+    @pytest.fixture(scope="class")
     def sample_request_data_no_model(self):
-        """Provide sample request data without model for testing."""
-        return {
+        """Provide sample request data without model for testing, serialized once."""
+        return orjson.dumps({
             "messages": [
                 {"role": "user", "content": "Hello, how are you?"}
             ],
             "parameters": {"temperature": 0.7}
-        }
+        }), JSON_HEADERS
     
     @pytest.mark.asyncio
-    async def test_generate_response_success(self, sample_request_data):
+    async def test_generate_response_success(self, sample_request_data, async_client):
         """Test successful response generation."""
-        async with AsyncClient(app=app, base_url="http://test") as client:
-            response = await client.post("/generate", json=sample_request_data)
+        body, headers = sample_request_data
+        response = await async_client.post("/generate", content=body, headers=headers)
         
         assert response.status_code == 200
         data = response.json()
@@ -83,35 +95,40 @@ class TestGenerateEndpoint:
         assert "Hello, how are you?" in data["response"]
     
     @pytest.mark.asyncio
-    async def test_generate_response_without_model(self, sample_request_data_no_model):
-        """Test response generation without model specified."""
-        async with AsyncClient(app=app, base_url="http://test") as client:
-            response = await client.post("/generate", json=sample_request_data_no_model)
+    async def test_generate_response_without_model(self, sample_request_data_no_model, async_client):
+        """Test that a request without a model uses the first available model."""
+        from app.main import model_loader
+        
+        body, headers = sample_request_data_no_model
+        result = GenerationResult("Hello")
+        with patch.object(model_loader, 'current_model', None), \
+             patch.object(model_loader, 'available_models', ["default-model", "other-model"]), \
+             patch('app.main.generation_service.generate', AsyncMock(return_value=result)) as mock_generate:
+            response = await async_client.post("/generate", content=body, headers=headers)
         
         assert response.status_code == 200
         data = response.json()
         
-        assert "response" in data
-        assert data["model"] == "default"
-        assert isinstance(data["response"], str)
+        assert data["response"] == "Hello"
+        assert data["model"] == "default-model"
+        assert mock_generate.await_args.kwargs["model_id"] == "default-model"
     
     @pytest.mark.asyncio
-    async def test_generate_response_empty_messages(self):
+    async def test_generate_response_empty_messages(self, async_client):
         """Test response generation with empty messages."""
         request_data = {
             "model": "test-model",
             "messages": []
         }
         
-        async with AsyncClient(app=app, base_url="http://test") as client:
-            response = await client.post("/generate", json=request_data)
+        response = await async_client.post("/generate", json=request_data)
         
         assert response.status_code == 200
         data = response.json()
         assert isinstance(data["response"], str)
     
     @pytest.mark.asyncio
-    async def test_generate_response_multiple_messages(self):
+    async def test_generate_response_multiple_messages(self, async_client):
         """Test response generation with multiple messages."""
         request_data = {
             "model": "test-model",
@@ -124,8 +141,7 @@ class TestGenerateEndpoint:
             "parameters": {"temperature": 0.8}
         }
         
-        async with AsyncClient(app=app, base_url="http://test") as client:
-            response = await client.post("/generate", json=request_data)
+        response = await async_client.post("/generate", json=request_data)
         
         assert response.status_code == 200
         data = response.json()
@@ -134,7 +150,7 @@ class TestGenerateEndpoint:
         assert "How are you?" in data["response"]
     
     @pytest.mark.asyncio
-    async def test_generate_response_with_system_message(self):
+    async def test_generate_response_with_system_message(self, async_client):
         """Test response generation with system message."""
         request_data = {
             "model": "test-model",
@@ -144,49 +160,46 @@ class TestGenerateEndpoint:
             ]
         }
         
-        async with AsyncClient(app=app, base_url="http://test") as client:
-            response = await client.post("/generate", json=request_data)
+        response = await async_client.post("/generate", json=request_data)
         
         assert response.status_code == 200
         data = response.json()
         assert "Explain fractions" in data["response"]
     
     @pytest.mark.asyncio
-    async def test_generate_response_various_parameters(self):
+    @pytest.mark.parametrize("parameters", [
+        {"temperature": 0.9, "max_tokens": 200, "top_p": 0.95, "frequency_penalty": 0.1},
+        {"temperature": 0.1, "max_tokens": 1},
+        {},
+    ])
+    async def test_generate_response_various_parameters(self, async_client, parameters):
         """Test response generation with various parameters."""
         request_data = {
             "model": "test-model",
             "messages": [{"role": "user", "content": "Test"}],
-            "parameters": {
-                "temperature": 0.9,
-                "max_tokens": 200,
-                "top_p": 0.95,
-                "frequency_penalty": 0.1
-            }
+            "parameters": parameters
         }
         
-        async with AsyncClient(app=app, base_url="http://test") as client:
-            response = await client.post("/generate", json=request_data)
+        response = await async_client.post("/generate", json=request_data)
         
         assert response.status_code == 200
         data = response.json()
         assert isinstance(data["response"], str)
     
     @pytest.mark.asyncio
-    async def test_generate_response_missing_required_field(self):
+    async def test_generate_response_missing_required_field(self, async_client):
         """Test response generation with missing required field."""
         request_data = {
             "model": "test-model"
             # Missing messages field
         }
         
-        async with AsyncClient(app=app, base_url="http://test") as client:
-            response = await client.post("/generate", json=request_data)
+        response = await async_client.post("/generate", json=request_data)
         
         assert response.status_code == 422  # Validation error
     
     @pytest.mark.asyncio
-    async def test_generate_response_invalid_message_format(self):
+    async def test_generate_response_invalid_message_format(self, async_client):
         """Test response generation with invalid message format."""
         request_data = {
             "model": "test-model",
@@ -195,16 +208,15 @@ class TestGenerateEndpoint:
             ]
         }
         
-        async with AsyncClient(app=app, base_url="http://test") as client:
-            response = await client.post("/generate", json=request_data)
+        response = await async_client.post("/generate", json=request_data)
         
         assert response.status_code == 422  # Validation error
     
     @pytest.mark.asyncio
-    async def test_generate_response_usage_calculation(self, sample_request_data):
+    async def test_generate_response_usage_calculation(self, sample_request_data, async_client):
         """Test that usage statistics are calculated correctly."""
-        async with AsyncClient(app=app, base_url="http://test") as client:
-            response = await client.post("/generate", json=sample_request_data)
+        body, headers = sample_request_data
+        response = await async_client.post("/generate", content=body, headers=headers)
         
         assert response.status_code == 200
         data = response.json()
@@ -216,7 +228,7 @@ class TestGenerateEndpoint:
         assert usage["total_tokens"] == usage["prompt_tokens"] + usage["completion_tokens"]
     
     @pytest.mark.asyncio
-    async def test_generate_response_with_special_characters(self):
+    async def test_generate_response_with_special_characters(self, async_client):
         """Test response generation with special characters."""
         request_data = {
             "model": "test-model",
@@ -225,20 +237,34 @@ class TestGenerateEndpoint:
             ]
         }
         
-        async with AsyncClient(app=app, base_url="http://test") as client:
-            response = await client.post("/generate", json=request_data)
+        response = await async_client.post("/generate", json=request_data)
         
         assert response.status_code == 200
         data = response.json()
         assert "🤖" in data["response"]
         assert "JSON" in data["response"]
+    
+    @pytest.mark.asyncio
+    async def test_generate_response_forwards_session_id(self, async_client):
+        """Test that the session ID reaches the generation service."""
+        request_data = {
+            "model": "test-model",
+            "messages": [{"role": "user", "content": "Hello"}],
+            "session_id": "chat-1"
+        }
+        
+        with patch('app.main.generation_service.generate', new_callable=AsyncMock, return_value=GenerationResult("Hi")) as mock_generate:
+            response = await async_client.post("/generate", json=request_data)
+        
+        assert response.status_code == 200
+        assert mock_generate.await_args.kwargs["session_id"] == "chat-1"
 
 
 class TestChatEndpoint:
     """Test chat completion endpoint."""
     
     @pytest.mark.asyncio
-    async def test_chat_completion_success(self):
+    async def test_chat_completion_success(self, async_client):
         """Test successful chat completion."""
         request_data = {
             "model": "test-model",
@@ -248,8 +274,7 @@ class TestChatEndpoint:
             "parameters": {"temperature": 0.7}
         }
         
-        async with AsyncClient(app=app, base_url="http://test") as client:
-            response = await client.post("/chat", json=request_data)
+        response = await async_client.post("/chat", json=request_data)
         
         assert response.status_code == 200
         data = response.json()
@@ -260,7 +285,7 @@ class TestChatEndpoint:
         assert isinstance(data["response"], str)
     
     @pytest.mark.asyncio
-    async def test_chat_completion_same_as_generate(self):
+    async def test_chat_completion_same_as_generate(self, async_client):
         """Test that chat completion produces same result as generate."""
         request_data = {
             "model": "test-model",
@@ -269,9 +294,11 @@ class TestChatEndpoint:
             ]
         }
         
-        async with AsyncClient(app=app, base_url="http://test") as client:
-            generate_response = await client.post("/generate", json=request_data)
-            chat_response = await client.post("/chat", json=request_data)
+        # The two requests are independent, so overlap their round trips
+        generate_response, chat_response = await asyncio.gather(
+            async_client.post("/generate", json=request_data),
+            async_client.post("/chat", json=request_data)
+        )
         
         assert generate_response.status_code == 200
         assert chat_response.status_code == 200
@@ -297,84 +324,69 @@ class TestApplicationSetup:
         assert "AI model inference and management" in app.description
     
     @pytest.mark.asyncio
-    async def test_cors_configuration(self):
+    async def test_cors_configuration(self, async_client):
         """Test CORS configuration."""
-        async with AsyncClient(app=app, base_url="http://test") as client:
-            # Test preflight request
-            response = await client.options(
-                "/health",
-                headers={
-                    "Origin": "http://localhost:3000",
-                    "Access-Control-Request-Method": "GET"
-                }
-            )
+        # Test preflight request
+        response = await async_client.options(
+            "/health",
+            headers={
+                "Origin": "http://localhost:3000",
+                "Access-Control-Request-Method": "GET"
+            }
+        )
         
         # Should not return error due to CORS
         assert response.status_code in [200, 404]  # 404 if OPTIONS not explicitly handled
     
     @pytest.mark.asyncio
-    async def test_root_path_not_found(self):
+    async def test_root_path_not_found(self, asgi_call):
         """Test that root path returns 404."""
-        async with AsyncClient(app=app, base_url="http://test") as client:
-            response = await client.get("/")
+        status, _ = await asgi_call("GET", "/")
         
-        assert response.status_code == 404
+        assert status == 404
     
     @pytest.mark.asyncio
-    async def test_nonexistent_endpoint(self):
+    async def test_nonexistent_endpoint(self, asgi_call):
         """Test accessing non-existent endpoint."""
-        async with AsyncClient(app=app, base_url="http://test") as client:
-            response = await client.get("/nonexistent")
+        status, _ = await asgi_call("GET", "/nonexistent")
         
-        assert response.status_code == 404
+        assert status == 404
 
 
 class TestErrorHandling:
     """Test error handling in endpoints."""
     
     @pytest.mark.asyncio
-    async def test_invalid_json(self):
+    async def test_invalid_json(self, async_client):
         """Test handling of invalid JSON."""
-        async with AsyncClient(app=app, base_url="http://test") as client:
-            response = await client.post(
-                "/generate",
-                content="invalid json",
-                headers={"Content-Type": "application/json"}
-            )
+        response = await async_client.post(
+            "/generate",
+            content="invalid json",
+            headers={"Content-Type": "application/json"}
+        )
         
         assert response.status_code == 422
     
     @pytest.mark.asyncio
-    async def test_empty_request_body(self):
+    async def test_empty_request_body(self, async_client):
         """Test handling of empty request body."""
-        async with AsyncClient(app=app, base_url="http://test") as client:
-            response = await client.post("/generate", json={})
+        response = await async_client.post("/generate", json={})
         
         assert response.status_code == 422  # Missing required fields
     
     @pytest.mark.asyncio
-    async def test_wrong_http_method(self):
+    async def test_wrong_http_method(self, asgi_call):
         """Test using wrong HTTP method."""
-        async with AsyncClient(app=app, base_url="http://test") as client:
-            # Try GET on POST endpoint
-            response = await client.get("/generate")
+        # Try GET on POST endpoint
+        status, _ = await asgi_call("GET", "/generate")
         
-        assert response.status_code == 405  # Method not allowed
+        assert status == 405  # Method not allowed
     
     @pytest.mark.asyncio
-    async def test_large_request_body(self):
+    async def test_large_request_body(self, async_client):
         """Test handling of large request body."""
         # Create a very large message
-        large_content = "x" * 100000  # 100KB message
-        request_data = {
-            "model": "test-model",
-            "messages": [
-                {"role": "user", "content": large_content}
-            ]
-        }
-        
-        async with AsyncClient(app=app, base_url="http://test") as client:
-            response = await client.post("/generate", json=request_data)
+        response = await async_client.post("/generate", json=_LARGE_REQUEST)
         
         # Should handle large requests gracefully
         assert response.status_code in [200, 413, 422]  # Success, too large, or validation error
@@ -384,7 +396,7 @@ class TestLogging:
     """Test logging behavior in endpoints."""
     
     @pytest.mark.asyncio
-    async def test_generate_endpoint_logging(self):
+    async def test_generate_endpoint_logging(self, async_client):
         """Test that generate endpoint produces appropriate logs."""
         request_data = {
             "model": "test-model",
@@ -393,8 +405,7 @@ class TestLogging:
         }
         
         with patch('app.main.logger') as mock_logger:
-            async with AsyncClient(app=app, base_url="http://test") as client:
-                response = await client.post("/generate", json=request_data)
+            response = await async_client.post("/generate", json=request_data)
             
             assert response.status_code == 200
             
@@ -406,10 +417,10 @@ class TestLogging:
             assert any("Generation request received" in call for call in debug_calls)
     
     @pytest.mark.asyncio 
-    async def test_error_logging(self):
+    async def test_error_logging(self, async_client):
         """Test that errors are properly logged."""
         # Mock the generation service to raise an exception
-        with patch('app.main.generation_service.generate_response') as mock_generate:
+        with patch('app.main.generation_service.generate') as mock_generate:
             mock_generate.side_effect = Exception("Test error")
             
             with patch('app.main.logger') as mock_logger:
@@ -418,8 +429,7 @@ class TestLogging:
                     "messages": [{"role": "user", "content": "Test"}]
                 }
                 
-                async with AsyncClient(app=app, base_url="http://test") as client:
-                    response = await client.post("/generate", json=request_data)
+                response = await async_client.post("/generate", json=request_data)
                 
                 assert response.status_code == 500
                 mock_logger.error.assert_called()
@@ -427,3 +437,274 @@ class TestLogging:
                 # Check error message content
                 error_call = mock_logger.error.call_args[0][0]
                 assert "Error generating response" in error_call
+
+
+class TestRedisCache:
+    """Test the optional shared Redis response cache."""
+    
+    @pytest.fixture
+    def mock_redis(self):
+        """Install a mock Redis client on the application state."""
+        redis = MagicMock()
+        redis.get = AsyncMock(return_value=None)
+        redis.set = AsyncMock()
+        app.state.redis = redis
+        yield redis
+        app.state.redis = None
+    
+    @pytest.mark.asyncio
+    async def test_cache_hit_skips_generation(self, mock_redis, async_client):
+        """Test that a Redis hit is returned without running generation."""
+        mock_redis.get.return_value = b"Cached response"
+        request_data = {
+            "model": "test-model",
+            "messages": [{"role": "user", "content": "Hello"}],
+            "parameters": {"temperature": 0}
+        }
+        
+        with patch('app.main.generation_service.generate', new_callable=AsyncMock) as mock_generate:
+            response = await async_client.post("/generate", json=request_data)
+        
+        assert response.status_code == 200
+        assert response.json()["response"] == "Cached response"
+        mock_generate.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_sampled_requests_bypass_cache(self, mock_redis, async_client):
+        """Test that non-deterministic requests never touch Redis."""
+        request_data = {
+            "model": "test-model",
+            "messages": [{"role": "user", "content": "Hello"}],
+            "parameters": {"temperature": 0.8}
+        }
+        
+        response = await async_client.post("/generate", json=request_data)
+        
+        assert response.status_code == 200
+        mock_redis.get.assert_not_called()
+        mock_redis.set.assert_not_called()
+    
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("fallback", [False, True])
+    async def test_only_model_output_is_shared(self, mock_redis, async_client, fallback):
+        """Test that fallback responses are never written to Redis."""
+        request_data = {
+            "model": "test-model",
+            "messages": [{"role": "user", "content": "Hello"}],
+            "parameters": {"temperature": 0}
+        }
+        result = GenerationResult("Hi", fallback=fallback)
+        
+        with patch('app.main.generation_service.generate', AsyncMock(return_value=result)):
+            response = await async_client.post("/generate", json=request_data)
+        
+        assert response.status_code == 200
+        assert mock_redis.set.called is not fallback
+    
+    @pytest.mark.asyncio
+    async def test_redis_errors_fall_back_to_generation(self, mock_redis, async_client):
+        """Test that Redis failures do not fail the request."""
+        mock_redis.get.side_effect = ConnectionError("Redis down")
+        request_data = {
+            "model": "test-model",
+            "messages": [{"role": "user", "content": "Hello"}],
+            "parameters": {"temperature": 0}
+        }
+        
+        response = await async_client.post("/generate", json=request_data)
+        
+        assert response.status_code == 200
+        assert isinstance(response.json()["response"], str)
+
+
+class TestModelListingCache:
+    """Test TTL caching of the available model listing."""
+    
+    @pytest.fixture
+    def mock_listing(self):
+        """Patch the model listing and reset the cache around each test."""
+        models = [{"id": "test-model", "name": "Test", "type": "dialog", "is_loaded": False, "quantization": None, "memory_usage": "~1 GB"}]
+        app.state.models_cache = None
+        with patch('app.main.model_loader.get_available_models', return_value=models) as mock_list:
+            yield mock_list
+        app.state.models_cache = None
+    
+    @pytest.mark.asyncio
+    async def test_listing_is_reused(self, mock_listing, async_client):
+        """Test that repeated lookups reuse the cached listing."""
+        await async_client.get("/models")
+        response = await async_client.get("/models/test-model/status")
+        
+        assert response.status_code == 200
+        assert mock_listing.call_count == 1
+    
+    @pytest.mark.asyncio
+    async def test_listing_rebuilt_when_loaded_models_change(self, mock_listing, async_client):
+        """Test that loading or unloading a model invalidates the listing."""
+        await async_client.get("/models")
+        with patch('app.main.model_loader.get_loaded_models', return_value=["test-model"]):
+            await async_client.get("/models")
+        
+        assert mock_listing.call_count == 2
+    
+    @pytest.mark.asyncio
+    async def test_unknown_model_not_found(self, mock_listing, async_client):
+        """Test that the id index reports unknown models."""
+        response = await async_client.get("/models/missing/status")
+        
+        assert response.status_code == 404
+    
+    @pytest.mark.asyncio
+    async def test_load_passes_quantization(self, mock_listing, async_client):
+        """Test that the load endpoint forwards the requested quantization."""
+        with patch('app.main.model_loader.load_model', new_callable=AsyncMock, return_value=True) as mock_load, \
+             patch('app.main.model_loader.get_quantization', return_value="int8"):
+            response = await async_client.post("/models/test-model/load?quantization=int8")
+        
+        assert response.status_code == 200
+        assert response.json()["quantization"] == "int8"
+        mock_load.assert_awaited_once_with("test-model", quantization="int8", load_format="auto", memory_budget_mb=None)
+    
+    @pytest.mark.asyncio
+    async def test_load_rejects_unknown_quantization(self, mock_listing, async_client):
+        """Test that unsupported quantization modes fail validation."""
+        response = await async_client.post("/models/test-model/load?quantization=int3")
+        
+        assert response.status_code == 422
+
+
+class TestStreamingEndpoint:
+    """Test Server-Sent Events streaming of generated responses."""
+    
+    @pytest.mark.asyncio
+    async def test_stream_emits_tokens_then_done(self, async_client):
+        """Test that each chunk is sent as an SSE message followed by a done event."""
+        async def fake_stream(**kwargs):
+            for chunk in ["Hello", " there"]:
+                yield chunk
+        
+        request_data = {"model": "test-model", "messages": [{"role": "user", "content": "Hi"}]}
+        with patch('app.main.generation_service.stream_response', side_effect=fake_stream):
+            response = await async_client.post("/generate/stream", json=request_data)
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        assert response.text == (
+            'data: {"token":"Hello"}\n\n'
+            'data: {"token":" there"}\n\n'
+            'event: done\ndata: {"model":"test-model"}\n\n'
+        )
+    
+    @pytest.mark.asyncio
+    async def test_stream_reports_errors_as_events(self, async_client):
+        """Test that failures mid-stream are sent as an error event."""
+        async def failing_stream(**kwargs):
+            yield "Partial"
+            raise RuntimeError("boom")
+        
+        request_data = {"model": "test-model", "messages": [{"role": "user", "content": "Hi"}]}
+        with patch('app.main.generation_service.stream_response', side_effect=failing_stream):
+            response = await async_client.post("/generate/stream", json=request_data)
+        
+        assert response.status_code == 200
+        assert 'data: {"token":"Partial"}' in response.text
+        assert "event: error" in response.text
+        assert "boom" in response.text
+
+
+class TestStartupBootstrap:
+    """Test default model selection at startup."""
+    
+    @pytest.mark.asyncio
+    async def test_lifespan_sets_first_available_model(self):
+        """Test that startup selects the first configured model as current."""
+        from app.main import lifespan, model_loader
+        
+        with patch.object(model_loader, 'current_model', None), \
+             patch.object(model_loader, 'available_models', ["first-model", "second-model"]):
+            async with lifespan(app):
+                assert model_loader.current_model == "first-model"
+    
+    @pytest.mark.asyncio
+    async def test_generate_selects_model_lazily(self, async_client):
+        """Test that a request picks the first available model when none is current."""
+        from app.main import model_loader
+        
+        request_data = {"messages": [{"role": "user", "content": "Hi"}]}
+        with patch.object(model_loader, 'current_model', None), \
+             patch.object(model_loader, 'available_models', ["first-model"]), \
+             patch('app.main.generation_service.generate', AsyncMock(return_value=GenerationResult("Hello"))):
+            response = await async_client.post("/generate", json=request_data)
+            assert model_loader.current_model == "first-model"
+        
+        assert response.status_code == 200
+        assert response.json()["model"] == "first-model"
+    
+    @pytest.mark.asyncio
+    async def test_generate_without_any_model(self, async_client):
+        """Test that requests fail cleanly when no model is available."""
+        request_data = {"messages": [{"role": "user", "content": "Hi"}]}
+        with patch('app.main.model_loader.current_model', None), \
+             patch('app.main.model_loader.available_models', []):
+            response = await async_client.post("/generate", json=request_data)
+        
+        assert response.status_code == 503
+
+
+class TestServeIngress:
+    """Test routing on a Ray Serve ingress, where generation runs on the replicas."""
+    
+    @pytest.fixture
+    def generation_handle(self):
+        """Install a mock deployment handle as the Serve ingress does."""
+        handle = MagicMock()
+        handle.remote = AsyncMock(return_value=GenerationResult("From replica"))
+        app.state.generation_handle = handle
+        yield handle
+        app.state.generation_handle = None
+    
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("path", ["/generate", "/chat"])
+    async def test_generation_delegated(self, generation_handle, async_client, path):
+        """Test that generation runs on a replica rather than the ingress's own service."""
+        request_data = {"model": "test-model", "messages": [{"role": "user", "content": "Hi"}]}
+        with patch('app.main.generation_service.generate', new_callable=AsyncMock) as mock_generate:
+            response = await async_client.post(path, json=request_data)
+        
+        assert response.status_code == 200
+        assert response.json()["response"] == "From replica"
+        assert generation_handle.remote.await_args.args[0] == "test-model"
+        mock_generate.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_stream_delegated(self, generation_handle, async_client):
+        """Test that streamed chunks come from the replica's stream method."""
+        async def replica_stream(*args):
+            for chunk in ["From", " replica"]:
+                yield chunk
+        
+        generation_handle.options.return_value.remote.side_effect = replica_stream
+        request_data = {"model": "test-model", "messages": [{"role": "user", "content": "Hi"}]}
+        with patch('app.main.generation_service.stream_response') as mock_stream:
+            response = await async_client.post("/generate/stream", json=request_data)
+        
+        assert 'data: {"token":"From"}' in response.text
+        assert 'data: {"token":" replica"}' in response.text
+        generation_handle.options.assert_called_with(stream=True, method_name="stream")
+        mock_stream.assert_not_called()
+    
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("method,path", [
+        ("POST", "/models/test-model/load"),
+        ("DELETE", "/models/test-model/unload"),
+        ("POST", "/models/test-model/switch"),
+        ("GET", "/cache/stats"),
+        ("POST", "/cache/clear"),
+    ])
+    async def test_local_management_disabled(self, generation_handle, async_client, method, path):
+        """Test that model and cache management is rejected instead of acting on the ingress only."""
+        with patch('app.main.model_loader.load_model', new_callable=AsyncMock) as mock_load:
+            response = await async_client.request(method, path)
+        
+        assert response.status_code == 501
+        mock_load.assert_not_called()
@@ -0,0 +1,130 @@
+"""
+Unit tests for the micro-batcher.
+
+This module tests that concurrent generation requests are grouped into
+batched model calls and that results and errors reach the right caller.
+"""
+
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from app.services.micro_batcher import MicroBatcher
+
+
+@pytest.fixture
+def model_loader():
+    """Create a mock model loader that echoes the last message of each conversation."""
+    loader = MagicMock()
+    loader.get_generation_settings.side_effect = lambda params: (150, (params or {}).get("temperature", 0.8), True)
+    loader.generate_response = AsyncMock(return_value="direct")
+    
+    async def generate_batch(model_name, conversations, parameters=None):
+        return [f"{model_name}:{messages[-1]['content']}" for messages in conversations]
+    
+    loader.generate_response_batch = AsyncMock(side_effect=generate_batch)
+    return loader
+
+
+class TestMicroBatcher:
+    """Test MicroBatcher request grouping."""
+    
+    @pytest.mark.asyncio
+    async def test_submit_without_start_generates_directly(self, model_loader):
+        """Test that an idle batcher falls back to direct generation."""
+        batcher = MicroBatcher(model_loader)
+        
+        response = await batcher.submit("model", [{"role": "user", "content": "Hi"}])
+        
+        assert response == "direct"
+        model_loader.generate_response_batch.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_are_batched(self, model_loader):
+        """Test that requests arriving together share one model call."""
+        batcher = MicroBatcher(model_loader, max_batch_size=8, max_wait_ms=20)
+        await batcher.start()
+        try:
+            responses = await asyncio.gather(*[
+                batcher.submit("model", [{"role": "user", "content": str(i)}])
+                for i in range(3)
+            ])
+        finally:
+            await batcher.stop()
+        
+        assert responses == ["model:0", "model:1", "model:2"]
+        assert model_loader.generate_response_batch.await_count == 1
+    
+    @pytest.mark.asyncio
+    async def test_different_settings_are_not_mixed(self, model_loader):
+        """Test that requests with different generation settings run separately."""
+        batcher = MicroBatcher(model_loader, max_batch_size=8, max_wait_ms=20)
+        await batcher.start()
+        try:
+            await asyncio.gather(
+                batcher.submit("model", [{"role": "user", "content": "a"}], {"temperature": 0.2}),
+                batcher.submit("model", [{"role": "user", "content": "b"}], {"temperature": 0.9}),
+                batcher.submit("other", [{"role": "user", "content": "c"}], {"temperature": 0.2})
+            )
+        finally:
+            await batcher.stop()
+        
+        assert model_loader.generate_response_batch.await_count == 3
+    
+    @pytest.mark.asyncio
+    async def test_errors_propagate_to_callers(self, model_loader):
+        """Test that a failed batch raises in every waiting request."""
+        model_loader.generate_response_batch.side_effect = RuntimeError("boom")
+        batcher = MicroBatcher(model_loader, max_batch_size=8, max_wait_ms=20)
+        await batcher.start()
+        try:
+            results = await asyncio.gather(
+                batcher.submit("model", [{"role": "user", "content": "a"}]),
+                batcher.submit("model", [{"role": "user", "content": "b"}]),
+                return_exceptions=True
+            )
+        finally:
+            await batcher.stop()
+        
+        assert all(isinstance(result, RuntimeError) for result in results)
+    
+    @pytest.mark.asyncio
+    async def test_batch_size_one_disables_batching(self, model_loader):
+        """Test that a max batch size of one keeps direct generation."""
+        batcher = MicroBatcher(model_loader, max_batch_size=1)
+        await batcher.start()
+        
+        response = await batcher.submit("model", [{"role": "user", "content": "Hi"}])
+        
+        assert response == "direct"
+        await batcher.stop()
+    
+    @pytest.mark.asyncio
+    async def test_arrivals_accumulate_while_slots_are_busy(self, model_loader):
+        """Test that requests queued behind a running batch are merged into the next one."""
+        release = asyncio.Event()
+        batch_sizes = []
+        
+        async def generate_batch(model_name, conversations, parameters=None):
+            batch_sizes.append(len(conversations))
+            await release.wait()
+            return [messages[-1]["content"] for messages in conversations]
+        
+        model_loader.generate_response_batch.side_effect = generate_batch
+        batcher = MicroBatcher(model_loader, max_batch_size=8, max_wait_ms=1, max_inflight=1)
+        await batcher.start()
+        try:
+            first = asyncio.ensure_future(batcher.submit("model", [{"role": "user", "content": "0"}]))
+            await asyncio.sleep(0.01)
+            rest = [
+                asyncio.ensure_future(batcher.submit("model", [{"role": "user", "content": str(i)}]))
+                for i in range(1, 4)
+            ]
+            await asyncio.sleep(0.01)
+            release.set()
+            responses = await asyncio.gather(first, *rest)
+        finally:
+            await batcher.stop()
+        
+        assert responses == ["0", "1", "2", "3"]
+        assert batch_sizes == [1, 3]
@@ -0,0 +1,236 @@
+"""
+Unit tests for ModelLoader helpers.
+
+This module tests tokenizer sharing between models whose tokenizer files
+are identical, attention backend fallback at load time, dtype selection,
+direct weight loading, session continuation, and per-request generation configs.
+"""
+
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.services import model_loader
+from app.services.model_loader import ModelLoader
+
+
+def write_tokenizer_files(directory, vocab: str):
+    """Write a minimal set of tokenizer files into a model directory."""
+    directory.mkdir()
+    (directory / "vocab.json").write_text(vocab)
+    (directory / "merges.txt").write_text("#version: 0.2\n")
+    return str(directory)
+
+
+class TestTokenizerSharing:
+    """Test that identically tokenized models share one tokenizer."""
+
+    @pytest.fixture
+    def loader(self, tmp_path):
+        """Create a ModelLoader caching into a temporary directory."""
+        loader = ModelLoader()
+        loader.cache_dir = str(tmp_path / "cache")
+        return loader
+
+    def test_identical_files_share_tokenizer(self, loader, tmp_path):
+        """Test that the second model reuses the first model's tokenizer."""
+        small = write_tokenizer_files(tmp_path / "small", '{"a": 0}')
+        large = write_tokenizer_files(tmp_path / "large", '{"a": 0}')
+        load = MagicMock(side_effect=lambda name: object(), __name__="load")
+
+        first = loader._get_tokenizer(small, load)
+        second = loader._get_tokenizer(large, load)
+
+        assert first is second
+        assert load.call_count == 1
+
+    def test_different_files_load_separately(self, loader, tmp_path):
+        """Test that models with different vocabularies get their own tokenizer."""
+        first_model = write_tokenizer_files(tmp_path / "first", '{"a": 0}')
+        second_model = write_tokenizer_files(tmp_path / "second", '{"b": 0}')
+        load = MagicMock(side_effect=lambda name: object(), __name__="load")
+
+        assert loader._get_tokenizer(first_model, load) is not loader._get_tokenizer(second_model, load)
+        assert load.call_count == 2
+
+    def test_tokenizer_kind_is_part_of_the_key(self, loader, tmp_path):
+        """Test that different tokenizer loaders never share an object."""
+        model = write_tokenizer_files(tmp_path / "model", '{"a": 0}')
+        fast = MagicMock(side_effect=lambda name: object(), __name__="fast")
+        slow = MagicMock(side_effect=lambda name: object(), __name__="slow")
+
+        assert loader._get_tokenizer(model, fast) is not loader._get_tokenizer(model, slow)
+
+
+class TestAttentionBackend:
+    """Test attention backend selection at load time."""
+
+    def test_falls_back_when_backend_unsupported(self, monkeypatch):
+        """Test that an unsupported backend falls through to the next candidate."""
+        monkeypatch.setattr(
+            model_loader, "attention_candidates",
+            lambda: [{"attn_implementation": "flash_attention_2"}, {"attn_implementation": "sdpa"}]
+        )
+        model_class = MagicMock()
+        model_class.from_pretrained.side_effect = [ValueError("unsupported"), "model"]
+
+        assert model_loader.from_pretrained_with_attention(model_class, "gpt2", cache_dir="c") == "model"
+        model_class.from_pretrained.assert_called_with("gpt2", attn_implementation="sdpa", cache_dir="c")
+
+    def test_default_attention_when_no_backend_loads(self, monkeypatch):
+        """Test that loading retries without attention arguments as a last resort."""
+        monkeypatch.setattr(model_loader, "attention_candidates", lambda: [{"use_flash_attention_2": True}])
+        model_class = MagicMock()
+        model_class.from_pretrained.side_effect = [ImportError("flash_attn"), "model"]
+
+        assert model_loader.from_pretrained_with_attention(model_class, "gpt2") == "model"
+        model_class.from_pretrained.assert_called_with("gpt2")
+
+
+class TestDeviceAndDtype:
+    """Test weight dtype selection for unquantized models."""
+
+    def test_cpu_defaults_to_float32(self, monkeypatch):
+        """Test that auto keeps float32 on CPU."""
+        import torch
+        monkeypatch.setattr(torch.cuda, "is_available", lambda: False)
+
+        assert model_loader.select_device_and_dtype("auto") == (torch.device("cpu"), torch.float32)
+
+    def test_cpu_bfloat16_is_opt_in(self, monkeypatch):
+        """Test that an explicit dtype overrides the CPU default."""
+        import torch
+        monkeypatch.setattr(torch.cuda, "is_available", lambda: False)
+
+        assert model_loader.select_device_and_dtype("bfloat16") == (torch.device("cpu"), torch.bfloat16)
+
+
+class TestDirectLoading:
+    """Test that direct loading uses the weights read with O_DIRECT."""
+
+    @pytest.fixture
+    def model_dir(self, tmp_path):
+        """Save a tiny GPT-2 checkpoint as safetensors."""
+        from transformers import GPT2Config, GPT2LMHeadModel
+
+        config = GPT2Config(vocab_size=32, n_positions=16, n_embd=8, n_layer=1, n_head=2)
+        path = tmp_path / "tiny-gpt2"
+        GPT2LMHeadModel(config).save_pretrained(path, safe_serialization=True)
+        return str(path)
+
+    @pytest.mark.asyncio
+    async def test_weights_come_from_direct_buffer(self, model_dir, monkeypatch):
+        """Test that the loaded weights are the tensors returned by the direct reader."""
+        import torch
+        from safetensors.torch import load_file
+
+        monkeypatch.setattr(
+            model_loader, "load_safetensors_direct",
+            lambda path: {name: torch.zeros_like(tensor) for name, tensor in load_file(path).items()}
+        )
+        loader = ModelLoader()
+        loader._get_tokenizer = MagicMock(return_value=MagicMock(pad_token_id=0, eos_token_id=0))
+
+        assert await loader.load_model(model_dir, load_format="direct")
+        model = loader.loaded_models[model_dir]["model"]
+        assert all(not parameter.any() for parameter in model.parameters())
+        assert model.dtype == loader.dtype
+
+
+class TestSessionContinuation:
+    """Test that sessions only continue within the shared context window."""
+
+    @pytest.fixture
+    def tokenizer(self):
+        """Create a tokenizer stand-in mapping each text to one token of its length."""
+        return MagicMock(side_effect=lambda text: {"input_ids": [len(text)]}, eos_token="|", eos_token_id=0)
+
+    @staticmethod
+    def conversation(count: int):
+        """Build alternating user and assistant messages ending with a user turn."""
+        return [{"role": "user" if i % 2 == 0 else "assistant", "content": f"turn {i}"} for i in range(count)]
+
+    def test_continues_when_window_extends_session(self, tokenizer):
+        """Test that the new user turn is appended to the cached tokens."""
+        loader = ModelLoader()
+        messages = self.conversation(3)
+        session = {"input_ids": [6, 0, 6, 0], "turns": ["turn 0", "turn 1"]}
+
+        input_ids = loader._continue_session(tokenizer, messages, loader._get_dialogpt_turns(messages), session, 512)
+
+        assert input_ids == [6, 0, 6, 0, 7]
+
+    def test_long_conversation_leaves_session_path(self):
+        """Test that sessions stop once the window moves on, and the request is batched instead."""
+        from transformers import GenerationConfig, GPT2Config, GPT2LMHeadModel
+
+        model = GPT2LMHeadModel(GPT2Config(vocab_size=32, n_positions=64, n_embd=8, n_layer=1, n_head=2)).eval()
+        tokenizer = MagicMock(
+            side_effect=lambda text, **kwargs: {"input_ids": [0 if c == "|" else ord(c) % 31 + 1 for c in text]},
+            eos_token="|", eos_token_id=0
+        )
+        tokenizer.decode.return_value = "reply"
+        config = GenerationConfig(max_new_tokens=2, min_new_tokens=2, do_sample=False, pad_token_id=0, eos_token_id=0)
+        loader = ModelLoader()
+        loader.loaded_models["dialogpt"] = {"type": "dialog"}
+
+        messages = []
+        for turn in range(4):
+            messages.append({"role": "user", "content": f"turn {turn}"})
+            if turn == 3:
+                break
+            assert loader.use_session("dialogpt", "chat-1", messages)
+            response = loader._generate_session_response("dialogpt", model, tokenizer, messages, "chat-1", config)
+            # Kept only while the reply and the next user message still fit in the window
+            assert (len(loader.sessions) == 1) is (len(messages) + 2 <= model_loader.CONTEXT_MESSAGES)
+            messages.append({"role": "assistant", "content": response})
+
+        assert len(messages) > model_loader.CONTEXT_MESSAGES
+        assert not loader.use_session("dialogpt", "chat-1", messages)
+        assert loader.sessions.stats()["hits"] == 2
+        assert loader.sessions.stats()["bytes"] == 0
+
+
+class TestGenerationConfig:
+    """Test per-request copies of a model's precomputed GenerationConfig."""
+
+    @pytest.fixture
+    def loader(self):
+        """Create a ModelLoader with one causal and one seq2seq model entry."""
+        from transformers import GenerationConfig
+
+        loader = ModelLoader()
+        for name, model_type in [("causal", "causal"), ("seq2seq", "conversational")]:
+            loader.loaded_models[name] = {
+                "type": model_type,
+                "generation_config": GenerationConfig(pad_token_id=0, eos_token_id=1, num_return_sequences=1)
+            }
+        return loader
+
+    def test_request_settings_applied_to_copy(self, loader):
+        """Test that request settings never leak into the stored config."""
+        config = loader.get_generation_config("causal", {"max_tokens": 40, "temperature": 0.5})
+
+        assert config.max_new_tokens == 40
+        assert config.temperature == 0.5
+        assert config.do_sample is True
+        assert config.pad_token_id == 0
+        assert loader.loaded_models["causal"]["generation_config"].max_new_tokens is None
+
+    def test_seq2seq_limits_decoder_length(self, loader):
+        """Test that seq2seq models bound max_length rather than new tokens."""
+        config = loader.get_generation_config("seq2seq", {"max_tokens": 40, "temperature": 0})
+
+        assert config.max_length == 40
+        assert config.max_new_tokens is None
+        assert config.do_sample is False
+
+    def test_prompt_budget_leaves_room_for_response(self, loader):
+        """Test that long responses shrink the prompt to fit the model's context."""
+        model = MagicMock()
+        model.config.n_positions = 256
+        config = loader.get_generation_config("causal", {"max_tokens": 200})
+
+        assert loader._prompt_token_budget(model, config) == 56
+        model.config.n_positions = 1024
+        assert loader._prompt_token_budget(model, config) == 512
@@ -0,0 +1,123 @@
+"""
+Unit tests for the prefix key/value cache.
+
+This module tests prefix hashing, longest-prefix lookup and byte-bounded
+eviction of cached past_key_values, for prefixes and for sessions.
+"""
+
+import torch
+
+from app.services.prefix_cache import PrefixKVCache, SessionKVCache, block_keys
+
+
+def make_past(tokens: int, layers: int = 2):
+    """Build a legacy tuple-of-tuples KV cache covering the given number of tokens."""
+    return tuple(
+        (torch.zeros(1, 2, tokens, 4), torch.zeros(1, 2, tokens, 4))
+        for _ in range(layers)
+    )
+
+
+class TestBlockKeys:
+    """Test chained prefix hashing."""
+
+    def test_keys_identify_whole_prefix(self):
+        """Test that a key depends on every block before it."""
+        keys = block_keys([[1, 2], [3], [4, 5]])
+        other = block_keys([[9], [3], [4, 5]])
+
+        assert len(keys) == 3
+        assert keys[:2] == block_keys([[1, 2], [3]])
+        assert keys[1] != other[1]
+        assert keys[2] != other[2]
+
+    def test_block_boundaries_matter(self):
+        """Test that the same tokens split differently hash differently."""
+        assert block_keys([[1, 2], [3]])[-1] != block_keys([[1], [2, 3]])[-1]
+
+
+class TestPrefixKVCache:
+    """Test PrefixKVCache lookups and eviction."""
+
+    def test_longest_prefix(self):
+        """Test that the longest cached prefix is returned with its block count."""
+        cache = PrefixKVCache()
+        keys = block_keys([[1], [2], [3]])
+        short, longer = make_past(1), make_past(2)
+        cache.put(keys[0], short)
+        cache.put(keys[1], longer)
+
+        past, count = cache.longest_prefix(keys)
+
+        assert past is longer
+        assert count == 2
+        assert cache.stats()["hits"] == 1
+
+    def test_miss(self):
+        """Test lookups with no cached prefix."""
+        cache = PrefixKVCache()
+
+        assert cache.longest_prefix(block_keys([[1]])) == (None, 0)
+        assert cache.stats()["misses"] == 1
+
+    def test_evicts_least_recently_used_over_budget(self):
+        """Test that entries are evicted once the byte budget is exceeded."""
+        entry_bytes = 2 * 2 * (1 * 2 * 1 * 4) * 4
+        cache = PrefixKVCache(max_bytes=2 * entry_bytes)
+        keys = block_keys([[1], [2], [3]])
+        cache.put(keys[0], make_past(1))
+        cache.put(keys[1], make_past(1))
+        cache.longest_prefix(keys[:1])
+        cache.put(keys[2], make_past(1))
+
+        assert len(cache) == 2
+        assert cache.longest_prefix(keys[1:2]) == (None, 0)
+        assert cache.stats()["bytes"] == 2 * entry_bytes
+
+    def test_oversized_entries_are_skipped(self):
+        """Test that a single entry larger than the budget is not stored."""
+        cache = PrefixKVCache(max_bytes=16)
+        cache.put(block_keys([[1]])[0], make_past(8))
+
+        assert len(cache) == 0
+
+
+class TestSessionKVCache:
+    """Test the byte-bounded session store."""
+
+    @staticmethod
+    def session(model: str, tokens: int = 1):
+        """Build session state holding key/values for the given number of tokens."""
+        return {"model": model, "past_key_values": make_past(tokens)}
+
+    def test_take_removes_session(self):
+        """Test that a taken session is handed out once and its bytes are released."""
+        cache = SessionKVCache()
+        session = self.session("model")
+        cache.put("chat-1", session)
+
+        assert cache.take("chat-1") is session
+        assert cache.take("chat-1") is None
+        assert cache.stats()["bytes"] == 0
+
+    def test_bounded_in_bytes(self):
+        """Test that sessions are evicted by size rather than count."""
+        entry_bytes = 2 * 2 * (1 * 2 * 1 * 4) * 4
+        cache = SessionKVCache(max_bytes=3 * entry_bytes)
+        cache.put("short", self.session("model"))
+        cache.put("long", self.session("model", tokens=2))
+        cache.put("newest", self.session("model"))
+
+        assert cache.take("short") is None
+        assert cache.stats()["bytes"] == 3 * entry_bytes
+
+    def test_drop_model(self):
+        """Test that unloading a model drops only its sessions."""
+        cache = SessionKVCache()
+        cache.put("chat-1", self.session("first"))
+        cache.put("chat-2", self.session("second"))
+
+        cache.drop_model("first")
+
+        assert len(cache) == 1
+        assert cache.take("chat-2") is not None
@@ -0,0 +1,167 @@
+"""
+Unit tests for the response cache.
+
+This module tests cache key generation, cacheability rules and LRU
+eviction behaviour of the in-process response cache.
+"""
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from app.services.generation_service import GenerationService
+from app.services.response_cache import (
+    ResponseCache, PersistentResponseCache, make_cache_key, is_cacheable
+)
+from app.schemas.ai_schemas import Message
+
+
+class TestCacheKey:
+    """Test cache key generation."""
+
+    def test_same_inputs_produce_same_key(self):
+        """Test that identical requests hash to the same key."""
+        messages = [Message(role="user", content="Hello")]
+        key_a = make_cache_key("model", messages, {"temperature": 0, "max_tokens": 10})
+        key_b = make_cache_key("model", messages, {"max_tokens": 10, "temperature": 0})
+
+        assert key_a == key_b
+
+    def test_different_inputs_produce_different_keys(self):
+        """Test that model, content and parameters all affect the key."""
+        messages = [Message(role="user", content="Hello")]
+        base = make_cache_key("model", messages, {"temperature": 0})
+
+        assert base != make_cache_key("other-model", messages, {"temperature": 0})
+        assert base != make_cache_key("model", [Message(role="user", content="Hi")], {"temperature": 0})
+        assert base != make_cache_key("model", messages, {"temperature": 0.1})
+
+    @pytest.mark.parametrize("parameters,expected", [
+        (None, False),
+        ({}, False),
+        ({"temperature": 0.8}, False),
+        ({"temperature": 0}, True),
+        ({"temperature": 0.1}, True),
+        ({"temperature": "invalid"}, False),
+    ])
+    def test_is_cacheable(self, parameters, expected):
+        """Test that only greedy generations are cacheable."""
+        assert is_cacheable(parameters) is expected
+
+
+class TestResponseCache:
+    """Test ResponseCache LRU behaviour."""
+
+    def test_get_and_set(self):
+        """Test storing and retrieving responses."""
+        cache = ResponseCache(max_size=2)
+        assert cache.get("a") is None
+
+        cache.set("a", "response")
+        assert cache.get("a") == "response"
+        assert cache.stats() == {"size": 1, "max_size": 2, "hits": 1, "misses": 1}
+
+    def test_evicts_least_recently_used(self):
+        """Test that the oldest entry is evicted when full."""
+        cache = ResponseCache(max_size=2)
+        cache.set("a", "1")
+        cache.set("b", "2")
+        cache.get("a")
+        cache.set("c", "3")
+
+        assert cache.get("b") is None
+        assert cache.get("a") == "1"
+        assert cache.get("c") == "3"
+
+    def test_clear(self):
+        """Test clearing the cache."""
+        cache = ResponseCache()
+        cache.set("a", "1")
+        cache.clear()
+
+        assert len(cache) == 0
+        assert cache.stats()["hits"] == 0
+
+
+class TestPersistentResponseCache:
+    """Test the joblib-backed on-disk response cache."""
+
+    def test_survives_new_instance(self, tmp_path):
+        """Test that responses persist across cache instances."""
+        PersistentResponseCache(str(tmp_path)).set("a", "response")
+
+        assert PersistentResponseCache(str(tmp_path)).get("a") == "response"
+
+    def test_missing_key_and_clear(self, tmp_path):
+        """Test lookups of unknown keys and clearing the cache."""
+        cache = PersistentResponseCache(str(tmp_path))
+        assert cache.get("a") is None
+
+        cache.set("a", "response")
+        cache.clear()
+
+        assert cache.get("a") is None
+
+
+class TestGenerationServiceCaching:
+    """Test response caching in GenerationService."""
+
+    @pytest.fixture
+    def model_loader(self):
+        """Create a mock model loader with a loaded model."""
+        loader = MagicMock()
+        loader.is_model_loaded.return_value = True
+        loader.generate_response = AsyncMock(return_value="Generated")
+        return loader
+
+    @pytest.mark.asyncio
+    async def test_deterministic_requests_are_cached(self, model_loader):
+        """Test that repeated greedy requests skip generation."""
+        service = GenerationService(model_loader)
+        messages = [Message(role="user", content="Hello")]
+
+        first = await service.generate_response("model", messages, {"temperature": 0})
+        second = await service.generate_response("model", messages, {"temperature": 0})
+
+        assert first == second == "Generated"
+        assert model_loader.generate_response.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_sampled_requests_are_not_cached(self, model_loader):
+        """Test that sampled requests always run generation."""
+        service = GenerationService(model_loader)
+        messages = [Message(role="user", content="Hello")]
+
+        await service.generate_response("model", messages, {"temperature": 0.8})
+        await service.generate_response("model", messages, {"temperature": 0.8})
+
+        assert model_loader.generate_response.await_count == 2
+        assert len(service.response_cache) == 0
+
+    @pytest.mark.asyncio
+    async def test_fallback_responses_are_not_cached(self, model_loader):
+        """Test that a failed generation is flagged and kept out of the cache."""
+        model_loader.generate_response.side_effect = RuntimeError("CUDA out of memory")
+        service = GenerationService(model_loader)
+        messages = [Message(role="user", content="Hello")]
+
+        result = await service.generate("model", messages, {"temperature": 0})
+
+        assert result.fallback is True
+        assert "limited mode" in result.text
+        assert len(service.response_cache) == 0
+
+    @pytest.mark.asyncio
+    async def test_persistent_cache_warms_memory_cache(self, model_loader, tmp_path):
+        """Test that a restart serves persisted responses without generating."""
+        messages = [Message(role="user", content="Hello")]
+        persistent = PersistentResponseCache(str(tmp_path))
+        await GenerationService(model_loader, persistent_cache=persistent).generate_response(
+            "model", messages, {"temperature": 0}
+        )
+
+        restarted = GenerationService(model_loader, persistent_cache=PersistentResponseCache(str(tmp_path)))
+        response = await restarted.generate_response("model", messages, {"temperature": 0})
+
+        assert response == "Generated"
+        assert model_loader.generate_response.await_count == 1
+        assert len(restarted.response_cache) == 1
@@ -14,25 +14,37 @@ from app.schemas.ai_schemas import (
 )
 
 
+# Messages are frozen, so one validated set can be shared by every test in the module
+@pytest.fixture(scope="module")
+def hello_messages() -> List[Message]:
+    """Single user greeting."""
+    return [Message(role="user", content="Hello")]
+
+
+@pytest.fixture(scope="module")
+def conversation_messages() -> List[Message]:
+    """Three user/assistant turns followed by a final user question."""
+    messages = []
+    for i in range(3):
+        messages.append(Message(role="user", content=f"User message {i}"))
+        messages.append(Message(role="assistant", content=f"Assistant response {i}"))
+    messages.append(Message(role="user", content="Final question"))
+    return messages
+
+
 class TestMessage:
     """Test Message schema validation."""
     
-    def test_valid_message_creation(self):
+    @pytest.mark.parametrize("role,content", [
+        ("user", "Hello, how are you?"),
+        ("assistant", "I'm doing well!"),
+        ("system", "You are a helpful assistant."),
+    ], ids=["user", "assistant", "system"])
+    def test_valid_message_creation(self, role, content):
         """Test creating valid messages with all roles."""
-        # Test user message
-        user_msg = Message(role="user", content="Hello, how are you?")
-        assert user_msg.role == "user"
-        assert user_msg.content == "Hello, how are you?"
-        
-        # Test assistant message
-        assistant_msg = Message(role="assistant", content="I'm doing well!")
-        assert assistant_msg.role == "assistant"
-        assert assistant_msg.content == "I'm doing well!"
-        
-        # Test system message
-        system_msg = Message(role="system", content="You are a helpful assistant.")
-        assert system_msg.role == "system"
-        assert system_msg.content == "You are a helpful assistant."
+        msg = Message(role=role, content=content)
+        assert msg.role == role
+        assert msg.content == content
     
     def test_message_with_empty_content(self):
         """Test message with empty content."""
@@ -73,6 +85,24 @@ class TestMessage:
         assert msg.role == "assistant"
         assert msg.content == "Response"
 
+    
+    def test_message_invalid_role(self):
+        """Test that unknown roles are rejected."""
+        with pytest.raises(ValidationError) as exc_info:
+            Message(role="moderator", content="Hello")
+        assert "role" in str(exc_info.value)
+    
+    def test_message_is_immutable(self):
+        """Test that messages cannot be modified after validation."""
+        msg = Message(role="user", content="Hello")
+        with pytest.raises(ValidationError):
+            msg.content = "Changed"
+    
+    def test_message_rejects_unknown_fields(self):
+        """Test that fields outside the schema are rejected."""
+        with pytest.raises(ValidationError) as exc_info:
+            Message(role="user", content="Hello", name="alice")
+        assert "name" in str(exc_info.value)
 
 class TestGenerateRequest:
     """Test GenerateRequest schema validation."""
@@ -95,27 +125,29 @@ class TestGenerateRequest:
         assert request.parameters["temperature"] == 0.7
         assert request.parameters["max_tokens"] == 100
     
-    def test_generate_request_without_model(self):
+    def test_generate_request_without_model(self, hello_messages):
         """Test generate request without model (should be None)."""
-        messages = [Message(role="user", content="Hello")]
-        request = GenerateRequest(messages=messages)
+        request = GenerateRequest(messages=hello_messages)
         
         assert request.model is None
         assert request.parameters is None
     
-    def test_generate_request_without_parameters(self):
+    def test_generate_request_without_parameters(self, hello_messages):
         """Test generate request without parameters (should be None)."""
-        messages = [Message(role="user", content="Hello")]
-        request = GenerateRequest(model="test-model", messages=messages)
+        request = GenerateRequest(model="test-model", messages=hello_messages)
         
         assert request.parameters is None
     
-    def test_generate_request_empty_parameters(self):
+    def test_generate_request_session_id(self, hello_messages):
+        """Test generate request with and without a session ID."""
+        assert GenerateRequest(messages=hello_messages).session_id is None
+        assert GenerateRequest(messages=hello_messages, session_id="chat-1").session_id == "chat-1"
+    
+    def test_generate_request_empty_parameters(self, hello_messages):
         """Test generate request with empty parameters dict."""
-        messages = [Message(role="user", content="Hello")]
         request = GenerateRequest(
             model="test-model", 
-            messages=messages,
+            messages=hello_messages,
             parameters={}
         )
         
@@ -132,6 +164,12 @@ class TestGenerateRequest:
         request = GenerateRequest(model="test-model", messages=[])
         assert request.messages == []
     
+    def test_generate_request_rejects_unknown_fields(self, hello_messages):
+        """Test that top-level fields outside the schema are rejected."""
+        with pytest.raises(ValidationError) as exc_info:
+            GenerateRequest(messages=hello_messages, stream=True)
+        assert "stream" in str(exc_info.value)
+    
     def test_generate_request_various_parameters(self):
         """Test generate request with various parameter types."""
         messages = [Message(role="user", content="Test")]
@@ -225,21 +263,11 @@ class TestSchemaInteraction:
         assert request.messages[2].role == "assistant"
         assert request.messages[3].role == "user"
     
-    def test_generate_request_with_conversation_history(self):
+    def test_generate_request_with_conversation_history(self, conversation_messages):
         """Test generate request with complete conversation history."""
-        messages = []
-        
-        # Add multiple conversation turns
-        for i in range(3):
-            messages.append(Message(role="user", content=f"User message {i}"))
-            messages.append(Message(role="assistant", content=f"Assistant response {i}"))
-        
-        # Add final user message
-        messages.append(Message(role="user", content="Final question"))
-        
         request = GenerateRequest(
             model="test-model",
-            messages=messages,
+            messages=conversation_messages,
             parameters={"temperature": 0.7, "max_tokens": 200}
         )
         
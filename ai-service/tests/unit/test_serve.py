@@ -0,0 +1,60 @@
+"""
+Unit tests for the Ray Serve entrypoint.
+
+This module tests that generation replicas start their own micro-batcher
+and default model and serve generation and streaming from their own
+service. Skipped when ray[serve] is not installed.
+"""
+
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+pytest.importorskip("ray.serve")
+
+from app import main, serve
+from app.services.generation_service import GenerationResult
+
+
+async def start_replica():
+    """Construct a GenerationDeployment replica the way Serve does, awaiting its async __init__."""
+    replica_class = serve.GenerationDeployment.func_or_class
+    replica = object.__new__(replica_class)
+    await replica_class.__init__(replica)
+    return replica
+
+
+class TestGenerationDeployment:
+    """Test GenerationDeployment replicas."""
+
+    @pytest.mark.asyncio
+    async def test_replica_starts_generation(self):
+        """Test that replicas, which never run the app lifespan, start generation themselves."""
+        with patch.object(main, "start_generation", new_callable=AsyncMock) as mock_start:
+            replica = await start_replica()
+
+        mock_start.assert_awaited_once()
+        assert replica.inference_pool is mock_start.return_value
+
+    @pytest.mark.asyncio
+    async def test_call_generates_on_replica(self):
+        """Test that a handle call runs generation with the replica's service."""
+        result = GenerationResult("Hello")
+        with patch.object(main, "start_generation", new_callable=AsyncMock), \
+             patch.object(main.generation_service, "generate", AsyncMock(return_value=result)):
+            replica = await start_replica()
+            assert await replica("test-model", [], {}) is result
+
+    @pytest.mark.asyncio
+    async def test_stream_yields_replica_chunks(self):
+        """Test that the stream method yields the replica's streamed chunks."""
+        async def fake_stream(*args):
+            for chunk in ["Hello", " there"]:
+                yield chunk
+
+        with patch.object(main, "start_generation", new_callable=AsyncMock), \
+             patch.object(main.generation_service, "stream_response", side_effect=fake_stream):
+            replica = await start_replica()
+            chunks = [chunk async for chunk in replica.stream("test-model", [], {})]
+
+        assert chunks == ["Hello", " there"]
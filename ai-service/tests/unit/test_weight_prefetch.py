@@ -0,0 +1,106 @@
+"""
+Unit tests for weight prefetching.
+
+This module tests locating cached weight shards, reading them into
+the page cache ahead of model loading, O_DIRECT weight loading and
+page-cache backed weight mappings.
+"""
+
+import pytest
+import torch
+
+from app.services.weight_prefetch import (
+    find_weight_files, prefetch_safetensors, read_direct, load_safetensors_direct,
+    map_safetensors, resident_bytes
+)
+
+
+class TestPrefetchSafetensors:
+    """Test parallel page cache prefetch."""
+
+    def test_prefetch_returns_total_bytes(self, tmp_path):
+        """Test that every shard is read and counted."""
+        paths = []
+        for index, size in enumerate([1024, 4096, 0]):
+            path = tmp_path / f"model-{index}.safetensors"
+            path.write_bytes(b"\0" * size)
+            paths.append(path)
+
+        assert prefetch_safetensors(paths) == 5120
+
+    def test_prefetch_without_paths(self):
+        """Test that an empty shard list is a no-op."""
+        assert prefetch_safetensors([]) == 0
+
+    def test_prefetch_missing_file_raises(self, tmp_path):
+        """Test that missing shards surface an error."""
+        with pytest.raises(FileNotFoundError):
+            prefetch_safetensors([tmp_path / "missing.safetensors"])
+
+
+class TestFindWeightFiles:
+    """Test locating cached weight shards."""
+
+    def test_uncached_model_has_no_files(self, tmp_path):
+        """Test that models missing from the cache return no paths."""
+        assert find_weight_files("org/not-a-cached-model", cache_dir=str(tmp_path)) == []
+
+
+class TestDirectLoading:
+    """Test O_DIRECT safetensors loading."""
+
+    def test_read_direct_matches_file(self, tmp_path):
+        """Test that the aligned buffer holds the file contents."""
+        data = bytes(range(256)) * 41
+        path = tmp_path / "weights.bin"
+        path.write_bytes(data)
+
+        buffer = read_direct(path)
+
+        assert buffer[:len(data)] == data
+
+    def test_load_safetensors_direct_matches_safetensors(self, tmp_path):
+        """Test that tensors built from the buffer match the reference loader."""
+        from safetensors.torch import load_file, save_file
+
+        path = tmp_path / "model.safetensors"
+        save_file({
+            "weight": torch.randn(3, 5),
+            "bias": torch.arange(7, dtype=torch.int64),
+            "half": torch.ones(2, 2, dtype=torch.float16),
+        }, str(path))
+
+        expected = load_file(str(path))
+        loaded = load_safetensors_direct(path)
+
+        assert loaded.keys() == expected.keys()
+        for name, tensor in expected.items():
+            assert torch.equal(loaded[name], tensor)
+
+
+class TestMappedWeights:
+    """Test copy-on-write mapped safetensors weights."""
+
+    def test_map_safetensors_matches_safetensors(self, tmp_path):
+        """Test that mapped tensors hold the stored values."""
+        from safetensors.torch import load_file, save_file
+
+        path = tmp_path / "model.safetensors"
+        save_file({"weight": torch.randn(64, 64)}, str(path))
+
+        mapped = map_safetensors(path)
+
+        assert torch.equal(mapped["weight"], load_file(str(path))["weight"])
+
+    def test_resident_bytes_counts_touched_pages(self, tmp_path):
+        """Test that resident size reflects the mapped weights that were read."""
+        from safetensors.torch import save_file
+
+        path = tmp_path / "model.safetensors"
+        save_file({"weight": torch.ones(256, 256)}, str(path))
+
+        mapped = map_safetensors(path)
+        assert mapped["weight"].sum().item() == 256 * 256
+
+        assert resident_bytes([path]) >= 256 * 256 * 4
+        assert resident_bytes([tmp_path / "other.safetensors"]) == 0
@@ -1,9 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, Header
-from sqlalchemy.orm import Session
-from typing import List, Optional
+import secrets
+
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Query, Header, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import AsyncIterator, List, Optional
 from uuid import UUID
 
 from ...core.database import get_db
+from ...repositories.message_repository import message_repo
 from ...services.chat_service import ChatService
 from ...schemas.chat_schemas import (
     ChatSession, ChatSessionWithMessages, ChatListResponse,
@@ -18,11 +23,8 @@ chat_service = ChatService()
 
 async def get_session_id(x_session_id: Optional[str] = Header(None)) -> str:
     """Get session ID from header or generate a default one"""
-    import uuid
-    if x_session_id:
-        return x_session_id
-    # Generate a default session ID if none provided
-    return f"session_{uuid.uuid4().hex[:16]}"
+    # Kept async: a sync dependency would be dispatched to the threadpool
+    return x_session_id or f"session_{secrets.token_hex(8)}"
 
 
 @router.get("/", response_model=ChatListResponse)
@@ -32,181 +34,136 @@ async def list_chats(
     include_archived: bool = Query(False, description="Include archived chats"),
     filter: Optional[str] = Query(None, description="Filter chats by status: 'active', 'pinned', 'archived'"),
     search: Optional[str] = Query(None, description="Search query"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     session_id: str = Depends(get_session_id)
 ):
     """List session's chat conversations"""
-    try:
-        if search:
-            chats = chat_service.search_chats(db, session_id, search, page, per_page)
-            total = len(chats)  # Simplified count for search
+    if search:
+        chats, has_more = await chat_service.search_chats(db, session_id, search, page, per_page)
+        total = len(chats)  # Simplified count for search
+    else:
+        # Handle filter parameter
+        if filter == 'archived':
+            filters = {"include_archived": True, "filter_archived_only": True}
+        elif filter == 'pinned':
+            filters = {"include_archived": False, "filter_pinned_only": True}
+        elif filter == 'active':
+            filters = {"include_archived": False}
         else:
-            # Handle filter parameter
-            if filter == 'archived':
-                chats = chat_service.get_session_chats(db, session_id, page, per_page, include_archived=True, filter_archived_only=True)
-            elif filter == 'pinned':
-                chats = chat_service.get_session_chats(db, session_id, page, per_page, include_archived=False, filter_pinned_only=True)
-            elif filter == 'active':
-                chats = chat_service.get_session_chats(db, session_id, page, per_page, include_archived=False)
-            else:
-                # Default to active chats (backward compatibility)
-                chats = chat_service.get_session_chats(db, session_id, page, per_page, include_archived or False)
-            total = len(chats)  # This should be from a count query in production
-        
-        # Enhanced chats already include message_count from the model
-        enhanced_chats = []
-        for chat in chats:
-            chat_dict = {
-                **chat.__dict__,
-                "message_count": chat.message_count,
-            }
-            enhanced_chats.append(chat_dict)
-        
-        return ChatListResponse(
-            chats=enhanced_chats,
-            total=total,
-            page=page,
-            per_page=per_page,
-            has_more=len(chats) == per_page
-        )
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to list chats: {str(e)}")
+            # Default to active chats (backward compatibility)
+            filters = {"include_archived": include_archived or False}
+        chats, has_more = await chat_service.get_session_chats(db, session_id, page, per_page, **filters)
+        total = await chat_service.count_session_chats(db, session_id, **filters)
+    
+    # Enhanced chats already include message_count from the model.
+    # pydantic-core reads the ORM rows' attributes directly (from_attributes), so the
+    # whole page is validated and then encoded without intermediate dicts, skipping
+    # FastAPI's response_model round trip and re-validation
+    response = ChatListResponse.model_validate({
+        "chats": chats,
+        "total": total,
+        "page": page,
+        "per_page": per_page,
+        "has_more": has_more
+    })
+    return Response(content=response.model_dump_json(), media_type="application/json")
 
 
 @router.post("/", response_model=CreateChatResponse)
 async def create_chat(
     request: CreateChatRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     session_id: str = Depends(get_session_id)
 ):
     """Create a new chat session"""
-    try:
-        chat = await chat_service.create_chat(db, session_id, request)
-        
-        # If initial message was sent, get the response
-        message = None
-        if request.initial_message:
-            from ...repositories.message_repository import MessageRepository
-            message_repo = MessageRepository()
-            message = message_repo.get_last_message(db, chat.id)
-        
-        return CreateChatResponse(chat=chat, message=message)
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to create chat: {str(e)}")
+    chat = await chat_service.create_chat(db, session_id, request)
+    
+    # If initial message was sent, get the response
+    message = None
+    if request.initial_message:
+        message = await message_repo.get_last_message(db, chat.id)
+    
+    return CreateChatResponse(chat=chat, message=message)
 
 
 @router.get("/{chat_id}", response_model=ChatSessionWithMessages)
 async def get_chat(
     chat_id: UUID,
     message_limit: int = Query(50, ge=1, le=200, description="Number of recent messages to include"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     session_id: str = Depends(get_session_id)
 ):
     """Get chat session with messages"""
-    try:
-        chat = chat_service.get_chat_with_messages(db, chat_id, session_id, message_limit)
-        if not chat:
-            raise HTTPException(status_code=404, detail="Chat not found")
-        
-        return chat
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to get chat: {str(e)}")
+    chat = await chat_service.get_chat_with_messages(db, chat_id, session_id, message_limit)
+    if not chat:
+        raise HTTPException(status_code=404, detail="Chat not found")
+    
+    return chat
 
 
 @router.put("/{chat_id}", response_model=ChatSession)
 async def update_chat(
     chat_id: UUID,
     update_data: ChatSessionUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     session_id: str = Depends(get_session_id)
 ):
     """Update chat session"""
-    try:
-        chat = chat_service.update_chat(db, chat_id, session_id, update_data)
-        if not chat:
-            raise HTTPException(status_code=404, detail="Chat not found")
-        
-        return chat
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to update chat: {str(e)}")
+    chat = await chat_service.update_chat(db, chat_id, session_id, update_data)
+    if not chat:
+        raise HTTPException(status_code=404, detail="Chat not found")
+    
+    return chat
 
 
 @router.delete("/{chat_id}")
 async def delete_chat(
     chat_id: UUID,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     session_id: str = Depends(get_session_id)
 ):
     """Delete chat session"""
-    try:
-        success = chat_service.delete_chat(db, chat_id, session_id)
-        if not success:
-            raise HTTPException(status_code=404, detail="Chat not found")
-        
-        return {"message": "Chat deleted successfully", "chat_id": chat_id}
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to delete chat: {str(e)}")
+    success = await chat_service.delete_chat(db, chat_id, session_id)
+    if not success:
+        raise HTTPException(status_code=404, detail="Chat not found")
+    
+    return {"message": "Chat deleted successfully", "chat_id": chat_id}
 
 
 @router.post("/{chat_id}/archive", response_model=ChatSession)
 async def archive_chat(
     chat_id: UUID,
     archived: bool = Query(True, description="Archive (true) or unarchive (false)"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     session_id: str = Depends(get_session_id)
 ):
     """Archive or unarchive chat"""
-    try:
-        chat = chat_service.archive_chat(db, chat_id, session_id, archived)
-        if not chat:
-            raise HTTPException(status_code=404, detail="Chat not found")
-        
-        return chat
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        action = "archive" if archived else "unarchive"
-        raise HTTPException(status_code=500, detail=f"Failed to {action} chat: {str(e)}")
+    chat = await chat_service.archive_chat(db, chat_id, session_id, archived)
+    if not chat:
+        raise HTTPException(status_code=404, detail="Chat not found")
+    
+    return chat
 
 
 @router.post("/{chat_id}/pin", response_model=ChatSession)
 async def pin_chat(
     chat_id: UUID,
     pinned: bool = Query(True, description="Pin (true) or unpin (false)"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     session_id: str = Depends(get_session_id)
 ):
     """Pin or unpin chat"""
-    try:
-        chat = chat_service.pin_chat(db, chat_id, session_id, pinned)
-        if not chat:
-            raise HTTPException(status_code=404, detail="Chat not found")
-        
-        return chat
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        action = "pin" if pinned else "unpin"
-        raise HTTPException(status_code=500, detail=f"Failed to {action} chat: {str(e)}")
+    chat = await chat_service.pin_chat(db, chat_id, session_id, pinned)
+    if not chat:
+        raise HTTPException(status_code=404, detail="Chat not found")
+    
+    return chat
 
 
 @router.post("/messages", response_model=SendMessageResponse)
 async def send_message(
     request: SendMessageRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     session_id: str = Depends(get_session_id)
 ):
     """Send message and get AI response (creates new chat if none exists)"""
@@ -222,15 +179,13 @@ async def send_message(
         
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to send message: {str(e)}")
 
 
 @router.post("/{chat_id}/messages", response_model=SendMessageResponse)
 async def send_message_to_chat(
     chat_id: UUID,
     request: SendMessageRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     session_id: str = Depends(get_session_id)
 ):
     """Send message to specific chat and get AI response"""
@@ -246,15 +201,45 @@ async def send_message_to_chat(
         
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to send message: {str(e)}")
+
+
+async def _messages_as_ndjson(messages: AsyncIterator) -> AsyncIterator[bytes]:
+    """Encode messages as newline-delimited JSON, one line per message"""
+    async for message in messages:
+        yield orjson.dumps(
+            {
+                "id": message.id,
+                "session_id": message.session_id,
+                "role": message.role,
+                "content": message.content,
+                "message_metadata": message.message_metadata or {},
+                "created_at": message.created_at
+            },
+            option=orjson.OPT_UTC_Z | orjson.OPT_APPEND_NEWLINE
+        )
+
+
+@router.get("/{chat_id}/messages/export")
+async def export_chat_messages(
+    chat_id: UUID,
+    db: AsyncSession = Depends(get_db),
+    session_id: str = Depends(get_session_id)
+):
+    """Export all messages of a chat as newline-delimited JSON"""
+    # Rows are fetched in batches and written as they arrive, so long chats are
+    # never held in memory or encoded as a whole
+    messages = await chat_service.stream_chat_messages(db, chat_id, session_id)
+    if messages is None:
+        raise HTTPException(status_code=404, detail="Chat not found")
+    
+    return StreamingResponse(_messages_as_ndjson(messages), media_type="application/x-ndjson")
 
 
 @router.post("/{chat_id}/system-message", response_model=SystemMessageResponse)
 async def add_system_message(
     chat_id: UUID,
     request: dict,  # Simple dict with 'content' field
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     session_id: str = Depends(get_session_id)
 ):
     """Add system message to specific chat"""
@@ -262,11 +247,12 @@ async def add_system_message(
         if 'content' not in request:
             raise HTTPException(status_code=400, detail="Content is required")
         
-        result = chat_service.add_system_message(db, chat_id, session_id, request['content'])
+        result = await chat_service.add_system_message(db, chat_id, session_id, request['content'])
         
         # Manually construct the Message from the ORM result to ensure all fields are present
-        # Note: Using direct construction instead of from_orm() due to serialization issues
-        system_message = Message(
+        # Note: Using direct construction instead of from_orm() due to serialization issues.
+        # The row comes from SQLAlchemy with typed columns, so validators are skipped
+        system_message = Message.model_construct(
             id=result.id,
             session_id=result.session_id,
             role=result.role,
@@ -283,19 +269,17 @@ async def add_system_message(
         
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to add system message: {str(e)}")
 
 
 @router.get("/{chat_id}/settings", response_model=ChatSettings)
 async def get_chat_settings(
     chat_id: UUID,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     session_id: str = Depends(get_session_id)
 ):
     """Get chat settings for a specific chat"""
     try:
-        settings = chat_service.get_chat_settings(db, chat_id, session_id)
+        settings = await chat_service.get_chat_settings(db, chat_id, session_id)
         if not settings:
             raise HTTPException(status_code=404, detail="Chat not found or settings not available")
         
@@ -303,20 +287,18 @@ async def get_chat_settings(
         
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to get chat settings: {str(e)}")
 
 
 @router.put("/{chat_id}/settings", response_model=ChatSettingsResponse)
 async def update_chat_settings(
     chat_id: UUID,
     settings_update: ChatSettingsUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     session_id: str = Depends(get_session_id)
 ):
     """Update chat settings for a specific chat"""
     try:
-        settings = chat_service.update_chat_settings(db, chat_id, session_id, settings_update)
+        settings = await chat_service.update_chat_settings(db, chat_id, session_id, settings_update)
         if not settings:
             raise HTTPException(status_code=404, detail="Chat not found")
         
@@ -327,5 +309,3 @@ async def update_chat_settings(
         
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to update chat settings: {str(e)}")
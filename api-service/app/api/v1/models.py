@@ -16,8 +16,6 @@ async def list_models() -> List[Dict[str, Any]]:
         
     except AIServiceError as e:
         raise HTTPException(status_code=503, detail=f"AI service error: {str(e)}")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to list models: {str(e)}")
 
 
 @router.get("/{model_id}/status")
@@ -32,8 +30,6 @@ async def get_model_status(model_id: str) -> Dict[str, Any]:
         if "404" in str(e):
             raise HTTPException(status_code=404, detail=f"Model {model_id} not found")
         raise HTTPException(status_code=503, detail=f"AI service error: {str(e)}")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to get model status: {str(e)}")
 
 
 @router.post("/{model_id}/load")
@@ -48,8 +44,6 @@ async def load_model(model_id: str) -> Dict[str, Any]:
         if "404" in str(e):
             raise HTTPException(status_code=404, detail=f"Model {model_id} not found")
         raise HTTPException(status_code=503, detail=f"AI service error: {str(e)}")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to load model: {str(e)}")
 
 
 @router.delete("/{model_id}/unload")
@@ -64,8 +58,6 @@ async def unload_model(model_id: str) -> Dict[str, Any]:
         if "404" in str(e):
             raise HTTPException(status_code=404, detail=f"Model {model_id} not found")
         raise HTTPException(status_code=503, detail=f"AI service error: {str(e)}")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to unload model: {str(e)}")
 
 
 @router.get("/health")
@@ -78,5 +70,3 @@ async def check_ai_service_health() -> Dict[str, Any]:
         
     except AIServiceError as e:
         raise HTTPException(status_code=503, detail=f"AI service error: {str(e)}")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to check AI service health: {str(e)}")
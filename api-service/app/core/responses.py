@@ -0,0 +1,15 @@
+from typing import Any
+
+import orjson
+from fastapi.responses import ORJSONResponse
+
+
+class APIJSONResponse(ORJSONResponse):
+    """ORJSONResponse that writes UTC datetimes with a Z suffix instead of +00:00"""
+    
+    def render(self, content: Any) -> bytes:
+        # Matches how pydantic encodes UTC datetimes on response_model routes
+        return orjson.dumps(
+            content,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z | orjson.OPT_SERIALIZE_NUMPY
+        )
@@ -1,15 +1,39 @@
-from sqlalchemy import Column, String, Text, Boolean, DateTime, Integer, JSON, ForeignKey
+from sqlalchemy import Column, String, Text, Boolean, DateTime, Integer, Float, JSON, ForeignKey, Index, CheckConstraint
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 import uuid
 
-from ..core.database import Base
+from ..core.database import Base, PG_TRGM_AVAILABLE
+
+
+def _pg_trgm_available(ddl, target, bind, **kw) -> bool:
+    """Whether init_db enabled pg_trgm on this connection; assumed when only compiling DDL"""
+    return bind is None or bind.info.get(PG_TRGM_AVAILABLE, False)
 
 
 class ChatSession(Base):
     """Chat session model for managing individual conversations (session-based, no user auth)"""
     __tablename__ = "chat_sessions"
+    # Chat lists filter by session and archived/pinned state and order by
+    # last_message_at DESC, created_at DESC, which a backward scan of these serves
+    __table_args__ = (
+        Index("ix_cs_sid_arch_last_created", "session_id", "is_archived", "last_message_at", "created_at"),
+        Index(
+            "ix_cs_sid_pinned_arch_last_created", "session_id", "is_archived", "last_message_at", "created_at",
+            postgresql_where=text("is_pinned"),
+            sqlite_where=text("is_pinned")
+        ),
+        # Title search is a substring ILIKE; a trigram GIN index serves it on PostgreSQL
+        Index(
+            "ix_cs_title_trgm", "title",
+            postgresql_using="gin",
+            postgresql_ops={"title": "gin_trgm_ops"}
+        ).ddl_if(dialect="postgresql", callable_=_pg_trgm_available),
+    )
+    # Fetch server-generated values such as updated_at with RETURNING on UPDATE too,
+    # so written rows don't need a refresh
+    __mapper_args__ = {"eager_defaults": True}
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
     session_id = Column(String(255), nullable=False, index=True)  # Frontend session identifier
@@ -23,7 +47,8 @@ class ChatSession(Base):
     last_message_at = Column(DateTime(timezone=True), nullable=True)
     
     # Relationships
-    messages = relationship("Message", back_populates="session", cascade="all, delete-orphan", order_by="Message.created_at")
+    # Unordered: readers query recent messages explicitly (see ChatRepository.get_chat_with_messages)
+    messages = relationship("Message", back_populates="session", cascade="all, delete-orphan")
     settings = relationship("ChatSettings", back_populates="session", uselist=False, cascade="all, delete-orphan")
     
     def __repr__(self):
@@ -33,6 +58,10 @@ class ChatSession(Base):
 class Message(Base):
     """Message model for storing individual chat messages"""
     __tablename__ = "messages"
+    # Recent messages of a chat are read in created_at order
+    __table_args__ = (
+        Index("ix_msg_session_created", "session_id", "created_at"),
+    )
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
     session_id = Column(UUID(as_uuid=True), ForeignKey("chat_sessions.id"), nullable=False, index=True)
@@ -51,9 +80,13 @@ class Message(Base):
 class ChatSettings(Base):
     """Chat settings model for per-session AI configuration"""
     __tablename__ = "chat_settings"
+    __table_args__ = (
+        CheckConstraint("temperature BETWEEN 0 AND 2", name="ck_chat_settings_temperature_range"),
+    )
+    __mapper_args__ = {"eager_defaults": True}
     
     session_id = Column(UUID(as_uuid=True), ForeignKey("chat_sessions.id"), primary_key=True)
-    temperature = Column(String, nullable=True, default="0.7")  # Using String to handle float values
+    temperature = Column(Float, nullable=True, default=0.7)
     max_tokens = Column(Integer, nullable=True, default=1000)
     system_prompt = Column(Text, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -2,17 +2,36 @@ from fastapi import FastAPI, HTTPException, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
+from sqlalchemy.exc import SQLAlchemyError
+from logging.handlers import QueueHandler, QueueListener
+import atexit
 import logging
 import os
+import queue
 import uuid
 from typing import List
 
-from .core.database import init_db, check_db_connection
+from .core.database import init_db, check_db_connection, warm_db_pool, close_db
+from .core.responses import APIJSONResponse
 from .api.v1 import chats, models
 from .services.ai_client import get_ai_client
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+class DeferredQueueHandler(QueueHandler):
+    """Queue records as they are, so messages and tracebacks are formatted by the listener"""
+    
+    def prepare(self, record):
+        return record
+
+
+# Configure logging: request handlers only enqueue records, a listener thread writes them
+log_queue = queue.SimpleQueue()
+log_stream_handler = logging.StreamHandler()
+log_stream_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+log_listener = QueueListener(log_queue, log_stream_handler)
+logging.basicConfig(level=logging.INFO, handlers=[DeferredQueueHandler(log_queue)])
+log_listener.start()
+# Writes out any queued records before the process exits
+atexit.register(log_listener.stop)
 logger = logging.getLogger(__name__)
 
 
@@ -23,9 +42,10 @@ async def lifespan(app: FastAPI):
     
     # Initialize database
     try:
-        init_db()
-        if not check_db_connection():
+        await init_db()
+        if not await check_db_connection():
             raise Exception("Database connection failed")
+        await warm_db_pool()
         logger.info("Database initialized successfully")
     except Exception as e:
         logger.error(f"Database initialization failed: {e}")
@@ -43,13 +63,16 @@ async def lifespan(app: FastAPI):
     
     # Cleanup
     logger.info("Shutting down API service...")
+    await get_ai_client().aclose()
+    await close_db()
 
 
 app = FastAPI(
     title="Fullstack Chat API",
     version="2.0.0",
     description="Enhanced chat API with multi-session support, AI integration, and user management",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=APIJSONResponse
 )
 
 # Configure CORS
@@ -62,6 +85,16 @@ app.add_middleware(
 )
 
 
+# Routes only handle their domain errors; anything else is turned into a 500 here
+@app.exception_handler(SQLAlchemyError)
+async def database_exception_handler(request: Request, exc: SQLAlchemyError):
+    logger.error(f"Database error on {request.method} {request.url.path}: {exc}", exc_info=True)
+    return JSONResponse(
+        status_code=500,
+        content={"detail": "Database error"}
+    )
+
+
 # Global exception handler
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -85,7 +118,7 @@ async def health_check():
     
     # Check database
     try:
-        if check_db_connection():
+        if await check_db_connection():
             health_status["database"] = "connected"
         else:
             health_status["database"] = "disconnected"
@@ -151,5 +184,10 @@ if __name__ == "__main__":
         "app.main:app",
         host="0.0.0.0",
         port=8000,
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.getenv("WEB_CONCURRENCY", "1")),
+        timeout_keep_alive=30,
+        backlog=2048,
         reload=os.getenv("DEBUG", "false").lower() == "true"
     )
@@ -1,6 +1,6 @@
 from typing import Generic, TypeVar, Type, List, Optional, Any, Dict
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, or_, func, select, exists, inspect
 from uuid import UUID
 
 ModelType = TypeVar("ModelType")
@@ -13,14 +13,29 @@ class BaseRepository(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
     
     def __init__(self, model: Type[ModelType]):
         self.model = model
+        # Column attribute names, resolved once so updates skip per-field hasattr lookups
+        self._model_columns = frozenset(column.key for column in inspect(model).column_attrs)
     
-    def get(self, db: Session, id: Any) -> Optional[ModelType]:
+    def _apply_filters(self, statement, filters: Optional[Dict[str, Any]]):
+        """Add equality/IN filters for known model attributes to a statement"""
+        if filters:
+            for key, value in filters.items():
+                if hasattr(self.model, key):
+                    if isinstance(value, list):
+                        statement = statement.where(getattr(self.model, key).in_(value))
+                    else:
+                        statement = statement.where(getattr(self.model, key) == value)
+        return statement
+    
+    async def get(self, db: AsyncSession, id: Any) -> Optional[ModelType]:
         """Get a single record by ID"""
-        return db.query(self.model).filter(self.model.id == id).first()
+        # The session lives for one request, so repeated lookups of the same record
+        # within it come from the identity map instead of another SELECT
+        return await db.get(self.model, id)
     
-    def get_multi(
+    async def get_multi(
         self,
-        db: Session,
+        db: AsyncSession,
         *,
         skip: int = 0,
         limit: int = 100,
@@ -28,93 +43,80 @@ class BaseRepository(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         order_by: Optional[str] = None
     ) -> List[ModelType]:
         """Get multiple records with pagination and filtering"""
-        query = db.query(self.model)
-        
-        # Apply filters
-        if filters:
-            for key, value in filters.items():
-                if hasattr(self.model, key):
-                    if isinstance(value, list):
-                        query = query.filter(getattr(self.model, key).in_(value))
-                    else:
-                        query = query.filter(getattr(self.model, key) == value)
+        statement = self._apply_filters(select(self.model), filters)
         
         # Apply ordering
         if order_by and hasattr(self.model, order_by):
-            query = query.order_by(getattr(self.model, order_by))
+            statement = statement.order_by(getattr(self.model, order_by))
         
-        return query.offset(skip).limit(limit).all()
+        result = await db.execute(statement.offset(skip).limit(limit))
+        return list(result.scalars().all())
     
-    def create(self, db: Session, *, obj_in: CreateSchemaType) -> ModelType:
-        """Create a new record"""
-        if hasattr(obj_in, 'dict'):
-            obj_in_data = obj_in.dict()
+    async def create(self, db: AsyncSession, *, obj_in: CreateSchemaType, commit: bool = True) -> ModelType:
+        """Create a new record, or only flush it into the current transaction when commit is False"""
+        if hasattr(obj_in, 'model_dump'):
+            obj_in_data = obj_in.model_dump()
         else:
             obj_in_data = obj_in
-            
+        
         db_obj = self.model(**obj_in_data)
         db.add(db_obj)
-        db.commit()
-        db.refresh(db_obj)
+        # Server-generated columns are fetched by the INSERT itself (RETURNING), so the
+        # row doesn't need to be selected again after the commit
+        if commit:
+            await db.commit()
+        else:
+            await db.flush()
         return db_obj
     
-    def update(
+    async def update(
         self,
-        db: Session,
+        db: AsyncSession,
         *,
         db_obj: ModelType,
         obj_in: UpdateSchemaType
     ) -> ModelType:
         """Update an existing record"""
-        if hasattr(obj_in, 'dict'):
-            update_data = obj_in.dict(exclude_unset=True)
+        if hasattr(obj_in, 'model_dump'):
+            update_data = obj_in.model_dump(exclude_unset=True)
         else:
             update_data = obj_in
-            
-        for field, value in update_data.items():
-            if hasattr(db_obj, field):
-                setattr(db_obj, field, value)
+        
+        for field in update_data.keys() & self._model_columns:
+            setattr(db_obj, field, update_data[field])
         
         db.add(db_obj)
-        db.commit()
-        db.refresh(db_obj)
+        await db.commit()
         return db_obj
     
-    def delete(self, db: Session, *, id: Any) -> Optional[ModelType]:
+    async def delete(self, db: AsyncSession, *, id: Any) -> Optional[ModelType]:
         """Delete a record by ID"""
-        obj = db.query(self.model).get(id)
+        obj = await db.get(self.model, id)
         if obj:
-            db.delete(obj)
-            db.commit()
+            await db.delete(obj)
+            await db.commit()
         return obj
     
-    def count(self, db: Session, *, filters: Optional[Dict[str, Any]] = None) -> int:
+    async def count(self, db: AsyncSession, *, filters: Optional[Dict[str, Any]] = None) -> int:
         """Count records with optional filtering"""
-        query = db.query(self.model)
-        
-        if filters:
-            for key, value in filters.items():
-                if hasattr(self.model, key):
-                    if isinstance(value, list):
-                        query = query.filter(getattr(self.model, key).in_(value))
-                    else:
-                        query = query.filter(getattr(self.model, key) == value)
-        
-        return query.count()
+        statement = self._apply_filters(select(func.count()).select_from(self.model), filters)
+        return await db.scalar(statement)
     
-    def exists(self, db: Session, *, id: Any) -> bool:
+    async def exists(self, db: AsyncSession, *, id: Any) -> bool:
         """Check if a record exists by ID"""
-        return db.query(self.model).filter(self.model.id == id).first() is not None
+        # SELECT EXISTS(...) returns a single boolean instead of loading the row
+        return await db.scalar(select(exists().where(self.model.id == id)))
     
-    def get_by_field(self, db: Session, *, field: str, value: Any) -> Optional[ModelType]:
+    async def get_by_field(self, db: AsyncSession, *, field: str, value: Any) -> Optional[ModelType]:
         """Get a single record by a specific field"""
         if not hasattr(self.model, field):
             return None
-        return db.query(self.model).filter(getattr(self.model, field) == value).first()
+        result = await db.execute(select(self.model).where(getattr(self.model, field) == value))
+        return result.scalars().first()
     
-    def get_multi_by_field(
+    async def get_multi_by_field(
         self,
-        db: Session,
+        db: AsyncSession,
         *,
         field: str,
         value: Any,
@@ -125,10 +127,10 @@ class BaseRepository(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         if not hasattr(self.model, field):
             return []
         
-        return (
-            db.query(self.model)
-            .filter(getattr(self.model, field) == value)
+        result = await db.execute(
+            select(self.model)
+            .where(getattr(self.model, field) == value)
             .offset(skip)
             .limit(limit)
-            .all()
         )
+        return list(result.scalars().all())
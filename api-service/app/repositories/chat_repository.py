@@ -1,6 +1,8 @@
 from typing import List, Optional, Dict, Any
-from sqlalchemy.orm import Session
-from sqlalchemy import desc, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, raiseload, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy import desc, and_, func, select, delete, update
 from uuid import UUID
 
 from .base_repository import BaseRepository
@@ -14,48 +16,48 @@ class ChatRepository(BaseRepository[ChatSession, ChatSessionCreate, ChatSessionU
     def __init__(self):
         super().__init__(ChatSession)
     
-    def get_user_chats(
+    async def get_user_chats(
         self,
-        db: Session,
+        db: AsyncSession,
         user_id: UUID,
         skip: int = 0,
         limit: int = 100,
         include_archived: bool = False
     ) -> List[ChatSession]:
         """Get all chat sessions for a user"""
-        query = db.query(self.model).filter(self.model.user_id == user_id)
+        statement = select(self.model).where(self.model.user_id == user_id)
         
         if not include_archived:
-            query = query.filter(self.model.is_archived == False)
+            statement = statement.where(self.model.is_archived == False)
         
-        return (
-            query.order_by(desc(self.model.last_message_at), desc(self.model.created_at))
+        result = await db.execute(
+            statement.order_by(desc(self.model.last_message_at), desc(self.model.created_at))
             .offset(skip)
             .limit(limit)
-            .all()
         )
+        return list(result.scalars().all())
     
-    def get_pinned_chats(self, db: Session, user_id: UUID) -> List[ChatSession]:
+    async def get_pinned_chats(self, db: AsyncSession, user_id: UUID) -> List[ChatSession]:
         """Get pinned chats for a user"""
-        return (
-            db.query(self.model)
-            .filter(and_(self.model.user_id == user_id, self.model.is_pinned == True))
+        result = await db.execute(
+            select(self.model)
+            .where(and_(self.model.user_id == user_id, self.model.is_pinned == True))
             .order_by(desc(self.model.last_message_at))
-            .all()
         )
+        return list(result.scalars().all())
     
-    def search_chats(
+    async def search_chats(
         self,
-        db: Session,
+        db: AsyncSession,
         user_id: UUID,
         query: str,
         skip: int = 0,
         limit: int = 20
     ) -> List[ChatSession]:
         """Search chats by title or content"""
-        return (
-            db.query(self.model)
-            .filter(
+        result = await db.execute(
+            select(self.model)
+            .where(
                 and_(
                     self.model.user_id == user_id,
                     self.model.title.ilike(f"%{query}%")
@@ -64,153 +66,193 @@ class ChatRepository(BaseRepository[ChatSession, ChatSessionCreate, ChatSessionU
             .order_by(desc(self.model.last_message_at))
             .offset(skip)
             .limit(limit)
-            .all()
         )
+        return list(result.scalars().all())
     
-    def archive_chat(self, db: Session, chat_id: UUID, archived: bool = True) -> Optional[ChatSession]:
+    async def archive_chat(self, db: AsyncSession, chat_id: UUID, archived: bool = True) -> Optional[ChatSession]:
         """Archive or unarchive a chat"""
-        chat = self.get(db, chat_id)
+        chat = await self.get(db, chat_id)
         if chat:
             chat.is_archived = archived
-            db.commit()
-            db.refresh(chat)
+            await db.commit()
         return chat
     
-    def pin_chat(self, db: Session, chat_id: UUID, pinned: bool = True) -> Optional[ChatSession]:
+    async def pin_chat(self, db: AsyncSession, chat_id: UUID, pinned: bool = True) -> Optional[ChatSession]:
         """Pin or unpin a chat"""
-        chat = self.get(db, chat_id)
+        chat = await self.get(db, chat_id)
         if chat:
             chat.is_pinned = pinned
-            db.commit()
-            db.refresh(chat)
+            await db.commit()
         return chat
     
-    def update_last_message_time(self, db: Session, chat_id: UUID, update_count: bool = True) -> Optional[ChatSession]:
+    async def update_last_message_time(self, db: AsyncSession, chat_id: UUID, update_count: bool = True) -> Optional[ChatSession]:
         """Update the last message timestamp and optionally sync message count"""
-        from sqlalchemy import func
-        chat = self.get(db, chat_id)
-        if chat:
-            chat.last_message_at = func.now()
-            # Sync the message count only if requested (not for system messages)
-            if update_count:
-                self._sync_message_count(db, chat)
-            db.commit()
-            db.refresh(chat)
-        return chat
+        values = {"last_message_at": func.now()}
+        # Sync the message count only if requested (not for system messages)
+        if update_count:
+            values["message_count"] = self._message_count_subquery(chat_id)
+        return await self._update_chat_returning(db, chat_id, values)
     
-    def sync_message_count(self, db: Session, chat_id: UUID) -> Optional[ChatSession]:
+    async def sync_message_count(self, db: AsyncSession, chat_id: UUID) -> Optional[ChatSession]:
         """Synchronize the message count for a chat session"""
-        chat = self.get(db, chat_id)
-        if chat:
-            self._sync_message_count(db, chat)
-            db.commit()
-            db.refresh(chat)
-        return chat
+        return await self._update_chat_returning(
+            db, chat_id, {"message_count": self._message_count_subquery(chat_id)}
+        )
     
-    def _sync_message_count(self, db: Session, chat: ChatSession) -> None:
-        """Internal method to sync message count with actual message count"""
-        # Count actual messages for this chat session
-        actual_count = (
-            db.query(Message)
-            .filter(Message.session_id == chat.id)
-            .count()
+    def _message_count_subquery(self, chat_id: UUID):
+        """Count of a chat's messages, evaluated inside the UPDATE that stores it"""
+        return (
+            select(func.count())
+            .select_from(Message)
+            .where(Message.session_id == chat_id)
+            .scalar_subquery()
         )
-        chat.message_count = actual_count
     
-    def get_chat_with_messages(
+    async def _update_chat_returning(self, db: AsyncSession, chat_id: UUID, values: Dict[str, Any]) -> Optional[ChatSession]:
+        """Apply values to a chat in one UPDATE ... RETURNING, without loading it first"""
+        result = await db.execute(
+            update(self.model)
+            .where(self.model.id == chat_id)
+            .values(**values)
+            .returning(self.model)
+            .execution_options(populate_existing=True)
+        )
+        chat = result.scalars().first()
+        await db.commit()
+        return chat
+    
+    async def get_chat_with_messages(
         self,
-        db: Session,
+        db: AsyncSession,
         chat_id: UUID,
-        message_limit: int = 50
+        message_limit: int = 50,
+        session_id: Optional[str] = None
     ) -> Optional[ChatSession]:
-        """Get chat with recent messages"""
-        chat = (
-            db.query(self.model)
-            .filter(self.model.id == chat_id)
-            .first()
+        """Get chat with its settings and recent messages, optionally restricted to a session ID"""
+        recent_message_ids = (
+            select(Message.id)
+            .where(Message.session_id == chat_id)
+            .order_by(desc(Message.created_at))
+            .limit(message_limit)
+        )
+        # Settings are joined to the chat row and the recent messages follow in a single
+        # selectin query; anything else left to lazy load raises instead of querying per row
+        statement = (
+            select(self.model)
+            .options(
+                joinedload(self.model.settings),
+                selectinload(self.model.messages.and_(Message.id.in_(recent_message_ids))).raiseload("*"),
+                raiseload("*")
+            )
+            .where(self.model.id == chat_id)
         )
+        if session_id is not None:
+            statement = statement.where(self.model.session_id == session_id)
+        result = await db.execute(statement)
+        chat = result.scalars().first()
         
         if chat:
-            # Load recent messages
-            recent_messages = (
-                db.query(Message)
-                .filter(Message.session_id == chat_id)
-                .order_by(desc(Message.created_at))
-                .limit(message_limit)
-                .all()
-            )
-            # Reverse to get chronological order
-            chat.messages = list(reversed(recent_messages))
+            # The collection is unordered; put it in chronological order as loaded state
+            # rather than assigning, which would mark it as changed
+            set_committed_value(chat, "messages", sorted(chat.messages, key=lambda message: message.created_at))
         
         return chat
     
-    def get_user_chat_count(self, db: Session, user_id: UUID, include_archived: bool = False) -> int:
+    async def get_user_chat_count(self, db: AsyncSession, user_id: UUID, include_archived: bool = False) -> int:
         """Get total chat count for a user"""
-        query = db.query(self.model).filter(self.model.user_id == user_id)
+        statement = select(func.count()).select_from(self.model).where(self.model.user_id == user_id)
         
         if not include_archived:
-            query = query.filter(self.model.is_archived == False)
+            statement = statement.where(self.model.is_archived == False)
         
-        return query.count()
+        return await db.scalar(statement)
     
-    def delete_user_chats(self, db: Session, user_id: UUID) -> int:
+    async def delete_user_chats(self, db: AsyncSession, user_id: UUID) -> int:
         """Delete all chats for a user (cascade will handle messages)"""
-        deleted_count = (
-            db.query(self.model)
-            .filter(self.model.user_id == user_id)
-            .delete()
+        result = await db.execute(
+            delete(self.model).where(self.model.user_id == user_id)
         )
-        db.commit()
-        return deleted_count
+        await db.commit()
+        return result.rowcount
     
     # Session-based methods (new session-based API)
     
-    def get_session_chats(
+    def _session_chats_filter(
         self,
-        db: Session,
+        statement,
         session_id: str,
-        skip: int = 0,
-        limit: int = 100,
         include_archived: bool = False,
         filter_archived_only: bool = False,
         filter_pinned_only: bool = False
-    ) -> List[ChatSession]:
-        """Get all chat sessions for a session ID with filtering"""
-        query = db.query(self.model).filter(self.model.session_id == session_id)
+    ):
+        """Restrict a chat session statement to a session ID and its list filter"""
+        statement = statement.where(self.model.session_id == session_id)
         
         if filter_archived_only:
             # Show only archived chats
-            query = query.filter(self.model.is_archived == True)
+            statement = statement.where(self.model.is_archived == True)
         elif filter_pinned_only:
             # Show only pinned chats (exclude archived unless explicitly included)
-            query = query.filter(self.model.is_pinned == True)
+            statement = statement.where(self.model.is_pinned == True)
             if not include_archived:
-                query = query.filter(self.model.is_archived == False)
+                statement = statement.where(self.model.is_archived == False)
         elif not include_archived:
             # Default: exclude archived chats
-            query = query.filter(self.model.is_archived == False)
+            statement = statement.where(self.model.is_archived == False)
         
-        return (
-            query.order_by(desc(self.model.last_message_at), desc(self.model.created_at))
+        return statement
+    
+    async def get_session_chats(
+        self,
+        db: AsyncSession,
+        session_id: str,
+        skip: int = 0,
+        limit: int = 100,
+        include_archived: bool = False,
+        filter_archived_only: bool = False,
+        filter_pinned_only: bool = False
+    ) -> List[ChatSession]:
+        """Get all chat sessions for a session ID with filtering"""
+        statement = self._session_chats_filter(
+            select(self.model), session_id, include_archived, filter_archived_only, filter_pinned_only
+        )
+        
+        result = await db.execute(
+            statement.order_by(desc(self.model.last_message_at), desc(self.model.created_at))
             .offset(skip)
             .limit(limit)
-            .all()
         )
+        return list(result.scalars().all())
+    
+    async def count_session_chats(
+        self,
+        db: AsyncSession,
+        session_id: str,
+        include_archived: bool = False,
+        filter_archived_only: bool = False,
+        filter_pinned_only: bool = False
+    ) -> int:
+        """Get chat session count for a session ID with filtering"""
+        return await db.scalar(self._session_chats_filter(
+            select(func.count()).select_from(self.model),
+            session_id, include_archived, filter_archived_only, filter_pinned_only
+        ))
     
-    def get_or_create_session_chat(self, db: Session, session_id: str) -> ChatSession:
+    async def get_or_create_session_chat(self, db: AsyncSession, session_id: str) -> ChatSession:
         """Get or create an active chat for a session"""
         # Try to get the most recent non-archived chat for this session
-        existing_chat = (
-            db.query(self.model)
-            .filter(
+        result = await db.execute(
+            select(self.model)
+            .where(
                 and_(
                     self.model.session_id == session_id,
                     self.model.is_archived == False
                 )
             )
             .order_by(desc(self.model.last_message_at), desc(self.model.created_at))
-            .first()
+            .limit(1)
         )
+        existing_chat = result.scalars().first()
         
         if existing_chat:
             return existing_chat
@@ -223,20 +265,20 @@ class ChatRepository(BaseRepository[ChatSession, ChatSessionCreate, ChatSessionU
             model_name="facebook/blenderbot-400M-distill"  # Default model
         )
         
-        return self.create(db, obj_in=new_chat_data)
+        return await self.create(db, obj_in=new_chat_data)
     
-    def search_session_chats(
+    async def search_session_chats(
         self,
-        db: Session,
+        db: AsyncSession,
         session_id: str,
         query: str,
         skip: int = 0,
         limit: int = 20
     ) -> List[ChatSession]:
         """Search chats by title or content for a session"""
-        return (
-            db.query(self.model)
-            .filter(
+        result = await db.execute(
+            select(self.model)
+            .where(
                 and_(
                     self.model.session_id == session_id,
                     self.model.title.ilike(f"%{query}%")
@@ -245,5 +287,9 @@ class ChatRepository(BaseRepository[ChatSession, ChatSessionCreate, ChatSessionU
             .order_by(desc(self.model.last_message_at))
             .offset(skip)
             .limit(limit)
-            .all()
         )
+        return list(result.scalars().all())
+
+
+# Repositories hold no per-request state, so one instance is shared
+chat_repo = ChatRepository()
@@ -1,12 +1,20 @@
-from typing import List, Optional, Dict, Any
-from sqlalchemy.orm import Session
-from sqlalchemy import desc, and_, func
+from typing import AsyncIterator, List, Optional, Dict, Any
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import desc, and_, func, select, delete, bindparam
 from uuid import UUID
 
 from .base_repository import BaseRepository
 from ..database.models import Message
 from ..schemas.message_schemas import MessageCreate, MessageUpdate
 
+# Built once and executed with bound values; read for the conversation context on every send
+_RECENT_MESSAGES = (
+    select(Message)
+    .where(Message.session_id == bindparam("session_id"))
+    .order_by(desc(Message.created_at))
+    .limit(bindparam("count"))
+)
+
 
 class MessageRepository(BaseRepository[Message, MessageCreate, MessageUpdate]):
     """Repository for message operations"""
@@ -14,63 +22,70 @@ class MessageRepository(BaseRepository[Message, MessageCreate, MessageUpdate]):
     def __init__(self):
         super().__init__(Message)
     
-    def get_chat_messages(
+    async def get_chat_messages(
         self,
-        db: Session,
+        db: AsyncSession,
         session_id: UUID,
         skip: int = 0,
         limit: int = 50,
         order_desc: bool = False
     ) -> List[Message]:
         """Get messages for a chat session"""
-        query = db.query(self.model).filter(self.model.session_id == session_id)
+        statement = select(self.model).where(self.model.session_id == session_id)
         
         if order_desc:
-            query = query.order_by(desc(self.model.created_at))
+            statement = statement.order_by(desc(self.model.created_at))
         else:
-            query = query.order_by(self.model.created_at)
+            statement = statement.order_by(self.model.created_at)
         
-        return query.offset(skip).limit(limit).all()
+        result = await db.execute(statement.offset(skip).limit(limit))
+        return list(result.scalars().all())
     
-    def get_recent_messages(
+    async def stream_chat_messages(
         self,
-        db: Session,
+        db: AsyncSession,
+        session_id: UUID,
+        batch_size: int = 200
+    ) -> AsyncIterator[Message]:
+        """Yield all messages of a chat session in chronological order, fetched in batches"""
+        result = await db.stream(
+            select(self.model)
+            .where(self.model.session_id == session_id)
+            .order_by(self.model.created_at)
+            .execution_options(yield_per=batch_size)
+        )
+        async for message in result.scalars():
+            yield message
+    
+    async def get_recent_messages(
+        self,
+        db: AsyncSession,
         session_id: UUID,
         count: int = 10
     ) -> List[Message]:
         """Get most recent messages for context"""
-        return (
-            db.query(self.model)
-            .filter(self.model.session_id == session_id)
-            .order_by(desc(self.model.created_at))
-            .limit(count)
-            .all()
-        )
+        result = await db.execute(_RECENT_MESSAGES, {"session_id": session_id, "count": count})
+        return list(result.scalars().all())
     
-    def get_conversation_context(
+    async def get_conversation_context(
         self,
-        db: Session,
+        db: AsyncSession,
         session_id: UUID,
         max_messages: int = 20
     ) -> List[Message]:
         """Get conversation context in chronological order"""
-        messages = (
-            db.query(self.model)
-            .filter(self.model.session_id == session_id)
-            .order_by(desc(self.model.created_at))
-            .limit(max_messages)
-            .all()
-        )
+        messages = await self.get_recent_messages(db, session_id, count=max_messages)
         # Return in chronological order (oldest first)
         return list(reversed(messages))
     
-    def add_message(
+    async def add_message(
         self,
-        db: Session,
+        db: AsyncSession,
         session_id: UUID,
         role: str,
         content: str,
-        message_metadata: Optional[Dict[str, Any]] = None
+        message_metadata: Optional[Dict[str, Any]] = None,
+        commit: bool = True
     ) -> Message:
         """Add a new message to a chat session"""
         message_data = {
@@ -79,42 +94,44 @@ class MessageRepository(BaseRepository[Message, MessageCreate, MessageUpdate]):
             "content": content,
             "message_metadata": message_metadata or {}
         }
-        return self.create(db, obj_in=message_data)
+        return await self.create(db, obj_in=message_data, commit=commit)
     
-    def get_message_count(self, db: Session, session_id: UUID) -> int:
+    async def get_message_count(self, db: AsyncSession, session_id: UUID) -> int:
         """Get total message count for a chat session"""
-        return db.query(self.model).filter(self.model.session_id == session_id).count()
+        return await db.scalar(
+            select(func.count()).select_from(self.model).where(self.model.session_id == session_id)
+        )
     
-    def get_user_messages(self, db: Session, session_id: UUID) -> List[Message]:
+    async def get_user_messages(self, db: AsyncSession, session_id: UUID) -> List[Message]:
         """Get only user messages from a chat session"""
-        return (
-            db.query(self.model)
-            .filter(and_(self.model.session_id == session_id, self.model.role == "user"))
+        result = await db.execute(
+            select(self.model)
+            .where(and_(self.model.session_id == session_id, self.model.role == "user"))
             .order_by(self.model.created_at)
-            .all()
         )
+        return list(result.scalars().all())
     
-    def get_assistant_messages(self, db: Session, session_id: UUID) -> List[Message]:
+    async def get_assistant_messages(self, db: AsyncSession, session_id: UUID) -> List[Message]:
         """Get only assistant messages from a chat session"""
-        return (
-            db.query(self.model)
-            .filter(and_(self.model.session_id == session_id, self.model.role == "assistant"))
+        result = await db.execute(
+            select(self.model)
+            .where(and_(self.model.session_id == session_id, self.model.role == "assistant"))
             .order_by(self.model.created_at)
-            .all()
         )
+        return list(result.scalars().all())
     
-    def search_messages(
+    async def search_messages(
         self,
-        db: Session,
+        db: AsyncSession,
         session_id: UUID,
         search_query: str,
         skip: int = 0,
         limit: int = 20
     ) -> List[Message]:
         """Search messages by content"""
-        return (
-            db.query(self.model)
-            .filter(
+        result = await db.execute(
+            select(self.model)
+            .where(
                 and_(
                     self.model.session_id == session_id,
                     self.model.content.ilike(f"%{search_query}%")
@@ -123,33 +140,37 @@ class MessageRepository(BaseRepository[Message, MessageCreate, MessageUpdate]):
             .order_by(desc(self.model.created_at))
             .offset(skip)
             .limit(limit)
-            .all()
         )
+        return list(result.scalars().all())
     
-    def delete_session_messages(self, db: Session, session_id: UUID) -> int:
+    async def delete_session_messages(self, db: AsyncSession, session_id: UUID) -> int:
         """Delete all messages for a chat session"""
-        deleted_count = (
-            db.query(self.model)
-            .filter(self.model.session_id == session_id)
-            .delete()
+        result = await db.execute(
+            delete(self.model).where(self.model.session_id == session_id)
         )
-        db.commit()
-        return deleted_count
+        await db.commit()
+        return result.rowcount
     
-    def get_last_message(self, db: Session, session_id: UUID) -> Optional[Message]:
+    async def get_last_message(self, db: AsyncSession, session_id: UUID) -> Optional[Message]:
         """Get the last message in a chat session"""
-        return (
-            db.query(self.model)
-            .filter(self.model.session_id == session_id)
+        result = await db.execute(
+            select(self.model)
+            .where(self.model.session_id == session_id)
             .order_by(desc(self.model.created_at))
-            .first()
+            .limit(1)
         )
+        return result.scalars().first()
     
-    def get_first_user_message(self, db: Session, session_id: UUID) -> Optional[Message]:
+    async def get_first_user_message(self, db: AsyncSession, session_id: UUID) -> Optional[Message]:
         """Get the first user message for title generation"""
-        return (
-            db.query(self.model)
-            .filter(and_(self.model.session_id == session_id, self.model.role == "user"))
+        result = await db.execute(
+            select(self.model)
+            .where(and_(self.model.session_id == session_id, self.model.role == "user"))
             .order_by(self.model.created_at)
-            .first()
+            .limit(1)
         )
+        return result.scalars().first()
+
+
+# Repositories hold no per-request state, so one instance is shared
+message_repo = MessageRepository()
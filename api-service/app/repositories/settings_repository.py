@@ -1,5 +1,7 @@
 from typing import Optional
-from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from uuid import UUID
 
 from .base_repository import BaseRepository
@@ -13,52 +15,66 @@ class ChatSettingsRepository(BaseRepository[ChatSettings, ChatSettingsCreate, Ch
     def __init__(self):
         super().__init__(ChatSettings)
     
-    def get_by_session_id(self, db: Session, session_id: UUID) -> Optional[ChatSettings]:
+    async def get_by_session_id(self, db: AsyncSession, session_id: UUID) -> Optional[ChatSettings]:
         """Get chat settings by session ID"""
-        return db.query(self.model).filter(self.model.session_id == session_id).first()
+        # session_id is the primary key, so a lookup earlier in the request is reused
+        return await db.get(self.model, session_id)
     
-    def get_or_create_by_session_id(self, db: Session, session_id: UUID) -> ChatSettings:
+    async def get_or_create_by_session_id(self, db: AsyncSession, session_id: UUID) -> ChatSettings:
         """Get or create chat settings for a session"""
-        settings = self.get_by_session_id(db, session_id)
+        settings = await self.get_by_session_id(db, session_id)
         if not settings:
             # Create default settings
             settings_data = {
                 "session_id": session_id,
-                "temperature": "0.7",
+                "temperature": 0.7,
                 "max_tokens": 1000,
                 "system_prompt": None
             }
-            settings = self.model(**settings_data)
-            db.add(settings)
-            db.commit()
-            db.refresh(settings)
+            # INSERT ... ON CONFLICT DO NOTHING RETURNING creates and loads the row in one
+            # statement; a concurrent request that created it first leaves nothing returned
+            insert = sqlite_insert if db.get_bind().dialect.name == "sqlite" else postgresql_insert
+            result = await db.execute(
+                insert(self.model)
+                .values(**settings_data)
+                .on_conflict_do_nothing(index_elements=[self.model.session_id])
+                .returning(self.model)
+            )
+            settings = result.scalars().first()
+            await db.commit()
+            if not settings:
+                settings = await self.get_by_session_id(db, session_id)
         return settings
     
-    def update_by_session_id(
-        self, 
-        db: Session, 
-        session_id: UUID, 
+    async def update_by_session_id(
+        self,
+        db: AsyncSession,
+        session_id: UUID,
         obj_in: ChatSettingsUpdate
     ) -> Optional[ChatSettings]:
         """Update chat settings by session ID"""
-        settings = self.get_by_session_id(db, session_id)
+        settings = await self.get_by_session_id(db, session_id)
         if settings:
-            return self.update(db, db_obj=settings, obj_in=obj_in)
+            return await self.update(db, db_obj=settings, obj_in=obj_in)
         return None
     
-    def delete_by_session_id(self, db: Session, session_id: UUID) -> bool:
+    async def delete_by_session_id(self, db: AsyncSession, session_id: UUID) -> bool:
         """Delete chat settings by session ID"""
-        settings = self.get_by_session_id(db, session_id)
+        settings = await self.get_by_session_id(db, session_id)
         if settings:
-            db.delete(settings)
-            db.commit()
+            await db.delete(settings)
+            await db.commit()
             return True
         return False
     
-    def get_by_chat_id(self, db: Session, chat_id: UUID) -> Optional[ChatSettings]:
+    async def get_by_chat_id(self, db: AsyncSession, chat_id: UUID) -> Optional[ChatSettings]:
         """Get chat settings by chat ID (alias for get_by_session_id for clarity)"""
-        return self.get_by_session_id(db, chat_id)
+        return await self.get_by_session_id(db, chat_id)
     
-    def get_or_create_by_chat_id(self, db: Session, chat_id: UUID) -> ChatSettings:
+    async def get_or_create_by_chat_id(self, db: AsyncSession, chat_id: UUID) -> ChatSettings:
         """Get or create chat settings for a chat (alias for get_or_create_by_session_id for clarity)"""
-        return self.get_or_create_by_session_id(db, chat_id)
+        return await self.get_or_create_by_session_id(db, chat_id)
+
+
+# Repositories hold no per-request state, so one instance is shared
+settings_repo = ChatSettingsRepository()
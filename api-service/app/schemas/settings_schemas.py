@@ -6,7 +6,7 @@ from datetime import datetime
 
 class ChatSettingsBase(BaseModel):
     """Base chat settings schema"""
-    temperature: Optional[str] = Field(default="0.7", description="Temperature for AI model")
+    temperature: Optional[float] = Field(default=0.7, ge=0, le=2, description="Temperature for AI model")
     max_tokens: Optional[int] = Field(default=1000, ge=1, le=50000, description="Maximum tokens for response")
     system_prompt: Optional[str] = Field(default=None, description="System prompt for AI model")
 
@@ -1,10 +1,22 @@
+import asyncio
+import functools
 import httpx
 import logging
-from typing import List, Dict, Any, Optional
+import os
+import time
+from typing import List, Dict, Any, Optional, Tuple
 from uuid import UUID
 
 logger = logging.getLogger(__name__)
 
+# The model list changes rarely; model status is polled more often
+MODELS_CACHE_TTL_SECONDS = 30.0
+MODEL_STATUS_CACHE_TTL_SECONDS = 5.0
+MODEL_STATUS_CACHE_SIZE = 64
+
+# Keep-alive connections are shared by every request to the AI service
+AI_CLIENT_LIMITS = httpx.Limits(max_keepalive_connections=100, max_connections=200)
+
 
 class AIServiceClient:
     """Client for communicating with the AI service"""
@@ -12,49 +24,101 @@ class AIServiceClient:
     def __init__(self, base_url: str):
         self.base_url = base_url.rstrip('/')
         self.timeout = httpx.Timeout(30.0, connect=10.0)
+        # Created on first use and kept open so connections to the AI service are reused
+        self._client: Optional[httpx.AsyncClient] = None
+        self._models_cache: Optional[Tuple[float, List[Dict[str, Any]]]] = None
+        self._models_lock = asyncio.Lock()
+        self._status_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
         
+    def _get_client(self) -> httpx.AsyncClient:
+        """Get the shared HTTP client, creating it on first use"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=AI_CLIENT_LIMITS
+            )
+        return self._client
+    
+    async def aclose(self) -> None:
+        """Close the shared HTTP client"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
     async def _make_request(self, method: str, endpoint: str, **kwargs) -> Dict[str, Any]:
         """Make HTTP request to AI service"""
-        url = f"{self.base_url}{endpoint}"
-        
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            try:
-                response = await client.request(method, url, **kwargs)
-                response.raise_for_status()
-                return response.json()
-            except httpx.HTTPError as e:
-                logger.error(f"AI service request failed: {e}")
-                raise AIServiceError(f"AI service request failed: {str(e)}")
-            except Exception as e:
-                logger.error(f"Unexpected error in AI service request: {e}")
-                raise AIServiceError(f"Unexpected error: {str(e)}")
+        try:
+            response = await self._get_client().request(method, endpoint, **kwargs)
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPError as e:
+            logger.error(f"AI service request failed: {e}")
+            raise AIServiceError(f"AI service request failed: {str(e)}")
+        except Exception as e:
+            logger.error(f"Unexpected error in AI service request: {e}")
+            raise AIServiceError(f"Unexpected error: {str(e)}")
+    
+    def _invalidate_model_caches(self, model_id: str) -> None:
+        """Drop cached model list and status after a model is loaded or unloaded"""
+        self._models_cache = None
+        self._status_cache.pop(model_id, None)
     
     async def health_check(self) -> Dict[str, Any]:
         """Check AI service health"""
         return await self._make_request("GET", "/health")
     
     async def list_models(self) -> List[Dict[str, Any]]:
-        """List available models"""
-        response = await self._make_request("GET", "/models")
-        return response.get("models", [])
+        """List available models, reusing a recent listing"""
+        if self._models_cache and self._models_cache[0] > time.monotonic():
+            return self._models_cache[1]
+        
+        # Concurrent misses wait for a single request instead of each calling the AI service
+        async with self._models_lock:
+            if self._models_cache and self._models_cache[0] > time.monotonic():
+                return self._models_cache[1]
+            response = await self._make_request("GET", "/models")
+            models = response.get("models", [])
+            self._models_cache = (time.monotonic() + MODELS_CACHE_TTL_SECONDS, models)
+            return models
     
     async def get_model_status(self, model_id: str) -> Dict[str, Any]:
-        """Get status of a specific model"""
-        return await self._make_request("GET", f"/models/{model_id}/status")
+        """Get status of a specific model, reusing a recent status"""
+        cached = self._status_cache.get(model_id)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+        
+        status = await self._make_request("GET", f"/models/{model_id}/status")
+        now = time.monotonic()
+        if model_id not in self._status_cache and len(self._status_cache) >= MODEL_STATUS_CACHE_SIZE:
+            self._status_cache = {
+                cached_id: entry for cached_id, entry in self._status_cache.items() if entry[0] > now
+            }
+            if len(self._status_cache) >= MODEL_STATUS_CACHE_SIZE:
+                self._status_cache.pop(next(iter(self._status_cache)))
+        self._status_cache[model_id] = (now + MODEL_STATUS_CACHE_TTL_SECONDS, status)
+        return status
     
     async def load_model(self, model_id: str) -> Dict[str, Any]:
         """Load a model"""
-        return await self._make_request("POST", f"/models/{model_id}/load")
+        try:
+            return await self._make_request("POST", f"/models/{model_id}/load")
+        finally:
+            self._invalidate_model_caches(model_id)
     
     async def unload_model(self, model_id: str) -> Dict[str, Any]:
         """Unload a model"""
-        return await self._make_request("DELETE", f"/models/{model_id}/unload")
+        try:
+            return await self._make_request("DELETE", f"/models/{model_id}/unload")
+        finally:
+            self._invalidate_model_caches(model_id)
     
     async def generate_response(
         self,
         model_id: str,
         messages: List[Dict[str, str]],
-        parameters: Optional[Dict[str, Any]] = None
+        parameters: Optional[Dict[str, Any]] = None,
+        conversation_id: Optional[str] = None
     ) -> str:
         """Generate AI response"""
         payload = {
@@ -62,6 +126,9 @@ class AIServiceClient:
             "messages": messages,
             "parameters": parameters or {}
         }
+        if conversation_id is not None:
+            # Lets the AI service continue the conversation's cached key/values
+            payload["session_id"] = conversation_id
         
         response = await self._make_request("POST", "/generate", json=payload)
         return response.get("response", "")
@@ -87,15 +154,8 @@ class AIServiceError(Exception):
     pass
 
 
-# Global AI client instance
-_ai_client: Optional[AIServiceClient] = None
-
-
+@functools.lru_cache(maxsize=1)
 def get_ai_client() -> AIServiceClient:
-    """Get AI service client instance"""
-    global _ai_client
-    if _ai_client is None:
-        import os
-        ai_service_url = os.getenv("AI_SERVICE_URL", "http://localhost:8001")
-        _ai_client = AIServiceClient(ai_service_url)
-    return _ai_client
+    """Get the shared AI service client instance"""
+    ai_service_url = os.getenv("AI_SERVICE_URL", "http://localhost:8001")
+    return AIServiceClient(ai_service_url)
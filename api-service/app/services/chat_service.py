@@ -1,11 +1,12 @@
 import logging
-from typing import List, Optional, Dict, Any
-from sqlalchemy.orm import Session
+import time
+from typing import AsyncIterator, List, Optional, Dict, Any, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
 from uuid import UUID
 
-from ..repositories.chat_repository import ChatRepository
-from ..repositories.message_repository import MessageRepository
-from ..repositories.settings_repository import ChatSettingsRepository
+from ..repositories.chat_repository import chat_repo
+from ..repositories.message_repository import message_repo
+from ..repositories.settings_repository import settings_repo
 from ..database.models import ChatSession, Message, ChatSettings as ChatSettingsModel
 from ..schemas.chat_schemas import ChatSessionCreate, ChatSessionUpdate, CreateChatRequest
 from ..schemas.message_schemas import SendMessageRequest
@@ -14,19 +15,26 @@ from .ai_client import get_ai_client, AIServiceError
 
 logger = logging.getLogger(__name__)
 
+# How long a session's chat count is reused before querying again
+CHAT_COUNT_TTL_SECONDS = 5.0
+# Sessions with cached counts kept before expired entries are swept
+CHAT_COUNT_CACHE_SIZE = 1024
+
 
 class ChatService:
     """Service for chat operations"""
     
     def __init__(self):
-        self.chat_repo = ChatRepository()
-        self.message_repo = MessageRepository()
-        self.settings_repo = ChatSettingsRepository()
+        self.chat_repo = chat_repo
+        self.message_repo = message_repo
+        self.settings_repo = settings_repo
         self.ai_client = get_ai_client()
+        # session_id -> {filter key: (expires_at, count)}
+        self._chat_counts: Dict[str, Dict[Tuple[bool, bool, bool], Tuple[float, int]]] = {}
     
-    def get_user_chats(
+    async def get_user_chats(
         self,
-        db: Session,
+        db: AsyncSession,
         user_id: UUID,
         page: int = 1,
         per_page: int = 50,
@@ -34,33 +42,33 @@ class ChatService:
     ) -> List[ChatSession]:
         """Get user's chats with pagination"""
         skip = (page - 1) * per_page
-        return self.chat_repo.get_user_chats(
+        return await self.chat_repo.get_user_chats(
             db, user_id, skip=skip, limit=per_page, include_archived=include_archived
         )
     
-    def get_chat_with_messages(
+    async def get_chat_with_messages(
         self,
-        db: Session,
+        db: AsyncSession,
         chat_id: UUID,
         session_id: str,
         message_limit: int = 50
     ) -> Optional[Dict[str, Any]]:
         """Get chat with messages and settings, ensuring session ownership"""
-        chat = self.chat_repo.get(db, chat_id)
-        if not chat or chat.session_id != session_id:
-            return None
-        
-        # Get chat with messages
-        chat_with_messages = self.chat_repo.get_chat_with_messages(db, chat_id, message_limit)
+        # Loads the chat, its settings and recent messages, filtered by session ownership
+        chat_with_messages = await self.chat_repo.get_chat_with_messages(
+            db, chat_id, message_limit, session_id=session_id
+        )
         if not chat_with_messages:
             return None
         
-        # Get chat settings
-        settings = self.settings_repo.get_or_create_by_chat_id(db, chat.id)
+        # Get chat settings, creating the defaults for chats that have none yet
+        settings = chat_with_messages.settings
+        if settings is None:
+            settings = await self.settings_repo.get_or_create_by_chat_id(db, chat_id)
         chat_settings_dict = None
         if settings:
             chat_settings = ChatSettings.from_orm(settings)
-            chat_settings_dict = chat_settings.dict()
+            chat_settings_dict = chat_settings.model_dump()
         
         # Convert to dict and add settings
         result = {
@@ -72,7 +80,7 @@ class ChatService:
     
     async def create_chat(
         self,
-        db: Session,
+        db: AsyncSession,
         session_id: str,
         request: CreateChatRequest
     ) -> ChatSession:
@@ -87,7 +95,8 @@ class ChatService:
             session_id=session_id
         )
         
-        chat = self.chat_repo.create(db, obj_in=chat_data)
+        chat = await self.chat_repo.create(db, obj_in=chat_data)
+        self._invalidate_chat_count(session_id)
         
         # If initial message provided, send it
         if request.initial_message:
@@ -101,90 +110,95 @@ class ChatService:
                 title = self._generate_title_from_message(request.initial_message)
                 if title != request.initial_message:
                     update_data = ChatSessionUpdate(title=title)
-                    chat = self.chat_repo.update(db, db_obj=chat, obj_in=update_data)
+                    chat = await self.chat_repo.update(db, db_obj=chat, obj_in=update_data)
                     
             except Exception as e:
                 logger.error(f"Failed to send initial message: {e}")
         
         return chat
     
-    def update_chat(
+    async def update_chat(
         self,
-        db: Session,
+        db: AsyncSession,
         chat_id: UUID,
         session_id: str,
         update_data: ChatSessionUpdate
     ) -> Optional[ChatSession]:
         """Update chat session"""
-        chat = self.chat_repo.get(db, chat_id)
+        chat = await self.chat_repo.get(db, chat_id)
         if not chat or chat.session_id != session_id:
             return None
         
-        return self.chat_repo.update(db, db_obj=chat, obj_in=update_data)
+        # Archiving or pinning through an update changes which chats each filter counts
+        self._invalidate_chat_count(session_id)
+        return await self.chat_repo.update(db, db_obj=chat, obj_in=update_data)
     
-    def delete_chat(
+    async def delete_chat(
         self,
-        db: Session,
+        db: AsyncSession,
         chat_id: UUID,
         session_id: str
     ) -> bool:
         """Delete chat session"""
-        chat = self.chat_repo.get(db, chat_id)
+        chat = await self.chat_repo.get(db, chat_id)
         if not chat or chat.session_id != session_id:
             return False
         
-        deleted = self.chat_repo.delete(db, id=chat_id)
+        deleted = await self.chat_repo.delete(db, id=chat_id)
+        self._invalidate_chat_count(session_id)
         return deleted is not None
     
-    def archive_chat(
+    async def archive_chat(
         self,
-        db: Session,
+        db: AsyncSession,
         chat_id: UUID,
         session_id: str,
         archived: bool = True
     ) -> Optional[ChatSession]:
         """Archive or unarchive chat"""
-        chat = self.chat_repo.get(db, chat_id)
+        chat = await self.chat_repo.get(db, chat_id)
         if not chat or chat.session_id != session_id:
             return None
         
-        return self.chat_repo.archive_chat(db, chat_id, archived)
+        self._invalidate_chat_count(session_id)
+        return await self.chat_repo.archive_chat(db, chat_id, archived)
     
-    def pin_chat(
+    async def pin_chat(
         self,
-        db: Session,
+        db: AsyncSession,
         chat_id: UUID,
         session_id: str,
         pinned: bool = True
     ) -> Optional[ChatSession]:
         """Pin or unpin chat"""
-        chat = self.chat_repo.get(db, chat_id)
+        chat = await self.chat_repo.get(db, chat_id)
         if not chat or chat.session_id != session_id:
             return None
         
-        return self.chat_repo.pin_chat(db, chat_id, pinned)
+        self._invalidate_chat_count(session_id)
+        return await self.chat_repo.pin_chat(db, chat_id, pinned)
     
     async def send_message(
         self,
-        db: Session,
+        db: AsyncSession,
         chat_id: UUID,
         user_id: UUID,
         request: SendMessageRequest
     ) -> Dict[str, Any]:
         """Send message and get AI response"""
         # Verify chat ownership
-        chat = self.chat_repo.get(db, chat_id)
+        chat = await self.chat_repo.get(db, chat_id)
         if not chat or chat.user_id != user_id:
             raise ValueError("Chat not found or access denied")
         
         try:
             # Add user message
-            user_message = self.message_repo.add_message(
+            user_message = await self.message_repo.add_message(
                 db, chat_id, "user", request.content
             )
             
             # Get conversation context
-            context_messages = self.message_repo.get_conversation_context(
+            context_messages = await self.message_repo.get_conversation_context(
                 db, chat_id, max_messages=10
             )
             
@@ -201,16 +215,18 @@ class ChatService:
                 ai_response = await self.ai_client.generate_response(
                     model_id=chat.model_name,
                     messages=ai_messages,
-                    parameters=request.model_parameters
+                    parameters=request.model_parameters,
+                    conversation_id=str(chat_id)
                 )
                 
                 # Add assistant message
-                assistant_message = self.message_repo.add_message(
-                    db, chat_id, "assistant", ai_response
+                # Written in the same transaction as the chat update below, which commits both
+                assistant_message = await self.message_repo.add_message(
+                    db, chat_id, "assistant", ai_response, commit=False
                 )
                 
                 # Update chat's last message time
-                self.chat_repo.update_last_message_time(db, chat_id)
+                await self.chat_repo.update_last_message_time(db, chat_id)
                 
                 return {
                     "user_message": user_message,
@@ -221,7 +237,7 @@ class ChatService:
             except AIServiceError as e:
                 logger.error(f"AI service error: {e}")
                 # Add error message
-                error_message = self.message_repo.add_message(
+                error_message = await self.message_repo.add_message(
                     db, chat_id, "assistant", 
                     "I'm sorry, I'm experiencing technical difficulties. Please try again.",
                     message_metadata={"error": str(e)}
@@ -238,27 +254,29 @@ class ChatService:
             logger.error(f"Error in send_message: {e}")
             raise e
     
-    def search_chats(
+    async def search_chats(
         self,
-        db: Session,
+        db: AsyncSession,
         session_id: str,
         query: str,
         page: int = 1,
         per_page: int = 20
-    ) -> List[ChatSession]:
-        """Search session's chats"""
+    ) -> Tuple[List[ChatSession], bool]:
+        """Search session's chats, returning the page and whether more results follow"""
         skip = (page - 1) * per_page
-        return self.chat_repo.search_session_chats(db, session_id, query, skip=skip, limit=per_page)
+        # Fetch one extra row to detect a following page without counting
+        chats = await self.chat_repo.search_session_chats(db, session_id, query, skip=skip, limit=per_page + 1)
+        return chats[:per_page], len(chats) > per_page
     
-    def get_chat_statistics(
+    async def get_chat_statistics(
         self,
-        db: Session,
+        db: AsyncSession,
         user_id: UUID
     ) -> Dict[str, Any]:
         """Get chat statistics for user"""
-        total_chats = self.chat_repo.get_user_chat_count(db, user_id, include_archived=True)
-        active_chats = self.chat_repo.get_user_chat_count(db, user_id, include_archived=False)
-        pinned_chats = len(self.chat_repo.get_pinned_chats(db, user_id))
+        total_chats = await self.chat_repo.get_user_chat_count(db, user_id, include_archived=True)
+        active_chats = await self.chat_repo.get_user_chat_count(db, user_id, include_archived=False)
+        pinned_chats = len(await self.chat_repo.get_pinned_chats(db, user_id))
         
         return {
             "total_chats": total_chats,
@@ -280,48 +298,84 @@ class ChatService:
     
     # Session-based methods (new session-based API)
     
-    def get_session_chats(
+    async def get_session_chats(
         self,
-        db: Session,
+        db: AsyncSession,
         session_id: str,
         page: int = 1,
         per_page: int = 50,
         include_archived: bool = False,
         filter_archived_only: bool = False,
         filter_pinned_only: bool = False
-    ) -> List[ChatSession]:
-        """Get session's chats with pagination and filtering"""
+    ) -> Tuple[List[ChatSession], bool]:
+        """Get session's chats with pagination and filtering, and whether more pages follow"""
         skip = (page - 1) * per_page
-        return self.chat_repo.get_session_chats(
-            db, session_id, skip=skip, limit=per_page, 
+        # Fetch one extra row to detect a following page without counting
+        chats = await self.chat_repo.get_session_chats(
+            db, session_id, skip=skip, limit=per_page + 1,
+            include_archived=include_archived,
+            filter_archived_only=filter_archived_only,
+            filter_pinned_only=filter_pinned_only
+        )
+        return chats[:per_page], len(chats) > per_page
+    
+    async def count_session_chats(
+        self,
+        db: AsyncSession,
+        session_id: str,
+        include_archived: bool = False,
+        filter_archived_only: bool = False,
+        filter_pinned_only: bool = False
+    ) -> int:
+        """Get session's chat count, reusing a recent count for a few seconds"""
+        key = (include_archived, filter_archived_only, filter_pinned_only)
+        now = time.monotonic()
+        cached = self._chat_counts.get(session_id, {}).get(key)
+        if cached and cached[0] > now:
+            return cached[1]
+        
+        count = await self.chat_repo.count_session_chats(
+            db, session_id,
             include_archived=include_archived,
             filter_archived_only=filter_archived_only,
             filter_pinned_only=filter_pinned_only
         )
+        if session_id not in self._chat_counts and len(self._chat_counts) >= CHAT_COUNT_CACHE_SIZE:
+            self._chat_counts = {
+                cached_session: counts for cached_session, counts in self._chat_counts.items()
+                if any(expires_at > now for expires_at, _ in counts.values())
+            }
+        self._chat_counts.setdefault(session_id, {})[key] = (now + CHAT_COUNT_TTL_SECONDS, count)
+        return count
+    
+    def _invalidate_chat_count(self, session_id: str) -> None:
+        """Drop cached chat counts for a session after its chats change"""
+        self._chat_counts.pop(session_id, None)
     
     async def send_message_to_session(
         self,
-        db: Session,
+        db: AsyncSession,
         session_id: str,
         request: SendMessageRequest
     ) -> Dict[str, Any]:
         """Send message to session, creating chat if needed"""
         # Get or create an active chat for this session
-        chat = self.chat_repo.get_or_create_session_chat(db, session_id)
+        chat = await self.chat_repo.get_or_create_session_chat(db, session_id)
+        self._invalidate_chat_count(session_id)
         
         # Use the internal method which now includes settings integration
         return await self._send_message_to_chat_internal(db, chat.id, request)
     
     async def send_message_to_chat(
         self,
-        db: Session,
+        db: AsyncSession,
         chat_id: UUID,
         session_id: str,
         request: SendMessageRequest
     ) -> Dict[str, Any]:
         """Send message to specific chat (session-based)"""
         # Verify chat belongs to session
-        chat = self.chat_repo.get(db, chat_id)
+        chat = await self.chat_repo.get(db, chat_id)
         if not chat or chat.session_id != session_id:
             raise ValueError("Chat not found or access denied")
         
@@ -329,29 +383,29 @@ class ChatService:
     
     async def _send_message_to_chat_internal(
         self,
-        db: Session,
+        db: AsyncSession,
         chat_id: UUID,
         request: SendMessageRequest
     ) -> Dict[str, Any]:
         """Internal method to send message to a chat"""
-        chat = self.chat_repo.get(db, chat_id)
+        chat = await self.chat_repo.get(db, chat_id)
         if not chat:
             raise ValueError("Chat not found")
         
         try:
             # Add user message
-            user_message = self.message_repo.add_message(
+            user_message = await self.message_repo.add_message(
                 db, chat_id, "user", request.content
             )
             
             # Get conversation context
-            context_messages = self.message_repo.get_conversation_context(
+            context_messages = await self.message_repo.get_conversation_context(
                 db, chat_id, max_messages=10
             )
             
             # Get chat settings to apply to AI generation
             # Use the chat's UUID id for settings lookup
-            chat_settings = self.settings_repo.get_or_create_by_chat_id(db, chat.id)
+            chat_settings = await self.settings_repo.get_or_create_by_chat_id(db, chat.id)
             
             # Debug logging for system prompt
             logger.info(f"[CHAT_MESSAGE] Settings loaded - system_prompt: '{chat_settings.system_prompt}' (type: {type(chat_settings.system_prompt)})")
@@ -377,7 +431,7 @@ class ChatService:
             
             # Prepare parameters using chat settings
             ai_parameters = {
-                "temperature": float(chat_settings.temperature) if chat_settings.temperature else 0.7,
+                "temperature": chat_settings.temperature if chat_settings.temperature is not None else 0.7,
                 "max_length": chat_settings.max_tokens if chat_settings.max_tokens else 1000,
             }
             
@@ -392,16 +446,18 @@ class ChatService:
                 ai_response = await self.ai_client.generate_response(
                     model_id=chat.model_name,
                     messages=ai_messages,
-                    parameters=ai_parameters
+                    parameters=ai_parameters,
+                    conversation_id=str(chat_id)
                 )
                 
                 # Add assistant message
-                assistant_message = self.message_repo.add_message(
-                    db, chat_id, "assistant", ai_response
+                # Written in the same transaction as the chat update below, which commits both
+                assistant_message = await self.message_repo.add_message(
+                    db, chat_id, "assistant", ai_response, commit=False
                 )
                 
                 # Update chat's last message time and message count
-                updated_chat = self.chat_repo.update_last_message_time(db, chat_id)
+                updated_chat = await self.chat_repo.update_last_message_time(db, chat_id)
                 
                 return {
                     "user_message": user_message,
@@ -413,14 +469,15 @@ class ChatService:
             except AIServiceError as e:
                 logger.error(f"AI service error: {e}")
                 # Add error message
-                error_message = self.message_repo.add_message(
+                error_message = await self.message_repo.add_message(
                     db, chat_id, "assistant", 
                     "I'm sorry, I'm experiencing technical difficulties. Please try again.",
-                    message_metadata={"error": str(e)}
+                    message_metadata={"error": str(e)},
+                    commit=False
                 )
                 
                 # Update chat's last message time and message count for error case too
-                updated_chat = self.chat_repo.update_last_message_time(db, chat_id)
+                updated_chat = await self.chat_repo.update_last_message_time(db, chat_id)
                 
                 return {
                     "user_message": user_message,
@@ -434,27 +491,40 @@ class ChatService:
             logger.error(f"Error in _send_message_to_chat_internal: {e}")
             raise e
     
-    def add_system_message(
+    async def stream_chat_messages(
+        self,
+        db: AsyncSession,
+        chat_id: UUID,
+        session_id: str
+    ) -> Optional[AsyncIterator[Message]]:
+        """Stream all messages of a chat, ensuring session ownership"""
+        chat = await self.chat_repo.get(db, chat_id)
+        if not chat or chat.session_id != session_id:
+            return None
+        
+        return self.message_repo.stream_chat_messages(db, chat_id)
+    
+    async def add_system_message(
         self,
-        db: Session,
+        db: AsyncSession,
         chat_id: UUID,
         session_id: str,
         content: str
     ) -> Message:
         """Add system message to specific chat"""
         # Verify chat belongs to session
-        chat = self.chat_repo.get(db, chat_id)
+        chat = await self.chat_repo.get(db, chat_id)
         if not chat or chat.session_id != session_id:
             raise ValueError("Chat not found or access denied")
         
         try:
             # Add system message
-            system_message = self.message_repo.add_message(
-                db, chat_id, "system", content
+            system_message = await self.message_repo.add_message(
+                db, chat_id, "system", content, commit=False
             )
             
             # Update chat's last message time (but don't increment count for system messages)
-            self.chat_repo.update_last_message_time(db, chat_id, update_count=False)
+            await self.chat_repo.update_last_message_time(db, chat_id, update_count=False)
             
             return system_message
             
@@ -462,26 +532,26 @@ class ChatService:
             logger.error(f"Error adding system message: {e}")
             raise e
     
-    def get_chat_settings(
+    async def get_chat_settings(
         self,
-        db: Session,
+        db: AsyncSession,
         chat_id: UUID,
         session_id: str
     ) -> Optional[ChatSettings]:
         """Get chat settings for a specific chat"""
         # Verify chat belongs to session
-        chat = self.chat_repo.get(db, chat_id)
+        chat = await self.chat_repo.get(db, chat_id)
         if not chat or chat.session_id != session_id:
             return None
         
         # Get or create settings for this chat
         # Use the chat's UUID id for settings lookup
-        settings = self.settings_repo.get_or_create_by_chat_id(db, chat.id)
+        settings = await self.settings_repo.get_or_create_by_chat_id(db, chat.id)
         return ChatSettings.from_orm(settings)
     
-    def update_chat_settings(
+    async def update_chat_settings(
         self,
-        db: Session,
+        db: AsyncSession,
         chat_id: UUID,
         session_id: str,
         settings_update: ChatSettingsUpdate
@@ -490,14 +560,14 @@ class ChatService:
         logger.info(f"[CHAT_SETTINGS] Update request - Chat ID: {chat_id}, Session: {session_id}")
         
         # Verify chat belongs to session
-        chat = self.chat_repo.get(db, chat_id)
+        chat = await self.chat_repo.get(db, chat_id)
         if not chat or chat.session_id != session_id:
             logger.warning(f"[CHAT_SETTINGS] Access denied - Chat ID: {chat_id}, Session: {session_id}")
             return None
         
         # Get or create settings
         # Use the chat's UUID id for settings lookup
-        settings = self.settings_repo.get_or_create_by_chat_id(db, chat.id)
+        settings = await self.settings_repo.get_or_create_by_chat_id(db, chat.id)
         old_settings = {
             "temperature": settings.temperature,
             "max_tokens": settings.max_tokens,
@@ -507,11 +577,11 @@ class ChatService:
         logger.info(f"[CHAT_SETTINGS] Previous settings - Chat ID: {chat_id}: {old_settings}")
         
         # Log the requested updates
-        new_settings = settings_update.dict(exclude_unset=True)
+        new_settings = settings_update.model_dump(exclude_unset=True)
         logger.info(f"[CHAT_SETTINGS] New settings requested - Chat ID: {chat_id}: {new_settings}")
         
         # Update settings
-        updated_settings = self.settings_repo.update(db, db_obj=settings, obj_in=settings_update)
+        updated_settings = await self.settings_repo.update(db, db_obj=settings, obj_in=settings_update)
         
         if updated_settings:
             final_settings = {
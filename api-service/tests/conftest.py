@@ -10,18 +10,21 @@ import os
 os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
 
 import pytest
+import pytest_asyncio
 import asyncio
 from unittest.mock import AsyncMock, MagicMock, patch
 from fastapi.testclient import TestClient
 from httpx import AsyncClient
 from sqlalchemy import create_engine
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import sessionmaker
 from typing import Dict, Any, List
 import uuid
 from datetime import datetime
 
 from app.main import app
-from app.core.database import get_db
+from app.core.database import Base, SessionLocal, engine, get_db, init_db
 from app.repositories.chat_repository import ChatRepository
 from app.repositories.message_repository import MessageRepository
 from app.repositories.settings_repository import ChatSettingsRepository
@@ -37,6 +40,27 @@ def event_loop():
     loop.close()
 
 
+@compiles(UUID, "sqlite")
+def _compile_uuid_for_sqlite(type_, compiler, **kw):
+    """Store PostgreSQL UUID columns as 32-character hex strings in the SQLite test database."""
+    return "CHAR(32)"
+
+
+@pytest_asyncio.fixture
+async def db_session():
+    """
+    Provide an AsyncSession on a fresh in-memory SQLite schema.
+    
+    Tables are created by init_db, as at startup, on the app's own aiosqlite
+    engine and dropped again after the test.
+    """
+    await init_db()
+    async with SessionLocal() as session:
+        yield session
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.drop_all)
+
+
 @pytest.fixture
 def mock_db_session():
     """
@@ -171,7 +195,7 @@ def sample_settings_data():
     """Sample settings data for testing."""
     return {
         "session_id": uuid.uuid4(),
-        "temperature": "0.7",
+        "temperature": 0.7,
         "max_tokens": 1000,
         "system_prompt": "You are a helpful assistant.",
         "created_at": datetime.utcnow(),
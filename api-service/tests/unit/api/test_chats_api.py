@@ -0,0 +1,127 @@
+"""
+Unit tests for the chats API.
+
+This module drives the chat routes end to end through the app's own database
+dependency on an in-memory SQLite database, with the AI service mocked out.
+"""
+
+from unittest.mock import AsyncMock
+
+import orjson
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+
+from app.api.v1 import chats
+from app.main import app
+
+HEADERS = {"X-Session-Id": "test-session-123"}
+
+
+@pytest_asyncio.fixture
+async def client(db_session, monkeypatch):
+    """Create an async client whose chat service answers with a fixed AI response."""
+    monkeypatch.setattr(chats.chat_service.ai_client, "generate_response", AsyncMock(return_value="Test AI response"))
+    monkeypatch.setattr(chats.chat_service, "_chat_counts", {})
+    
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        yield client
+
+
+async def create_chat(client, **body):
+    """Create a chat through the API and return its ID."""
+    response = await client.post("/api/v1/chats/", json={"title": "Test Chat", **body}, headers=HEADERS)
+    assert response.status_code == 200
+    return response.json()["chat"]["id"]
+
+
+class TestChatRoutes:
+    """Test creating, listing and updating chats."""
+    
+    @pytest.mark.asyncio
+    async def test_create_with_initial_message(self, client):
+        """Test that an initial message is answered and the reply returned."""
+        response = await client.post(
+            "/api/v1/chats/", json={"title": "Test Chat", "initial_message": "Hello"}, headers=HEADERS
+        )
+        
+        assert response.status_code == 200
+        assert response.json()["message"]["content"] == "Test AI response"
+        assert response.json()["message"]["role"] == "assistant"
+    
+    @pytest.mark.asyncio
+    async def test_list_pages(self, client):
+        """Test that listing reports the total and whether another page follows."""
+        for _ in range(3):
+            await create_chat(client)
+        
+        first = (await client.get("/api/v1/chats/?per_page=2", headers=HEADERS)).json()
+        second = (await client.get("/api/v1/chats/?per_page=2&page=2", headers=HEADERS)).json()
+        
+        assert (first["total"], len(first["chats"]), first["has_more"]) == (3, 2, True)
+        assert (second["total"], len(second["chats"]), second["has_more"]) == (3, 1, False)
+    
+    @pytest.mark.asyncio
+    async def test_archive_moves_chat_between_filters(self, client):
+        """Test that an archived chat leaves the default list and appears under the archived filter."""
+        chat_id = await create_chat(client)
+        await client.get("/api/v1/chats/", headers=HEADERS)
+        
+        response = await client.post(f"/api/v1/chats/{chat_id}/archive", headers=HEADERS)
+        
+        assert response.json()["is_archived"] is True
+        assert (await client.get("/api/v1/chats/", headers=HEADERS)).json()["total"] == 0
+        assert (await client.get("/api/v1/chats/?filter=archived", headers=HEADERS)).json()["total"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_get_chat_with_recent_messages(self, client):
+        """Test that a chat is returned with its settings and limited messages."""
+        chat_id = await create_chat(client)
+        for content in ["First", "Second"]:
+            response = await client.post(f"/api/v1/chats/{chat_id}/messages", json={"content": content}, headers=HEADERS)
+            assert response.status_code == 200
+        
+        response = await client.get(f"/api/v1/chats/{chat_id}?message_limit=2", headers=HEADERS)
+        
+        assert response.status_code == 200
+        assert len(response.json()["messages"]) == 2
+        assert response.json()["message_count"] == 4
+        assert response.json()["settings"]["max_tokens"] == 1000
+    
+    @pytest.mark.asyncio
+    async def test_other_session_cannot_read_chat(self, client):
+        """Test that a chat is not found for a different session ID."""
+        chat_id = await create_chat(client)
+        
+        response = await client.get(f"/api/v1/chats/{chat_id}", headers={"X-Session-Id": "other-session"})
+        
+        assert response.status_code == 404
+
+
+class TestExportMessages:
+    """Test the newline-delimited JSON message export."""
+    
+    @pytest.mark.asyncio
+    async def test_exports_one_line_per_message(self, client):
+        """Test that every message is written as its own JSON line, oldest first."""
+        chat_id = await create_chat(client, initial_message="Hello")
+        await client.post(f"/api/v1/chats/{chat_id}/messages", json={"content": "Again"}, headers=HEADERS)
+        
+        response = await client.get(f"/api/v1/chats/{chat_id}/messages/export", headers=HEADERS)
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        assert response.text.endswith("\n")
+        lines = [orjson.loads(line) for line in response.text.splitlines()]
+        assert sorted(line["content"] for line in lines) == ["Again", "Hello", "Test AI response", "Test AI response"]
+        assert all(line["session_id"] == chat_id for line in lines)
+        assert [line["created_at"] for line in lines] == sorted(line["created_at"] for line in lines)
+    
+    @pytest.mark.asyncio
+    async def test_other_session_gets_not_found(self, client):
+        """Test that exporting another session's chat returns 404."""
+        chat_id = await create_chat(client, initial_message="Hello")
+        
+        response = await client.get(f"/api/v1/chats/{chat_id}/messages/export", headers={"X-Session-Id": "other-session"})
+        
+        assert response.status_code == 404
@@ -0,0 +1,166 @@
+"""
+Unit tests for ChatRepository.
+
+This module tests session chat queries, single-statement UPDATE ... RETURNING
+writes and the eager loading of a chat with its recent messages, against an
+in-memory SQLite database.
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.exc import InvalidRequestError
+
+from app.repositories.chat_repository import chat_repo
+from app.repositories.message_repository import message_repo
+from app.repositories.settings_repository import settings_repo
+from app.schemas.chat_schemas import ChatSessionCreate
+
+SESSION_ID = "test-session-123"
+
+
+async def create_chat(db_session, title: str = "Test Chat", session_id: str = SESSION_ID, **fields):
+    """Create a chat session through the repository."""
+    return await chat_repo.create(
+        db_session, obj_in=ChatSessionCreate(session_id=session_id, title=title, **fields)
+    )
+
+
+async def add_messages(db_session, chat, count: int):
+    """Add messages one second apart, oldest first, and return them."""
+    started = datetime(2024, 1, 1, 12, 0, 0)
+    return [
+        await message_repo.create(db_session, obj_in={
+            "session_id": chat.id,
+            "role": "user" if i % 2 == 0 else "assistant",
+            "content": f"Message {i}",
+            "created_at": started + timedelta(seconds=i)
+        })
+        for i in range(count)
+    ]
+
+
+class TestSessionChats:
+    """Test listing and counting a session's chats."""
+    
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("filters,expected_titles", [
+        ({}, {"Active", "Pinned"}),
+        ({"include_archived": True}, {"Active", "Pinned", "Archived"}),
+        ({"filter_archived_only": True}, {"Archived"}),
+        ({"filter_pinned_only": True}, {"Pinned"}),
+    ])
+    async def test_filters(self, db_session, filters, expected_titles):
+        """Test that list and count apply the same archive and pin filters."""
+        await create_chat(db_session, "Active")
+        await create_chat(db_session, "Pinned", is_pinned=True)
+        await create_chat(db_session, "Archived", is_archived=True)
+        await create_chat(db_session, "Other session", session_id="other-session")
+        
+        chats = await chat_repo.get_session_chats(db_session, SESSION_ID, **filters)
+        
+        assert {chat.title for chat in chats} == expected_titles
+        assert await chat_repo.count_session_chats(db_session, SESSION_ID, **filters) == len(expected_titles)
+    
+    @pytest.mark.asyncio
+    async def test_get_or_create_reuses_active_chat(self, db_session):
+        """Test that an unarchived chat is returned instead of creating another."""
+        first = await chat_repo.get_or_create_session_chat(db_session, SESSION_ID)
+        second = await chat_repo.get_or_create_session_chat(db_session, SESSION_ID)
+        
+        assert first.id == second.id
+        assert first.title == "New Chat"
+        assert await chat_repo.count_session_chats(db_session, SESSION_ID) == 1
+    
+    @pytest.mark.asyncio
+    async def test_search_matches_title_in_session(self, db_session):
+        """Test that search is case-insensitive and limited to the session."""
+        await create_chat(db_session, "Python questions")
+        await create_chat(db_session, "Cooking")
+        await create_chat(db_session, "python elsewhere", session_id="other-session")
+        
+        chats = await chat_repo.search_session_chats(db_session, SESSION_ID, "PYTHON")
+        
+        assert [chat.title for chat in chats] == ["Python questions"]
+
+
+class TestUpdateReturning:
+    """Test chat writes issued as a single UPDATE ... RETURNING."""
+    
+    @pytest.mark.asyncio
+    async def test_update_last_message_time_refreshes_loaded_chat(self, db_session):
+        """Test that the chat already in the session is refreshed with the returned row."""
+        chat = await create_chat(db_session)
+        await add_messages(db_session, chat, 3)
+        assert chat.message_count == 0
+        assert chat.last_message_at is None
+        
+        updated = await chat_repo.update_last_message_time(db_session, chat.id)
+        
+        assert updated is chat
+        assert chat.message_count == 3
+        assert chat.last_message_at is not None
+    
+    @pytest.mark.asyncio
+    async def test_update_without_count(self, db_session):
+        """Test that the message count is left alone when not requested."""
+        chat = await create_chat(db_session)
+        await add_messages(db_session, chat, 2)
+        
+        updated = await chat_repo.update_last_message_time(db_session, chat.id, update_count=False)
+        
+        assert updated.message_count == 0
+        assert updated.last_message_at is not None
+    
+    @pytest.mark.asyncio
+    async def test_sync_message_count(self, db_session):
+        """Test that the stored count is recomputed from the chat's messages."""
+        chat = await create_chat(db_session)
+        await add_messages(db_session, chat, 4)
+        
+        assert (await chat_repo.sync_message_count(db_session, chat.id)).message_count == 4
+    
+    @pytest.mark.asyncio
+    async def test_missing_chat_returns_none(self, db_session):
+        """Test that updating an unknown chat returns nothing."""
+        chat = await create_chat(db_session)
+        await chat_repo.delete(db_session, id=chat.id)
+        
+        assert await chat_repo.update_last_message_time(db_session, chat.id) is None
+
+
+class TestChatWithMessages:
+    """Test loading a chat with its settings and recent messages."""
+    
+    @pytest.mark.asyncio
+    async def test_loads_recent_messages_in_order(self, db_session):
+        """Test that only the newest messages are loaded, oldest first."""
+        chat = await create_chat(db_session)
+        await add_messages(db_session, chat, 5)
+        await settings_repo.get_or_create_by_chat_id(db_session, chat.id)
+        db_session.expunge_all()
+        
+        loaded = await chat_repo.get_chat_with_messages(db_session, chat.id, message_limit=3)
+        
+        assert [message.content for message in loaded.messages] == ["Message 2", "Message 3", "Message 4"]
+        assert loaded.settings.max_tokens == 1000
+    
+    @pytest.mark.asyncio
+    async def test_other_relationships_raise(self, db_session):
+        """Test that relationships left unloaded raise instead of querying."""
+        chat = await create_chat(db_session)
+        await add_messages(db_session, chat, 1)
+        db_session.expunge_all()
+        
+        loaded = await chat_repo.get_chat_with_messages(db_session, chat.id)
+        
+        with pytest.raises(InvalidRequestError):
+            loaded.messages[0].session
+    
+    @pytest.mark.asyncio
+    async def test_session_ownership(self, db_session):
+        """Test that a chat is not returned for another session ID."""
+        chat = await create_chat(db_session)
+        
+        assert await chat_repo.get_chat_with_messages(db_session, chat.id, session_id="other-session") is None
+        assert (await chat_repo.get_chat_with_messages(db_session, chat.id, session_id=SESSION_ID)).id == chat.id
@@ -0,0 +1,79 @@
+"""
+Unit tests for MessageRepository.
+
+This module tests the conversation context query and batched message
+streaming, against an in-memory SQLite database.
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+
+from app.repositories.chat_repository import chat_repo
+from app.repositories.message_repository import message_repo
+from app.schemas.chat_schemas import ChatSessionCreate
+
+
+@pytest_asyncio.fixture
+async def chat(db_session):
+    """Create a chat session with five messages one second apart."""
+    chat = await chat_repo.create(db_session, obj_in=ChatSessionCreate(session_id="test-session-123", title="Test Chat"))
+    started = datetime(2024, 1, 1, 12, 0, 0)
+    for i in range(5):
+        await message_repo.create(db_session, obj_in={
+            "session_id": chat.id,
+            "role": "user" if i % 2 == 0 else "assistant",
+            "content": f"Message {i}",
+            "created_at": started + timedelta(seconds=i)
+        })
+    return chat
+
+
+class TestConversationContext:
+    """Test reading the most recent messages for generation context."""
+    
+    @pytest.mark.asyncio
+    async def test_recent_messages_in_chronological_order(self, db_session, chat):
+        """Test that the newest messages are returned oldest first."""
+        messages = await message_repo.get_conversation_context(db_session, chat.id, max_messages=3)
+        
+        assert [message.content for message in messages] == ["Message 2", "Message 3", "Message 4"]
+    
+    @pytest.mark.asyncio
+    async def test_statement_reused_with_new_values(self, db_session, chat):
+        """Test that the prebuilt statement binds the session and count on each call."""
+        other = await chat_repo.create(db_session, obj_in=ChatSessionCreate(session_id="test-session-123", title="Other"))
+        
+        assert len(await message_repo.get_recent_messages(db_session, chat.id, count=2)) == 2
+        assert len(await message_repo.get_recent_messages(db_session, chat.id, count=10)) == 5
+        assert await message_repo.get_recent_messages(db_session, other.id) == []
+
+
+class TestAddMessage:
+    """Test adding messages inside or outside the caller's transaction."""
+    
+    @pytest.mark.asyncio
+    async def test_flush_without_commit(self, db_session, chat):
+        """Test that an uncommitted message is visible to the session and can be rolled back."""
+        chat_id = chat.id
+        message = await message_repo.add_message(db_session, chat_id, "user", "Draft", commit=False)
+        
+        assert message.id is not None
+        assert message.message_metadata == {}
+        assert await message_repo.get_message_count(db_session, chat_id) == 6
+        
+        await db_session.rollback()
+        
+        assert await message_repo.get_message_count(db_session, chat_id) == 5
+
+
+class TestStreamMessages:
+    """Test streaming a chat's messages in batches."""
+    
+    @pytest.mark.asyncio
+    async def test_streams_all_messages_across_batches(self, db_session, chat):
+        """Test that every message is yielded in order when batches are smaller than the chat."""
+        messages = [message async for message in message_repo.stream_chat_messages(db_session, chat.id, batch_size=2)]
+        
+        assert [message.content for message in messages] == [f"Message {i}" for i in range(5)]
@@ -0,0 +1,69 @@
+"""
+Unit tests for ChatSettingsRepository.
+
+This module tests creating default settings with INSERT ... ON CONFLICT DO
+NOTHING RETURNING, against an in-memory SQLite database.
+"""
+
+import pytest
+import pytest_asyncio
+
+from app.database.models import ChatSettings
+from app.repositories.chat_repository import chat_repo
+from app.repositories.settings_repository import settings_repo
+from app.schemas.chat_schemas import ChatSessionCreate
+from app.schemas.settings_schemas import ChatSettingsUpdate
+
+
+@pytest_asyncio.fixture
+async def chat(db_session):
+    """Create a chat session to attach settings to."""
+    return await chat_repo.create(db_session, obj_in=ChatSessionCreate(session_id="test-session-123", title="Test Chat"))
+
+
+class TestGetOrCreate:
+    """Test get-or-create of a chat's settings."""
+    
+    @pytest.mark.asyncio
+    async def test_creates_defaults(self, db_session, chat):
+        """Test that a chat without settings gets the default values."""
+        settings = await settings_repo.get_or_create_by_session_id(db_session, chat.id)
+        
+        assert settings.session_id == chat.id
+        assert settings.temperature == 0.7
+        assert settings.max_tokens == 1000
+        assert settings.system_prompt is None
+    
+    @pytest.mark.asyncio
+    async def test_returns_existing_settings(self, db_session, chat):
+        """Test that settings are created once and reused afterwards."""
+        created = await settings_repo.get_or_create_by_chat_id(db_session, chat.id)
+        await settings_repo.update_by_session_id(db_session, chat.id, ChatSettingsUpdate(max_tokens=200))
+        db_session.expunge_all()
+        
+        settings = await settings_repo.get_or_create_by_session_id(db_session, chat.id)
+        
+        assert settings.session_id == created.session_id
+        assert settings.max_tokens == 200
+        assert await settings_repo.count(db_session) == 1
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_insert_keeps_first_row(self, db_session, chat, monkeypatch):
+        """Test that a row created between the lookup and the INSERT is returned unchanged."""
+        db_session.add(ChatSettings(session_id=chat.id, temperature=0.2, max_tokens=50))
+        await db_session.commit()
+        db_session.expunge_all()
+        lookup = settings_repo.get_by_session_id
+        calls = []
+        
+        async def miss_first_lookup(db, session_id):
+            calls.append(session_id)
+            return None if len(calls) == 1 else await lookup(db, session_id)
+        
+        monkeypatch.setattr(settings_repo, "get_by_session_id", miss_first_lookup)
+        
+        settings = await settings_repo.get_or_create_by_session_id(db_session, chat.id)
+        
+        assert len(calls) == 2
+        assert settings.max_tokens == 50
+        assert await settings_repo.count(db_session) == 1
@@ -29,24 +29,35 @@ class TestChatSettingsBase:
         }
         
         settings = ChatSettingsBase(**data)
-        assert settings.temperature == "0.8"
+        assert settings.temperature == 0.8
         assert settings.max_tokens == 2000
         assert settings.system_prompt == "You are a helpful AI assistant."
     
     def test_valid_settings_with_defaults(self):
         """Test settings creation with default values."""
         settings = ChatSettingsBase()
-        assert settings.temperature == "0.7"  # default
+        assert settings.temperature == 0.7  # default
         assert settings.max_tokens == 1000    # default
         assert settings.system_prompt is None # default
     
     def test_temperature_string_validation(self):
-        """Test temperature accepts string values."""
+        """Test temperature accepts numeric string values as floats."""
         valid_temperatures = ["0.1", "0.7", "1.0", "1.5", "2.0"]
         
         for temp in valid_temperatures:
             settings = ChatSettingsBase(temperature=temp)
-            assert settings.temperature == temp
+            assert settings.temperature == float(temp)
+    
+    def test_temperature_validation_bounds(self):
+        """Test temperature validation bounds."""
+        assert ChatSettingsBase(temperature=0).temperature == 0.0
+        assert ChatSettingsBase(temperature=2).temperature == 2.0
+        
+        with pytest.raises(ValidationError):
+            ChatSettingsBase(temperature=-0.1)
+        
+        with pytest.raises(ValidationError):
+            ChatSettingsBase(temperature=2.1)
     
     def test_max_tokens_validation_bounds(self):
         """Test max_tokens validation bounds."""
@@ -109,7 +120,7 @@ class TestChatSettingsCreate:
         
         settings = ChatSettingsCreate(**data)
         assert settings.session_id == session_id
-        assert settings.temperature == "0.9"
+        assert settings.temperature == 0.9
         assert settings.max_tokens == 1500
         assert settings.system_prompt == "Be concise and helpful."
     
@@ -120,7 +131,7 @@ class TestChatSettingsCreate:
         
         settings = ChatSettingsCreate(**data)
         assert settings.session_id == session_id
-        assert settings.temperature == "0.7"  # default
+        assert settings.temperature == 0.7  # default
         assert settings.max_tokens == 1000    # default
         assert settings.system_prompt is None  # default
     
@@ -165,14 +176,14 @@ class TestChatSettingsUpdate:
         }
         
         update = ChatSettingsUpdate(**data)
-        assert update.temperature == "0.5"
+        assert update.temperature == 0.5
         assert update.system_prompt == "Updated prompt"
         assert update.max_tokens == 1000  # inherits default from base
     
     def test_empty_update(self):
         """Test update with no fields provided."""
         update = ChatSettingsUpdate()
-        assert update.temperature == "0.7"  # inherits default from base
+        assert update.temperature == 0.7  # inherits default from base
         assert update.max_tokens == 1000    # inherits default from base
         assert update.system_prompt is None # inherits default from base
     
@@ -180,19 +191,19 @@ class TestChatSettingsUpdate:
         """Test updating single fields."""
         # Temperature only
         temp_update = ChatSettingsUpdate(temperature="1.2")
-        assert temp_update.temperature == "1.2"
+        assert temp_update.temperature == 1.2
         assert temp_update.max_tokens == 1000  # inherits default
         assert temp_update.system_prompt is None  # inherits default
         
         # Max tokens only
         tokens_update = ChatSettingsUpdate(max_tokens=500)
-        assert tokens_update.temperature == "0.7"  # inherits default
+        assert tokens_update.temperature == 0.7  # inherits default
         assert tokens_update.max_tokens == 500
         assert tokens_update.system_prompt is None  # inherits default
         
         # System prompt only
         prompt_update = ChatSettingsUpdate(system_prompt="New prompt")
-        assert prompt_update.temperature == "0.7"  # inherits default
+        assert prompt_update.temperature == 0.7  # inherits default
         assert prompt_update.max_tokens == 1000    # inherits default
         assert prompt_update.system_prompt == "New prompt"
     
@@ -205,7 +216,7 @@ class TestChatSettingsUpdate:
         }
         
         update = ChatSettingsUpdate(**data)
-        assert update.temperature == "1.0"
+        assert update.temperature == 1.0
         assert update.max_tokens == 3000
         assert update.system_prompt == "Comprehensive update"
     
@@ -213,7 +224,7 @@ class TestChatSettingsUpdate:
         """Test validation applies to provided fields."""
         # Temperature validation (if any exists)
         temp_update = ChatSettingsUpdate(temperature="0.1")
-        assert temp_update.temperature == "0.1"
+        assert temp_update.temperature == 0.1
         
         # Max tokens validation
         with pytest.raises(ValidationError):
@@ -250,7 +261,7 @@ class TestChatSettings:
         
         settings = ChatSettings(**data)
         assert settings.session_id == str(session_id)
-        assert settings.temperature == "0.7"
+        assert settings.temperature == 0.7
         assert settings.max_tokens == 1000
         assert settings.system_prompt == "You are helpful"
         assert settings.created_at == created_at
@@ -262,7 +273,7 @@ class TestChatSettings:
         class MockDBSettings:
             def __init__(self):
                 self.session_id = uuid4()
-                self.temperature = "0.8"
+                self.temperature = 0.8
                 self.max_tokens = 2000
                 self.system_prompt = "Be helpful"
                 self.created_at = datetime.utcnow()
@@ -465,7 +476,7 @@ class TestSchemaInteractions:
         
         # Test base schema
         base_settings = ChatSettingsBase(**base_data)
-        assert base_settings.temperature == "0.7"
+        assert base_settings.temperature == 0.7
         
         # Test create schema (adds session_id)
         create_data = {**base_data, "session_id": session_id}
@@ -474,7 +485,7 @@ class TestSchemaInteractions:
         
         # Test update schema (inherits defaults from base)
         update_settings = ChatSettingsUpdate(temperature="0.8")
-        assert update_settings.temperature == "0.8"
+        assert update_settings.temperature == 0.8
         assert update_settings.max_tokens == 1000  # inherits default
         
         # Test response schema (adds timestamps)
@@ -530,7 +541,7 @@ class TestSchemaInteractions:
         # Test serialization
         serialized = settings.model_dump()
         assert serialized["session_id"] == str(session_id)
-        assert serialized["temperature"] == "0.7"
+        assert serialized["temperature"] == 0.7
         assert "created_at" in serialized
         
         # Test response wrapper serialization
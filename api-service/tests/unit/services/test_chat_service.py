@@ -0,0 +1,110 @@
+"""
+Unit tests for ChatService chat listing.
+
+This module tests LIMIT+1 pagination of a session's chats and invalidation
+of the short-lived chat count cache, against an in-memory SQLite database.
+"""
+
+import pytest
+
+from app.schemas.chat_schemas import ChatSessionCreate, ChatSessionUpdate, CreateChatRequest
+from app.services.chat_service import ChatService
+
+SESSION_ID = "test-session-123"
+
+
+@pytest.fixture
+def chat_service():
+    """Create a ChatService with an empty chat count cache."""
+    return ChatService()
+
+
+async def create_chats(chat_service, db_session, count: int):
+    """Create chats for the test session and return them."""
+    return [
+        await chat_service.create_chat(db_session, SESSION_ID, CreateChatRequest(title=f"Chat {i}"))
+        for i in range(count)
+    ]
+
+
+class TestSessionChatPagination:
+    """Test has_more detection from one extra fetched row."""
+    
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("page,expected_count,expected_more", [
+        (1, 2, True),
+        (2, 1, False),
+    ])
+    async def test_has_more(self, chat_service, db_session, page, expected_count, expected_more):
+        """Test that a page reports more only when a row beyond it exists."""
+        await create_chats(chat_service, db_session, 3)
+        
+        chats, has_more = await chat_service.get_session_chats(db_session, SESSION_ID, page=page, per_page=2)
+        
+        assert len(chats) == expected_count
+        assert has_more is expected_more
+    
+    @pytest.mark.asyncio
+    async def test_exact_page_has_no_more(self, chat_service, db_session):
+        """Test that a full last page does not report a following page."""
+        await create_chats(chat_service, db_session, 2)
+        
+        chats, has_more = await chat_service.get_session_chats(db_session, SESSION_ID, per_page=2)
+        
+        assert len(chats) == 2
+        assert has_more is False
+
+
+class TestChatCountCache:
+    """Test that cached chat counts are dropped when the session's chats change."""
+    
+    @pytest.mark.asyncio
+    async def test_count_is_reused(self, chat_service, db_session):
+        """Test that a recent count is served without querying again."""
+        await create_chats(chat_service, db_session, 2)
+        assert await chat_service.count_session_chats(db_session, SESSION_ID) == 2
+        
+        # A chat added behind the service's back is not seen until the count expires
+        await chat_service.chat_repo.create(db_session, obj_in=ChatSessionCreate(title="Direct", session_id=SESSION_ID))
+        
+        assert await chat_service.count_session_chats(db_session, SESSION_ID) == 2
+    
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("update,archived_only,expected", [
+        (ChatSessionUpdate(is_archived=True), False, 1),
+        (ChatSessionUpdate(is_archived=True), True, 1),
+        (ChatSessionUpdate(is_pinned=True), False, 2),
+    ])
+    async def test_update_chat_invalidates_count(
+        self, chat_service, db_session, update, archived_only, expected
+    ):
+        """Test that archiving or pinning through PUT refreshes the counts."""
+        first, _ = await create_chats(chat_service, db_session, 2)
+        await chat_service.count_session_chats(db_session, SESSION_ID, filter_archived_only=archived_only)
+        
+        await chat_service.update_chat(db_session, first.id, SESSION_ID, update)
+        
+        assert SESSION_ID not in chat_service._chat_counts
+        count = await chat_service.count_session_chats(db_session, SESSION_ID, filter_archived_only=archived_only)
+        assert count == expected
+    
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("action", ["archive_chat", "pin_chat", "delete_chat"])
+    async def test_chat_actions_invalidate_count(self, chat_service, db_session, action):
+        """Test that archive, pin and delete drop the session's cached counts."""
+        first, _ = await create_chats(chat_service, db_session, 2)
+        await chat_service.count_session_chats(db_session, SESSION_ID)
+        
+        await getattr(chat_service, action)(db_session, first.id, SESSION_ID)
+        
+        assert SESSION_ID not in chat_service._chat_counts
+    
+    @pytest.mark.asyncio
+    async def test_create_chat_invalidates_count(self, chat_service, db_session):
+        """Test that a new chat is counted straight away."""
+        await create_chats(chat_service, db_session, 1)
+        assert await chat_service.count_session_chats(db_session, SESSION_ID) == 1
+        
+        await create_chats(chat_service, db_session, 1)
+        
+        assert await chat_service.count_session_chats(db_session, SESSION_ID) == 2